@@ -68,6 +68,68 @@ CREATE TABLE "FactTrafficEvents" (
     congestion_level_score DECIMAL(3,1)
 );
 
+-- Rollups maintained by the loader, additive sums and counts of the fact measures
+CREATE TABLE "AggHourlyLocationEvent" (
+    date_key INTEGER NOT NULL,
+    hour INTEGER NOT NULL,
+    location_key INTEGER NOT NULL,
+    event_type_key INTEGER NOT NULL,
+    event_count INTEGER NOT NULL,
+    vehicle_count_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    vehicle_count_count INTEGER NOT NULL DEFAULT 0,
+    avg_speed_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    avg_speed_count INTEGER NOT NULL DEFAULT 0,
+    vehicles_involved_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    vehicles_involved_count INTEGER NOT NULL DEFAULT 0,
+    incident_severity_score_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    incident_severity_score_count INTEGER NOT NULL DEFAULT 0,
+    speed_excess_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    speed_excess_count INTEGER NOT NULL DEFAULT 0,
+    duration_minutes_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    duration_minutes_count INTEGER NOT NULL DEFAULT 0,
+    congestion_level_score_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    congestion_level_score_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (date_key, hour, location_key, event_type_key)
+);
+
+CREATE TABLE "AggDailyLocation" (
+    date_key INTEGER NOT NULL,
+    location_key INTEGER NOT NULL,
+    event_count INTEGER NOT NULL,
+    vehicle_count_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    vehicle_count_count INTEGER NOT NULL DEFAULT 0,
+    avg_speed_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    avg_speed_count INTEGER NOT NULL DEFAULT 0,
+    vehicles_involved_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    vehicles_involved_count INTEGER NOT NULL DEFAULT 0,
+    incident_severity_score_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    incident_severity_score_count INTEGER NOT NULL DEFAULT 0,
+    speed_excess_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    speed_excess_count INTEGER NOT NULL DEFAULT 0,
+    duration_minutes_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    duration_minutes_count INTEGER NOT NULL DEFAULT 0,
+    congestion_level_score_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    congestion_level_score_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (date_key, location_key)
+);
+
+CREATE TABLE "FeatLocationRolling" (
+    location_key INTEGER NOT NULL,
+    date_key INTEGER NOT NULL,
+    time_key SMALLINT NOT NULL,
+    events INTEGER NOT NULL,
+    vehicle_count_15min REAL,
+    congestion_score_15min REAL,
+    vehicle_count_1h REAL,
+    congestion_score_1h REAL,
+    vehicle_count_24h REAL,
+    congestion_score_24h REAL,
+    avg_speed_24h REAL,
+    speed_zscore REAL,
+    congestion_trend REAL,
+    PRIMARY KEY (location_key, date_key, time_key)
+);
+
 -- Create indexes for better performance
 CREATE INDEX idx_factevents_date ON "FactTrafficEvents"(date_key);
 CREATE INDEX idx_factevents_location ON "FactTrafficEvents"(location_key);
@@ -0,0 +1,10 @@
+from .cube import TrafficCube
+from .sketches import TrafficSketches, SketchStore
+from .features import RollingFeatures
+
+__all__ = [
+    'TrafficCube',
+    'TrafficSketches',
+    'SketchStore',
+    'RollingFeatures'
+]
@@ -0,0 +1,274 @@
+import os
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+FACT_TABLE = 'FactTrafficEvents'
+
+Measure = Tuple[str, str]  # (fact column, aggregation)
+
+
+@dataclass
+class Cuboid:
+    """Facts aggregated by a combination of dimension rows (cells), one array entry per cell"""
+    key_columns: Tuple[str, ...]
+    shape: Tuple[int, ...]  # Dimension rows + 1 per key; position 0 holds unknown keys
+    cells: np.ndarray  # Cell codes (mixed radix over shape) of the entries
+    components: Tuple[np.ndarray, ...]  # Dimension position of each entry, per key
+    events: np.ndarray
+    aggregates: Dict[Tuple[str, str], np.ndarray] = field(default_factory=dict)  # (measure, aggregation) -> values
+
+
+class TrafficCube:
+    """
+    In-memory columnar cube over the fact table and its dimensions
+    Facts are reduced to one dimension row position per foreign key and one float
+    array per measure. The first query touching a set of dimensions counts the facts
+    once per combination of their rows (a cuboid, built with bincount) and measures
+    are aggregated into it on first use; that query and every later slice over those
+    dimensions (any attributes, any filters) is then answered from the cuboid, whose
+    size depends on the dimensions and not on the number of facts. Query results are
+    cached as well
+    """
+    
+    # Fact foreign key -> dimension table
+    DIMENSION_KEYS = {
+        'date_key': 'DimDate',
+        'time_key': 'DimTime',
+        'location_key': 'DimLocation',
+        'vehicle_key': 'DimVehicle',
+        'event_type_key': 'DimEventType',
+        'environmental_key': 'DimEnvironmental'
+    }
+    MEASURES = ['vehicle_count', 'avg_speed', 'vehicles_involved', 'incident_severity_score',
+                'speed_excess', 'duration_minutes', 'congestion_level_score']
+    AGGREGATIONS = ('count', 'sum', 'mean', 'min', 'max')
+    MAX_DENSE_CELLS = 1 << 22  # Larger dimension combinations only keep the cells that occur
+    
+    def __init__(self, fact_df: pd.DataFrame, dimensions: Dict[str, pd.DataFrame], cache_size: int = 256):
+        self.rows = len(fact_df)
+        self.dimensions: Dict[str, pd.DataFrame] = {}
+        self.attributes: Dict[str, Tuple[str, str]] = {}  # attribute -> (fact key, dimension column)
+        self._positions: Dict[str, np.ndarray] = {}  # fact key -> dimension row position + 1, 0 if unknown
+        self._measures: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}  # measure -> (zero-filled values, valid)
+        self._codes: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}  # attribute -> (codes per position, labels)
+        self._cuboids: Dict[Tuple[str, ...], Cuboid] = {}
+        self._cache: OrderedDict = OrderedDict()
+        self.cache_size = cache_size
+        self._lock = threading.RLock()
+        
+        ambiguous = set()
+        for key_column, dim_name in self.DIMENSION_KEYS.items():
+            dim_df = dimensions.get(dim_name)
+            if dim_df is None or key_column not in fact_df.columns:
+                continue
+            dim_df = dim_df.reset_index(drop=True)
+            self.dimensions[dim_name] = dim_df
+            keys = pd.to_numeric(fact_df[key_column], errors='coerce')
+            positions = pd.Index(dim_df[key_column]).get_indexer(keys) + 1
+            self._positions[key_column] = positions.astype(np.min_scalar_type(len(dim_df)))
+            
+            for column in dim_df.columns:
+                # Attributes are addressable as Dim.column, and by column alone when unambiguous
+                self.attributes[f"{dim_name}.{column}"] = (key_column, column)
+                if column in self.attributes or column in ambiguous:
+                    self.attributes.pop(column, None)
+                    ambiguous.add(column)
+                else:
+                    self.attributes[column] = (key_column, column)
+        
+        for measure in self.MEASURES:
+            if measure in fact_df.columns:
+                values = pd.to_numeric(fact_df[measure], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+                valid = ~np.isnan(values)
+                self._measures[measure] = (np.where(valid, values, 0.0), valid)
+        
+        logger.info(f"Built cube over {self.rows} facts with {len(self.dimensions)} dimensions")
+    
+    @classmethod
+    def from_csv(cls, directory: Optional[str] = None, cache_size: int = 256) -> 'TrafficCube':
+        """Build a cube from the CSV output of the pipeline (OUTPUT_DIR by default)"""
+        directory = directory or os.environ.get('OUTPUT_DIR', '/app/output')
+        columns = list(cls.DIMENSION_KEYS) + cls.MEASURES
+        fact_df = pd.read_csv(os.path.join(directory, f"{FACT_TABLE}.csv"), usecols=lambda c: c in columns)
+        dimensions = {}
+        for dim_name in cls.DIMENSION_KEYS.values():
+            path = os.path.join(directory, f"{dim_name}.csv")
+            if os.path.exists(path):
+                dimensions[dim_name] = pd.read_csv(path)
+        return cls(fact_df, dimensions, cache_size)
+    
+    def _attribute(self, name: str) -> Tuple[str, str]:
+        if name not in self.attributes:
+            raise KeyError(f"Unknown cube attribute {name!r}; qualify it as <Dimension>.<column> if it is ambiguous")
+        return self.attributes[name]
+    
+    def _dimension(self, key_column: str) -> pd.DataFrame:
+        return self.dimensions[self.DIMENSION_KEYS[key_column]]
+    
+    def codes(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Codes of an attribute per dimension position and their labels
+        Position 0 (unknown key) and nulls in the dimension share a trailing null label
+        """
+        with self._lock:
+            if name not in self._codes:
+                key_column, column = self._attribute(name)
+                dim_codes, labels = pd.factorize(self._dimension(key_column)[column], sort=True)
+                null_code = len(labels)
+                codes = np.concatenate([[null_code], np.where(dim_codes < 0, null_code, dim_codes)])
+                self._codes[name] = (codes, np.append(np.asarray(labels, dtype=object), None))
+            return self._codes[name]
+    
+    def _cell_index(self, key_columns: Tuple[str, ...], shape: Tuple[int, ...]) -> np.ndarray:
+        """Cell code of every fact for a combination of dimension keys"""
+        index = np.zeros(self.rows, dtype=np.int64)
+        for key_column, size in zip(key_columns, shape):
+            index *= size
+            index += self._positions[key_column]
+        return index
+    
+    def _fact_cells(self, cuboid: Cuboid) -> np.ndarray:
+        """Position of every fact among the cells of a cuboid"""
+        index = self._cell_index(cuboid.key_columns, cuboid.shape)
+        if len(cuboid.cells) != int(np.prod(cuboid.shape, dtype=np.int64)):
+            index = np.searchsorted(cuboid.cells, index)
+        return index
+    
+    def _cuboid(self, key_columns: Tuple[str, ...]) -> Cuboid:
+        """Facts aggregated by the rows of the given dimensions, built on first use"""
+        with self._lock:
+            if key_columns in self._cuboids:
+                return self._cuboids[key_columns]
+            
+            shape = tuple(len(self._dimension(key_column)) + 1 for key_column in key_columns)
+            index = self._cell_index(key_columns, shape)
+            total = int(np.prod(shape, dtype=np.int64))
+            if total <= self.MAX_DENSE_CELLS:
+                cells = np.arange(total)
+            else:
+                cells, index = np.unique(index, return_inverse=True)
+            
+            components = np.unravel_index(cells, shape) if key_columns else ()
+            cuboid = Cuboid(key_columns, shape, cells, components, np.bincount(index, minlength=len(cells)))
+            self._cuboids[key_columns] = cuboid
+            logger.debug(f"Built cuboid over {key_columns or 'all facts'} with {len(cells)} cells")
+            return cuboid
+    
+    def _cell_aggregate(self, cuboid: Cuboid, measure: str, how: str) -> np.ndarray:
+        """Per-cell count, sum, min or max of a measure (NaN extremes for cells without values)"""
+        with self._lock:
+            if (measure, how) not in cuboid.aggregates:
+                values, valid = self._measures[measure]
+                index = self._fact_cells(cuboid)
+                if how in ('count', 'sum'):
+                    # Means need both, and they share the pass over the facts' cells
+                    cuboid.aggregates[(measure, 'count')] = np.bincount(index, weights=valid,
+                                                                        minlength=len(cuboid.cells))
+                    cuboid.aggregates[(measure, 'sum')] = np.bincount(index, weights=values,
+                                                                      minlength=len(cuboid.cells))
+                else:
+                    ufunc, initial = (np.minimum, np.inf) if how == 'min' else (np.maximum, -np.inf)
+                    result = np.full(len(cuboid.cells), initial)
+                    ufunc.at(result, index[valid], values[valid])
+                    result[np.isinf(result)] = np.nan
+                    cuboid.aggregates[(measure, how)] = result
+            return cuboid.aggregates[(measure, how)]
+    
+    def query(self, by: Union[str, List[str], None] = None, measures: Optional[Dict[str, Measure]] = None,
+              where: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+        """
+        Group facts by dimension attributes and aggregate measures
+        
+        Args:
+            by: attributes to group by, e.g. ['hour', 'event_category']
+            measures: output column -> (measure, aggregation), aggregation one of
+                count, sum, mean, min, max
+            where: attribute -> allowed value or list of values
+        
+        Returns:
+            One row per non-empty group with an 'events' count and the requested measures
+        """
+        by = [by] if isinstance(by, str) else list(by or [])
+        measures = measures or {}
+        where = {name: list(allowed) if isinstance(allowed, (list, tuple, set, frozenset)) else [allowed]
+                 for name, allowed in (where or {}).items()}
+        for output, (measure, how) in measures.items():
+            if measure not in self._measures:
+                raise KeyError(f"Unknown measure {measure!r} for {output}")
+            if how not in self.AGGREGATIONS:
+                raise ValueError(f"Unsupported aggregation {how!r} for {output}, expected one of {self.AGGREGATIONS}")
+        
+        cache_key = (tuple(by), tuple(sorted(measures.items())),
+                     tuple(sorted((name, tuple(sorted(map(str, allowed)))) for name, allowed in where.items())))
+        with self._lock:
+            if cache_key in self._cache:
+                self._cache.move_to_end(cache_key)
+                return self._cache[cache_key].copy()
+        
+        key_columns = tuple(sorted({self._attribute(name)[0] for name in by + list(where)}))
+        cuboid = self._cuboid(key_columns)
+        component = dict(zip(key_columns, cuboid.components))
+        
+        # Filters and groups are evaluated per cell, never per fact
+        keep = cuboid.events > 0
+        for name, allowed in where.items():
+            key_column, column = self._attribute(name)
+            selected = np.concatenate([[False], self._dimension(key_column)[column].isin(allowed).to_numpy()])
+            keep &= selected[component[key_column]]
+        cells = np.flatnonzero(keep)
+        
+        group = np.zeros(len(cells), dtype=np.int64)
+        sizes = []
+        labels = []
+        for name in by:
+            codes, attribute_labels = self.codes(name)
+            group = group * len(attribute_labels) + codes[component[self._attribute(name)[0]][cells]]
+            sizes.append(len(attribute_labels))
+            labels.append(attribute_labels)
+        groups = int(np.prod(sizes, dtype=np.int64))
+        
+        events = np.bincount(group, weights=cuboid.events[cells], minlength=groups)
+        present = np.flatnonzero(events)
+        result = pd.DataFrame(index=pd.RangeIndex(len(present)))
+        if by:
+            for name, attribute_labels, index in zip(by, labels, np.unravel_index(present, sizes)):
+                result[name] = attribute_labels[index]
+        result['events'] = events[present].astype(np.int64)
+        
+        for output, (measure, how) in measures.items():
+            if how in ('min', 'max'):
+                ufunc, initial = (np.fmin, np.inf) if how == 'min' else (np.fmax, -np.inf)
+                values = np.full(groups, initial)
+                ufunc.at(values, group, self._cell_aggregate(cuboid, measure, how)[cells])
+                values[np.isinf(values)] = np.nan
+            elif how == 'count':
+                values = np.bincount(group, weights=self._cell_aggregate(cuboid, measure, 'count')[cells],
+                                     minlength=groups).astype(np.int64)
+            else:
+                values = np.bincount(group, weights=self._cell_aggregate(cuboid, measure, 'sum')[cells],
+                                     minlength=groups)
+                if how == 'mean':
+                    counts = np.bincount(group, weights=self._cell_aggregate(cuboid, measure, 'count')[cells],
+                                         minlength=groups)
+                    with np.errstate(invalid='ignore', divide='ignore'):
+                        values = np.where(counts > 0, values / counts, np.nan)
+            result[output] = values[present]
+        
+        with self._lock:
+            self._cache[cache_key] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result.copy()
+    
+    def clear_cache(self):
+        """Drop cached query results and cuboids"""
+        with self._lock:
+            self._cache.clear()
+            self._cuboids.clear()
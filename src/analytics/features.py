@@ -0,0 +1,229 @@
+import os
+import logging
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional, Iterable, Iterator
+from sqlalchemy import inspect
+from sqlalchemy.sql import text
+
+from monitoring import get_recorder
+
+logger = logging.getLogger(__name__)
+
+# Observations are keyed by location and minute packed into one sortable int64
+MINUTE_BITS = 32
+
+
+class RollingFeatures:
+    """
+    Rolling window features per location for alerting
+    Facts are reduced to one observation per location and minute holding sums and counts,
+    sorted by (location, minute). Window sums are differences of running sums between each
+    observation and the first one inside its window, found by binary search, so every
+    window of every location is computed in a few vectorized passes.
+    
+    A full build replaces the feature table. Incremental builds (daemon batches) keep the
+    trailing longest window of each location and recompute only the observations at or
+    after the earliest new one
+    """
+    
+    TABLE = 'FeatLocationRolling'
+    # Feature name -> fact measure averaged over each window
+    MEASURES = {'vehicle_count': 'vehicle_count', 'congestion_score': 'congestion_level_score', 'speed': 'avg_speed'}
+    OBSERVATION_COLUMNS = ['events', 'vehicle_count_sum', 'vehicle_count_n', 'congestion_score_sum',
+                           'congestion_score_n', 'speed_sum', 'speed_sumsq', 'speed_n']
+    KEY_COLUMNS = ['location_key', 'date_key', 'time_key']
+    TAIL_FILE = 'tail.feather'
+    
+    def __init__(self, config: Dict[str, Any]):
+        feature_config = config.get('features', {})
+        self.enabled = feature_config.get('enabled', True)
+        self.dir = feature_config.get('dir', 'features')
+        # Window label -> length in minutes, shortest first
+        windows = {label: int(pd.Timedelta(label).total_seconds() // 60)
+                   for label in feature_config.get('windows', ['15min', '1h', '24h'])}
+        self.windows = dict(sorted(windows.items(), key=lambda item: item[1]))
+        self._parts: List[pd.DataFrame] = []
+    
+    @property
+    def longest(self) -> str:
+        return next(reversed(self.windows))
+    
+    @staticmethod
+    def _minutes(date_keys: pd.Series, time_keys: pd.Series) -> np.ndarray:
+        """Minutes since the epoch of YYYYMMDD date keys and HHMM time keys"""
+        codes, uniques = pd.factorize(date_keys)
+        days = pd.to_datetime(pd.Series(uniques).astype(str), format='%Y%m%d').to_numpy('datetime64[D]')
+        day_minutes = days.view(np.int64) * 1440
+        time_keys = time_keys.to_numpy(np.int64)
+        return day_minutes[codes] + time_keys // 100 * 60 + time_keys % 100
+    
+    def observations(self, fact_df: pd.DataFrame) -> pd.DataFrame:
+        """Per location and minute sums and counts of a set of facts, indexed by packed key"""
+        if fact_df.empty:
+            return pd.DataFrame(columns=self.OBSERVATION_COLUMNS, dtype='float64')
+        facts = fact_df[fact_df['date_key'] > 0]
+        keys = (facts['location_key'].to_numpy(np.int64) << MINUTE_BITS) + \
+            self._minutes(facts['date_key'], facts['time_key'])
+        
+        columns = {'events': np.ones(len(facts))}
+        for name, measure in self.MEASURES.items():
+            values = pd.to_numeric(facts[measure], errors='coerce').to_numpy(np.float64, na_value=np.nan) \
+                if measure in facts.columns else np.full(len(facts), np.nan)
+            present = ~np.isnan(values)
+            columns[f'{name}_sum'] = np.where(present, values, 0.0)
+            columns[f'{name}_n'] = present.astype(np.float64)
+            if name == 'speed':
+                columns['speed_sumsq'] = np.where(present, values * values, 0.0)
+        return pd.DataFrame(columns, index=pd.Index(keys, name='key'))[self.OBSERVATION_COLUMNS] \
+            .groupby(level=0, sort=True).sum()
+    
+    def update(self, fact_df: pd.DataFrame):
+        """Add a set of facts to the observations of this build"""
+        self._parts.append(self.observations(fact_df))
+    
+    def update_stream(self, chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """Update from fact chunks as they pass through to the loader"""
+        for chunk in chunks:
+            self.update(chunk)
+            yield chunk
+    
+    @staticmethod
+    def _combine(parts: Iterable[pd.DataFrame]) -> pd.DataFrame:
+        parts = [part for part in parts if not part.empty]
+        if not parts:
+            return pd.DataFrame(columns=RollingFeatures.OBSERVATION_COLUMNS, dtype='float64')
+        if len(parts) == 1:
+            return parts[0]
+        return pd.concat(parts).groupby(level=0, sort=True).sum()
+    
+    def compute(self, observations: pd.DataFrame, emit: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """
+        Features of sorted observations
+        emit optionally selects the observations to return; the others only serve as window context
+        """
+        keys = observations.index.to_numpy(np.int64)
+        locations = keys >> MINUTE_BITS
+        minutes = keys & ((1 << MINUTE_BITS) - 1)
+        if emit is None:
+            emit = np.ones(len(keys), dtype=bool)
+        
+        running = {column: np.concatenate([[0.0], np.cumsum(observations[column].to_numpy())])
+                   for column in self.OBSERVATION_COLUMNS}
+        rows = np.flatnonzero(emit)
+        
+        def window_sum(column, first):
+            return running[column][rows + 1] - running[column][first]
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            stamps = pd.to_datetime(minutes[rows], unit='m')
+            features = {
+                'location_key': locations[rows].astype(np.int32),
+                'date_key': (stamps.year * 10000 + stamps.month * 100 + stamps.day).to_numpy(np.int32),
+                'time_key': (stamps.hour * 100 + stamps.minute).to_numpy(np.int16),
+                'events': observations['events'].to_numpy()[rows].astype(np.int32)
+            }
+            for label, length in self.windows.items():
+                # First observation of the same location less than the window before
+                first = np.searchsorted(keys, keys[rows] - length + 1, side='left')
+                for name in ('vehicle_count', 'congestion_score'):
+                    features[f'{name}_{label}'] = window_sum(f'{name}_sum', first) / window_sum(f'{name}_n', first)
+                if label == self.longest:
+                    count = window_sum('speed_n', first)
+                    mean = window_sum('speed_sum', first) / count
+                    variance = (window_sum('speed_sumsq', first) - count * mean * mean) / (count - 1)
+                    # Running-sum differences leave rounding noise where the window has no spread
+                    variance = np.where((count > 1) & (variance > 1e-9 * mean * mean), variance, 0.0)
+                    std = np.sqrt(variance)
+                    current = observations['speed_sum'].to_numpy()[rows] / observations['speed_n'].to_numpy()[rows]
+                    features[f'avg_speed_{label}'] = mean
+                    features['speed_zscore'] = np.where(std > 0, (current - mean) / std, np.nan)
+            shortest = next(iter(self.windows))
+            features['congestion_trend'] = features[f'congestion_score_{shortest}'] - \
+                features[f'congestion_score_{self.longest}']
+        
+        df = pd.DataFrame(features)
+        measures = df.columns[4:]
+        df[measures] = df[measures].astype(np.float32)
+        return df
+    
+    def _tail(self, observations: pd.DataFrame) -> pd.DataFrame:
+        """Observations within the longest window of each location's latest one"""
+        keys = observations.index.to_numpy(np.int64)
+        locations = keys >> MINUTE_BITS
+        latest = pd.Series(keys).groupby(locations).transform('max').to_numpy()
+        return observations[keys > latest - self.windows[self.longest]]
+    
+    def _load_tail(self) -> pd.DataFrame:
+        path = os.path.join(self.dir, self.TAIL_FILE)
+        if not os.path.exists(path):
+            return self._combine([])
+        return pd.read_feather(path).set_index('key')
+    
+    def _save_tail(self, observations: pd.DataFrame):
+        os.makedirs(self.dir, exist_ok=True)
+        self._tail(observations).reset_index().to_feather(os.path.join(self.dir, self.TAIL_FILE))
+    
+    def apply(self, loader, replace: bool) -> int:
+        """
+        Write the features of this build's observations
+        Replacing rebuilds the table. Otherwise the new observations and the retained ones after
+        the earliest new observation of their location are recomputed and replace their rows;
+        rows older than the retained window are left as they are
+        """
+        new = self._combine(self._parts)
+        self._parts = []
+        if new.empty:
+            return 0
+        
+        with get_recorder().stage('features', self.TABLE, rows_in=len(new)) as metrics:
+            if replace:
+                observations, emit = new, None
+            else:
+                observations = self._combine([self._load_tail(), new])
+                new_keys = new.index.to_numpy(np.int64)
+                first_new = pd.Series(new_keys).groupby(new_keys >> MINUTE_BITS).min()
+                keys = observations.index.to_numpy(np.int64)
+                cut = first_new.reindex(keys >> MINUTE_BITS).to_numpy()
+                emit = ~np.isnan(cut) & (keys >= np.nan_to_num(cut))
+            
+            features = self.compute(observations, emit)
+            if replace:
+                loader._write(self.TABLE, features)
+            elif loader.use_db:
+                self._merge_database(loader, features)
+            else:
+                self._merge_csv(loader, features)
+            self._save_tail(observations)
+            metrics.rows_out = len(features)
+        
+        logger.info(f"{'Rebuilt' if replace else 'Updated'} {self.TABLE}: {len(features)} rows "
+                    f"across {features['location_key'].nunique()} locations")
+        return len(features)
+    
+    def _merge_csv(self, loader, features: pd.DataFrame):
+        path = os.path.join(loader.output_dir, f"{self.TABLE}.csv")
+        if not os.path.exists(path):
+            loader._write(self.TABLE, features)
+            return
+        
+        existing = pd.read_csv(path)
+        recomputed = pd.MultiIndex.from_frame(existing[self.KEY_COLUMNS]).isin(
+            pd.MultiIndex.from_frame(features[self.KEY_COLUMNS].astype(np.int64))
+        )
+        result = pd.concat([existing[~recomputed], features], ignore_index=True)
+        loader._write(self.TABLE, result.sort_values(self.KEY_COLUMNS, ignore_index=True))
+    
+    def _merge_database(self, loader, features: pd.DataFrame):
+        """Replace the recomputed rows in one transaction"""
+        schema = loader.db_config['schema']
+        qualified = f'"{schema}"."{self.TABLE}"'
+        keys = features[self.KEY_COLUMNS].astype(int).to_dict('records')
+        
+        with loader.engine.begin() as conn:
+            if inspect(conn).has_table(self.TABLE, schema=schema):
+                conn.execute(text(
+                    f"DELETE FROM {qualified} WHERE location_key = :location_key "
+                    f"AND date_key = :date_key AND time_key = :time_key"
+                ), keys)
+            features.to_sql(name=self.TABLE, schema=schema, con=conn, if_exists='append', index=False, chunksize=1000)
@@ -0,0 +1,316 @@
+import os
+import json
+import shutil
+import logging
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional, Iterable, Iterator
+
+from transformers.shared_lookup import encode_values
+
+logger = logging.getLogger(__name__)
+
+
+def _merge_sorted(codes: np.ndarray, values: np.ndarray, new_codes: np.ndarray, new_values: np.ndarray,
+                  reduce: np.ufunc):
+    """Merge (code, value) pairs into sorted unique codes, combining values of equal codes with reduce"""
+    new_order = np.argsort(new_codes)
+    codes = np.concatenate([codes, new_codes[new_order]])
+    values = np.concatenate([values, new_values[new_order].astype(values.dtype)])
+    # With both runs sorted, a stable (merge) sort combines them in linear time
+    order = np.argsort(codes, kind='stable')
+    codes, values = codes[order], values[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype=np.int64)
+    return codes[starts], reduce.reduceat(values, starts) if len(codes) else values
+
+
+class TrafficSketches:
+    """
+    Mergeable approximate aggregates of the fact table, per location and hour of day
+    - distinct vehicles: HyperLogLog over natural vehicle IDs, kept sparse (only
+      registers that were set), merged with max
+    - speed and speed excess quantiles: DDSketch log-spaced buckets whose counts add
+      up, with quantiles within relative_accuracy of the true value
+    - violation hotspots: Misra-Gries heavy-hitter counters per location
+    Registers and buckets are held as sorted int64 codes packing (location, hour,
+    register or bucket), so updating from a fact chunk is a vectorized sorted merge,
+    and sketches of separate runs or partitions merge into the sketch of their union
+    """
+    
+    QUANTILE_MEASURES = ['avg_speed', 'speed_excess']
+    GROUP_COLUMNS = ['location_key', 'hour']
+    HOURS = 24
+    BUCKET_BITS = 21
+    BUCKET_OFFSET = 1 << (BUCKET_BITS - 1)
+    ZERO_BUCKET = -BUCKET_OFFSET  # Non-positive values, below every log bucket
+    GROUP_LIMIT = 1 << 36  # location_key * HOURS + hour stays below this
+    DEFAULT_KEY = 0
+    
+    def __init__(self, config: Dict[str, Any]):
+        sketch_config = config['sketches']
+        self.precision = sketch_config['hll_precision']
+        self.relative_accuracy = sketch_config['relative_accuracy']
+        self.top_k = sketch_config['top_k']
+        self.capacity = self.top_k * 10  # Misra-Gries counters; counts are within n / capacity
+        self.log_gamma = np.log((1 + self.relative_accuracy) / (1 - self.relative_accuracy))
+        
+        self._register_codes = np.array([], dtype=np.int64)
+        self._register_ranks = np.array([], dtype=np.uint8)
+        self._bucket_codes = np.array([], dtype=np.int64)
+        self._bucket_counts = np.array([], dtype=np.int64)
+        self.heavy_hitters = pd.Series(dtype=np.int64, name='count').rename_axis('location_key')
+        self.violations = 0  # Total count behind the heavy hitters
+        self._vehicle_hashes = None  # (DimVehicle frame, hash per row), hashed once per dimension
+    
+    def _settings(self) -> Dict[str, Any]:
+        return {'hll_precision': self.precision, 'relative_accuracy': self.relative_accuracy, 'top_k': self.top_k}
+    
+    @property
+    def registers(self) -> pd.DataFrame:
+        """Set HyperLogLog registers: location_key, hour, register, rank"""
+        group = self._register_codes >> self.precision
+        return pd.DataFrame({
+            'location_key': group // self.HOURS,
+            'hour': group % self.HOURS,
+            'register': self._register_codes & ((1 << self.precision) - 1),
+            'rank': self._register_ranks
+        })
+    
+    @property
+    def buckets(self) -> pd.DataFrame:
+        """Non-empty quantile buckets: measure, location_key, hour, bucket, count"""
+        rest = self._bucket_codes >> self.BUCKET_BITS
+        group = rest % self.GROUP_LIMIT
+        return pd.DataFrame({
+            'measure': np.asarray(self.QUANTILE_MEASURES, dtype=object)[rest // self.GROUP_LIMIT],
+            'location_key': group // self.HOURS,
+            'hour': group % self.HOURS,
+            'bucket': (self._bucket_codes & ((1 << self.BUCKET_BITS) - 1)) - self.BUCKET_OFFSET,
+            'count': self._bucket_counts
+        })
+    
+    def _add_registers(self, location: np.ndarray, hour: np.ndarray, register: np.ndarray, rank: np.ndarray):
+        codes = ((location * self.HOURS + hour) << self.precision) | register
+        self._register_codes, self._register_ranks = _merge_sorted(
+            self._register_codes, self._register_ranks, codes, rank, np.maximum
+        )
+    
+    def _add_buckets(self, measure: np.ndarray, location: np.ndarray, hour: np.ndarray, bucket: np.ndarray,
+                     count: np.ndarray):
+        codes = ((measure * self.GROUP_LIMIT + location * self.HOURS + hour) << self.BUCKET_BITS) | \
+            (bucket + self.BUCKET_OFFSET)
+        self._bucket_codes, self._bucket_counts = _merge_sorted(
+            self._bucket_codes, self._bucket_counts, codes, count, np.add
+        )
+    
+    def _merge_heavy_hitters(self, counts: pd.Series, total: int):
+        """Add counters, then decrement all by the (capacity + 1)-th largest to stay within capacity"""
+        merged = self.heavy_hitters.add(counts, fill_value=0).astype(np.int64)
+        if len(merged) > self.capacity:
+            merged = merged - merged.nlargest(self.capacity + 1).iloc[-1]
+            merged = merged[merged > 0]
+        self.heavy_hitters = merged.rename('count').rename_axis('location_key')
+        self.violations += total
+    
+    def update(self, fact_df: pd.DataFrame, vehicles: Optional[pd.DataFrame] = None):
+        """Add a chunk of facts; vehicles (DimVehicle) maps vehicle keys to natural IDs"""
+        if fact_df.empty:
+            return
+        hour = (fact_df['time_key'].to_numpy(np.int64) // 100) % self.HOURS
+        location = fact_df['location_key'].to_numpy(np.int64)
+        
+        # Hash natural IDs rather than surrogate keys, which differ between rebuilds
+        vehicle_keys = pd.to_numeric(fact_df['vehicle_key'], errors='coerce').fillna(self.DEFAULT_KEY)
+        positions = pd.Index(vehicles['vehicle_key']).get_indexer(vehicle_keys) if vehicles is not None else \
+            np.full(len(fact_df), -1)
+        known = (positions >= 0) & (vehicle_keys.to_numpy() != self.DEFAULT_KEY)
+        if known.any():
+            if self._vehicle_hashes is None or self._vehicle_hashes[0] is not vehicles:
+                self._vehicle_hashes = (vehicles, encode_values(vehicles['vehicle_id'], 'text').view(np.uint64))
+            hashes = self._vehicle_hashes[1][positions[known]]
+            width = 64 - self.precision
+            remainder = hashes & np.uint64((1 << width) - 1)
+            # Rank: position of the first set bit in the remainder, from the top
+            bit_length = np.frexp(remainder.astype(np.float64))[1]
+            self._add_registers(location[known], hour[known], (hashes >> np.uint64(width)).astype(np.int64),
+                                width - bit_length + 1)
+        
+        for index, measure in enumerate(self.QUANTILE_MEASURES):
+            if measure not in fact_df.columns:
+                continue
+            values = pd.to_numeric(fact_df[measure], errors='coerce').to_numpy(np.float64, na_value=np.nan)
+            valid = ~np.isnan(values)
+            if not valid.any():
+                continue
+            values = values[valid]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                buckets = np.ceil(np.log(values) / self.log_gamma)
+            buckets = np.where(values > 0, np.clip(buckets, self.ZERO_BUCKET + 1, self.BUCKET_OFFSET - 1),
+                               self.ZERO_BUCKET).astype(np.int64)
+            self._add_buckets(np.full(len(values), index), location[valid], hour[valid], buckets,
+                              np.ones(len(values), dtype=np.int64))
+        
+        if 'speed_excess' in fact_df.columns:
+            violating = fact_df['location_key'][fact_df['speed_excess'].notna()]
+            if len(violating):
+                self._merge_heavy_hitters(violating.value_counts(), len(violating))
+    
+    def update_stream(self, chunks: Iterable[pd.DataFrame],
+                      vehicles: Optional[pd.DataFrame] = None) -> Iterator[pd.DataFrame]:
+        """Update from fact chunks as they pass through to the loader"""
+        for chunk in chunks:
+            self.update(chunk, vehicles)
+            yield chunk
+    
+    def merge(self, other: 'TrafficSketches') -> 'TrafficSketches':
+        """Merge another sketch set (e.g. another run or partition) into this one"""
+        if other._settings() != self._settings():
+            raise ValueError(f"Can't merge sketches with settings {other._settings()} into {self._settings()}")
+        self._register_codes, self._register_ranks = _merge_sorted(
+            self._register_codes, self._register_ranks, other._register_codes, other._register_ranks, np.maximum
+        )
+        self._bucket_codes, self._bucket_counts = _merge_sorted(
+            self._bucket_codes, self._bucket_counts, other._bucket_codes, other._bucket_counts, np.add
+        )
+        self._merge_heavy_hitters(other.heavy_hitters, other.violations)
+        return self
+    
+    @staticmethod
+    def _grouped(df: pd.DataFrame, by: List[str]):
+        """Group by the given columns, or everything into one group"""
+        if by:
+            return df, by
+        return df.assign(all=0), ['all']
+    
+    def distinct_vehicles(self, by: Optional[List[str]] = None) -> pd.DataFrame:
+        """Estimated distinct vehicles per group of location_key and/or hour (overall by default)"""
+        by = list(by or [])
+        registers, keys = self._grouped(self.registers, by)
+        # Registers of merged groups combine with max, like HLL unions
+        registers = registers.groupby(keys + ['register'], as_index=False)['rank'].max()
+        
+        m = 1 << self.precision
+        alpha = 0.7213 / (1 + 1.079 / m)
+        groups = registers.assign(inverse=np.exp2(-registers['rank'].astype(np.float64))).groupby(keys).agg(
+            inverse=('inverse', 'sum'), present=('rank', 'size')
+        )
+        zeros = m - groups['present']
+        raw = alpha * m * m / (groups['inverse'] + zeros)
+        # Linear counting is more accurate while many registers are still empty
+        with np.errstate(divide='ignore'):
+            linear = m * np.log(m / zeros.where(zeros > 0, 1))
+        estimate = np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+        result = groups.assign(distinct_vehicles=np.round(estimate))[['distinct_vehicles']].reset_index()
+        return result.drop(columns=['all'], errors='ignore')
+    
+    def _bucket_values(self, buckets: pd.Series) -> np.ndarray:
+        gamma = np.exp(self.log_gamma)
+        values = 2 * np.exp(buckets.to_numpy(np.float64) * self.log_gamma) / (gamma + 1)
+        return np.where(buckets.to_numpy() == self.ZERO_BUCKET, 0.0, values)
+    
+    def quantiles(self, measure: str, qs: Iterable[float] = (0.5, 0.9, 0.99),
+                  by: Optional[List[str]] = None) -> pd.DataFrame:
+        """Estimated quantiles of avg_speed or speed_excess per group of location_key and/or hour"""
+        if measure not in self.QUANTILE_MEASURES:
+            raise KeyError(f"No quantile sketch for {measure}, expected one of {self.QUANTILE_MEASURES}")
+        by = list(by or [])
+        buckets, keys = self._grouped(self.buckets[self.buckets['measure'] == measure], by)
+        buckets = buckets.groupby(keys + ['bucket'], as_index=False)['count'].sum()
+        buckets['cumulative'] = buckets.groupby(keys)['count'].cumsum()
+        totals = buckets.groupby(keys)['count'].transform('sum')
+        
+        result = buckets.groupby(keys)['count'].sum().rename('count').to_frame()
+        for q in qs:
+            # The first bucket whose cumulative count passes the rank holds the quantile
+            reached = buckets[buckets['cumulative'] > q * (totals - 1)]
+            first = reached.groupby(keys)['bucket'].first()
+            result[f"p{q * 100:g}"] = pd.Series(self._bucket_values(first), index=first.index)
+        return result.reset_index().drop(columns=['all'], errors='ignore')
+    
+    def top_violation_locations(self, k: Optional[int] = None) -> pd.DataFrame:
+        """Locations with the most speed violations; counts are lower bounds within violations / capacity"""
+        top = self.heavy_hitters.nlargest(k or self.top_k)
+        return top.rename('violations').reset_index()
+    
+    def save(self, path: str):
+        """Write the sketches to a directory as Arrow files and a JSON header"""
+        os.makedirs(path, exist_ok=True)
+        self.registers.reset_index(drop=True).to_feather(os.path.join(path, 'registers.arrow'))
+        self.buckets.reset_index(drop=True).to_feather(os.path.join(path, 'buckets.arrow'))
+        self.heavy_hitters.reset_index().to_feather(os.path.join(path, 'heavy_hitters.arrow'))
+        with open(os.path.join(path, 'sketches.json'), 'w') as f:
+            json.dump(dict(self._settings(), violations=int(self.violations)), f)
+    
+    @classmethod
+    def load(cls, path: str) -> 'TrafficSketches':
+        """Read sketches written by save"""
+        with open(os.path.join(path, 'sketches.json')) as f:
+            header = json.load(f)
+        sketches = cls({'sketches': {name: header[name] for name in ('hll_precision', 'relative_accuracy', 'top_k')}})
+        registers = pd.read_feather(os.path.join(path, 'registers.arrow'))
+        sketches._add_registers(*(registers[column].to_numpy(np.int64) for column in registers.columns))
+        buckets = pd.read_feather(os.path.join(path, 'buckets.arrow'))
+        measure = pd.Index(cls.QUANTILE_MEASURES).get_indexer(buckets['measure'])
+        sketches._add_buckets(measure, *(buckets[column].to_numpy(np.int64) for column in buckets.columns[1:]))
+        sketches.heavy_hitters = pd.read_feather(os.path.join(path, 'heavy_hitters.arrow')).set_index(
+            'location_key')['count']
+        sketches.violations = header['violations']
+        return sketches
+
+
+class SketchStore:
+    """
+    Persisted sketches, one directory per partition (a full run or a daemon batch)
+    A full rebuild of the facts replaces every partition; appends add one. Reading
+    merges the partitions, and they are compacted into one past max_partitions
+    """
+    
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        sketch_config = config['sketches']
+        self.enabled = sketch_config['enabled']
+        self.base_dir = sketch_config['dir']
+        self.max_partitions = sketch_config['max_partitions']
+    
+    def partitions(self) -> List[str]:
+        if not os.path.isdir(self.base_dir):
+            return []
+        return sorted(entry.name for entry in os.scandir(self.base_dir)
+                      if entry.is_dir() and not entry.name.startswith('.'))
+    
+    def save(self, sketches: TrafficSketches, partition: str, replace: bool = False):
+        """Persist the sketches of one partition, replacing all others for a full rebuild"""
+        tmp_path = os.path.join(self.base_dir, f".{partition}.tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        sketches.save(tmp_path)
+        if replace:
+            for name in self.partitions():
+                shutil.rmtree(os.path.join(self.base_dir, name), ignore_errors=True)
+        path = os.path.join(self.base_dir, partition)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved sketches of partition {partition} to {path}")
+        
+        if len(self.partitions()) > self.max_partitions:
+            self.compact()
+    
+    def load(self, partitions: Optional[List[str]] = None) -> TrafficSketches:
+        """Merge the sketches of the given partitions (all by default)"""
+        merged = TrafficSketches(self.config)
+        for name in partitions or self.partitions():
+            merged.merge(TrafficSketches.load(os.path.join(self.base_dir, name)))
+        return merged
+    
+    def compact(self):
+        """Merge every partition into a single one"""
+        partitions = self.partitions()
+        if len(partitions) < 2:
+            return
+        merged = self.load(partitions)
+        compacted = f"{partitions[-1]}_compacted"
+        tmp_path = os.path.join(self.base_dir, f".{compacted}.tmp")
+        merged.save(tmp_path)
+        for name in partitions:
+            shutil.rmtree(os.path.join(self.base_dir, name), ignore_errors=True)
+        os.replace(tmp_path, os.path.join(self.base_dir, compacted))
+        logger.info(f"Compacted {len(partitions)} sketch partitions into {compacted}")
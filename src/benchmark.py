@@ -0,0 +1,92 @@
+import os
+import sys
+import json
+import logging
+import argparse
+
+# Import config module
+from config.config import CONFIG
+
+from monitoring import configure_logging
+from benchmarks import (SyntheticDataGenerator, BenchmarkHarness, save_results, compare_results, check_transform_memory,
+                        TRANSFORM_MEMORY_MULTIPLE)
+
+configure_logging(CONFIG, log_file=False)
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse benchmark command line options"""
+    parser = argparse.ArgumentParser(description="Traffic Flow ETL workload generator and benchmarks")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    generate = commands.add_parser('generate', help="Generate a synthetic source dataset")
+    generate.add_argument('--rows', type=int, required=True, help="TrafficFlow rows; other tables scale from it")
+    generate.add_argument('--format', choices=['excel', 'csv', 'parquet'], default='parquet')
+    generate.add_argument('--output', required=True, help="Workbook path for excel, otherwise a directory")
+    generate.add_argument('--seed', type=int, default=42)
+    generate.add_argument('--days', type=int, default=365, help="Days of history covered by the timestamps")
+    generate.add_argument('--start-date', help="First day of the generated history (default: January 1 last year)")
+    generate.add_argument('--chunk-size', type=int, default=1000000, help="Rows generated per chunk")
+    
+    run = commands.add_parser('run', help="Benchmark every pipeline component against a dataset")
+    run.add_argument('--source', required=True, help="Excel workbook or directory of CSV/Parquet files")
+    run.add_argument('--format', default='auto', choices=['auto', 'excel', 'csv', 'parquet'])
+    run.add_argument('--repeat', type=int, default=3, help="Runs per component; the median is reported")
+    run.add_argument('--label', help="Name of the results file (default: the run id)")
+    run.add_argument('--results-dir', default=os.path.join(CONFIG['metrics']['report_dir'], 'benchmarks'))
+    run.add_argument('--baseline', help="Results file to compare against")
+    run.add_argument('--threshold', type=float, default=0.1, help="Slowdown treated as a regression (0.1 = 10%%)")
+    run.add_argument('--database', action='store_true', help="Also benchmark loading into the database")
+    run.add_argument('--max-transform-memory', type=float, default=TRANSFORM_MEMORY_MULTIPLE, metavar='MULTIPLE',
+                     help="Fail when transform RSS growth exceeds this multiple of the source data size")
+    return parser.parse_args(argv)
+
+
+def generate(args: argparse.Namespace) -> int:
+    generator = SyntheticDataGenerator(args.rows, seed=args.seed, start_date=args.start_date,
+                                       days=args.days, chunk_size=args.chunk_size)
+    manifest = generator.write(args.output, args.format)
+    logger.info(f"Generated dataset: {json.dumps(manifest['table_rows'])}")
+    return 0
+
+
+def run(args: argparse.Namespace) -> int:
+    harness = BenchmarkHarness(CONFIG, args.source, args.format, repeat=args.repeat,
+                               include_database=args.database)
+    results = harness.run()
+    save_results(results, args.results_dir, args.label)
+    
+    for key, result in results['results'].items():
+        logger.info(f"{key}: {result['wall_seconds']:.3f}s, {result['rows_per_second']:.0f} rows/s, "
+                    f"peak RSS {result['peak_rss_bytes'] / 2**20:.0f} MiB")
+    
+    memory_problem = check_transform_memory(results, args.max_transform_memory)
+    if memory_problem:
+        logger.warning(f"Memory regression: {memory_problem}")
+    
+    if not args.baseline:
+        return 1 if memory_problem else 0
+    
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = 0
+    for row in compare_results(results, baseline, args.threshold):
+        message = (f"{row['component']}: {row['baseline_seconds']:.3f}s -> {row['current_seconds']:.3f}s "
+                   f"({row['change']:+.1%})")
+        if row['regression']:
+            regressions += 1
+            logger.warning(f"Regression {message}")
+        else:
+            logger.info(message)
+    logger.info(f"{regressions} component(s) slower than baseline by more than {args.threshold:.0%}")
+    return 1 if regressions or memory_problem else 0
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    return generate(args) if args.command == 'generate' else run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
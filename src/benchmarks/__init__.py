@@ -0,0 +1,13 @@
+from .synthetic_data import SyntheticDataGenerator
+from .harness import BenchmarkHarness, save_results, compare_results, check_transform_memory, TRANSFORM_MEMORY_MULTIPLE, \
+    MEMORY_ALLOWANCE_BYTES
+
+__all__ = [
+    'SyntheticDataGenerator',
+    'BenchmarkHarness',
+    'save_results',
+    'compare_results',
+    'check_transform_memory',
+    'TRANSFORM_MEMORY_MULTIPLE',
+    'MEMORY_ALLOWANCE_BYTES'
+]
@@ -0,0 +1,229 @@
+import os
+import copy
+import json
+import shutil
+import logging
+import platform
+import statistics
+import tempfile
+import pandas as pd
+from datetime import datetime
+from typing import Dict, Any, Callable, List, Optional
+
+from extractors import TrafficDataExtractor
+from transformers import FactTableTransformer, LocationNormalizer
+from transformers.dimension import DIMENSION_TRANSFORMERS
+from loaders.warehouse_loader import WarehouseLoader
+from monitoring import get_recorder, peak_rss_bytes, current_rss_bytes
+
+logger = logging.getLogger(__name__)
+
+FACT_TABLE = 'FactTrafficEvents'
+
+# Default RSS growth of the transforms allowed per byte of source data, see check_transform_memory
+TRANSFORM_MEMORY_MULTIPLE = 3.0
+# RSS growth allowed on top of the transform memory multiple, for allocator and import overheads
+MEMORY_ALLOWANCE_BYTES = 64 * 2**20
+
+
+class BenchmarkHarness:
+    """
+    Times every pipeline component in isolation against a source dataset:
+    each extractor table (whole and chunked), each dimension transformer, the
+    fact transformer and each loader mode. Every component runs `repeat` times
+    and the median is reported, so results can be compared with a stored baseline
+    """
+    
+    def __init__(self, config: Dict[str, Any], source_path: str, source_format: str = 'auto',
+                 repeat: int = 1, include_database: bool = False):
+        self.config = copy.deepcopy(config)
+        self.config['source']['source_file'] = source_path
+        self.config['source']['source_format'] = source_format
+        self.repeat = max(1, repeat)
+        self.include_database = include_database
+        self.recorder = get_recorder()
+        self.samples: Dict[str, List[Dict[str, Any]]] = {}
+        self.transform_memory: List[Dict[str, int]] = []
+        self.source_bytes: Dict[str, int] = {}  # Memory of each source as read, before its dtype casts
+    
+    def _measure(self, stage: str, name: str, func: Callable[[], Any], rows_in: int = 0) -> Any:
+        """
+        Run func as its own recorder stage and keep only that stage's metrics
+        The stage must not share its name with one the component records, or the two are merged
+        """
+        # Components record their own nested stages; drop those so they don't double count
+        self.recorder.drain()
+        with self.recorder.stage(stage, name, rows_in=rows_in) as metrics:
+            result = func()
+            if isinstance(result, pd.DataFrame):
+                metrics.rows_out = len(result)
+            elif isinstance(result, int):
+                metrics.rows_out = result
+        for recorded in self.recorder.drain():
+            if (recorded.stage, recorded.name) == (stage, name):
+                self.samples.setdefault(f"{stage}:{name}", []).append(recorded.to_dict())
+            elif stage == 'bench_extract' and recorded.stage == 'dtypes':
+                self.source_bytes[recorded.name] = recorded.bytes_before
+        return result
+    
+    def _extract(self) -> Dict[str, pd.DataFrame]:
+        extractor = TrafficDataExtractor(self.config)
+        chunk_size = self.config['processing']['chunk_size']
+        source_data = {}
+        for table in extractor.required_tables:
+            # Extractors record an 'extract' stage per chunk themselves
+            source_data[table] = self._measure('bench_extract', table, lambda: extractor.extract(table))
+            self._measure('extract_chunks', table, lambda: sum(
+                len(chunk) for chunk in extractor.extract_chunks(table, chunk_size)
+            ))
+        return self._measure('normalize', 'locations',
+                             lambda: LocationNormalizer(self.config).normalize_sources(source_data),
+                             rows_in=sum(len(df) for df in source_data.values()))
+    
+    def _transform(self, source_data: Dict[str, pd.DataFrame]):
+        rows_in = sum(len(df) for df in source_data.values())
+        # The budget scales with the sources as read, however compactly they are then held
+        input_bytes = sum(self.source_bytes.get(table) or int(df.memory_usage(deep=True).sum())
+                          for table, df in source_data.items())
+        rss_before = current_rss_bytes()
+        dimensions = {}
+        for dim_name, transformer_class in DIMENSION_TRANSFORMERS.items():
+            transformer = transformer_class(self.config)
+            dimensions[dim_name] = self._measure('transform', dim_name,
+                                                 lambda: transformer.transform(source_data), rows_in=rows_in)
+        
+        fact_df = self._measure('fact', FACT_TABLE,
+                                lambda: FactTableTransformer(self.config).transform(source_data, dimensions),
+                                rows_in=rows_in)
+        
+        # Peak RSS of the transforms above what the extracted sources already held
+        peak = max(samples[-1]['peak_rss_bytes'] for key, samples in self.samples.items()
+                   if key.startswith(('transform:', 'fact:')))
+        self.transform_memory.append({'input_bytes': input_bytes, 'rss_growth_bytes': max(0, peak - rss_before)})
+        return dimensions, fact_df
+    
+    def _load(self, mode: str, loader: WarehouseLoader, tables: Dict[str, pd.DataFrame]):
+        chunk_size = self.config['processing']['chunk_size']
+        queue_size = self.config['processing']['load_queue_size']
+        for table_name, df in tables.items():
+            self._measure(mode, table_name, lambda: loader.load_table(table_name, df) or len(df), rows_in=len(df))
+        
+        fact_df = tables[FACT_TABLE]
+        self._measure(f"{mode}_stream", FACT_TABLE, lambda: loader.load_table_chunks(
+            FACT_TABLE, (fact_df.iloc[start:start + chunk_size] for start in range(0, len(fact_df), chunk_size)),
+            queue_size
+        ), rows_in=len(fact_df))
+    
+    def _run_once(self):
+        source_data = self._extract()
+        dimensions, fact_df = self._transform(source_data)
+        
+        tables = dict(dimensions)
+        tables['DimEnvironmental'] = tables['DimEnvironmental'].drop('date', axis=1)
+        tables[FACT_TABLE] = fact_df
+        
+        output_dir = tempfile.mkdtemp(prefix='traffic_etl_bench_')
+        try:
+            self._load('load_csv', WarehouseLoader(self.config, use_db=False, output_dir=output_dir), tables)
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        
+        if self.include_database:
+            self._load('load_db', WarehouseLoader(self.config, use_db=True), tables)
+    
+    def run(self) -> Dict[str, Any]:
+        """Run every component `repeat` times and summarize the results"""
+        self.recorder.start_run()
+        self.samples = {}
+        self.transform_memory = []
+        for iteration in range(self.repeat):
+            logger.info(f"Benchmark iteration {iteration + 1}/{self.repeat}")
+            self._run_once()
+        
+        results = {}
+        for key, samples in self.samples.items():
+            wall = [sample['wall_seconds'] for sample in samples]
+            median_wall = statistics.median(wall)
+            rows = max(samples[-1]['rows_in'], samples[-1]['rows_out'])
+            results[key] = {
+                'stage': samples[-1]['stage'],
+                'name': samples[-1]['name'],
+                'runs': len(samples),
+                'wall_seconds': round(median_wall, 6),
+                'wall_seconds_min': round(min(wall), 6),
+                'cpu_seconds': round(statistics.median(sample['cpu_seconds'] for sample in samples), 6),
+                'rows_in': samples[-1]['rows_in'],
+                'rows_out': samples[-1]['rows_out'],
+                'rows_per_second': round(rows / median_wall, 2) if median_wall > 0 else 0.0,
+                'peak_rss_bytes': max(sample['peak_rss_bytes'] for sample in samples)
+            }
+        
+        return {
+            'run_id': self.recorder.run_id,
+            'created_at': datetime.now().isoformat(),
+            'source': {
+                'path': self.config['source']['source_file'],
+                'format': TrafficDataExtractor.detect_format(self.config['source'])
+            },
+            'repeat': self.repeat,
+            'environment': {
+                'python': platform.python_version(),
+                'pandas': pd.__version__,
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count()
+            },
+            'peak_rss_bytes': peak_rss_bytes(),
+            'transform_memory': {
+                'input_bytes': self.transform_memory[-1]['input_bytes'],
+                'rss_growth_bytes': max(sample['rss_growth_bytes'] for sample in self.transform_memory)
+            },
+            'results': results
+        }
+
+
+def save_results(results: Dict[str, Any], results_dir: str, label: Optional[str] = None) -> str:
+    """Write benchmark results as JSON and return the file path"""
+    os.makedirs(results_dir, exist_ok=True)
+    results['label'] = label or results['run_id']
+    path = os.path.join(results_dir, f"benchmark_{results['label']}.json")
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Benchmark results written to {path}")
+    return path
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any],
+                    threshold: float = 0.1) -> List[Dict[str, Any]]:
+    """
+    Compare median wall time per component with a baseline run
+    A component regresses when it is slower than the baseline by more than threshold
+    """
+    comparison = []
+    for key, result in current['results'].items():
+        previous = baseline.get('results', {}).get(key)
+        if previous is None or previous['wall_seconds'] <= 0:
+            continue
+        change = result['wall_seconds'] / previous['wall_seconds'] - 1
+        comparison.append({
+            'component': key,
+            'baseline_seconds': previous['wall_seconds'],
+            'current_seconds': result['wall_seconds'],
+            'change': round(change, 4),
+            'regression': change > threshold
+        })
+    return comparison
+
+
+def check_transform_memory(results: Dict[str, Any], max_multiple: float = TRANSFORM_MEMORY_MULTIPLE) -> Optional[str]:
+    """
+    Memory regression check: the RSS growth of the transforms must stay within max_multiple
+    times the in-memory size of the extracted sources (plus a fixed allowance)
+    Returns a description of the violation, or None
+    """
+    memory = results['transform_memory']
+    limit = max_multiple * memory['input_bytes'] + MEMORY_ALLOWANCE_BYTES
+    if memory['rss_growth_bytes'] <= limit:
+        return None
+    return (f"transform RSS grew by {memory['rss_growth_bytes'] / 2**20:.0f} MiB for "
+            f"{memory['input_bytes'] / 2**20:.0f} MiB of source data, above the {limit / 2**20:.0f} MiB limit "
+            f"({max_multiple:g}x the sources + {MEMORY_ALLOWANCE_BYTES / 2**20:.0f} MiB)")
@@ -0,0 +1,268 @@
+import os
+import logging
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Dict, Any, Callable, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+
+class SyntheticDataGenerator:
+    """
+    Seeded generator for the OLTP source tables at configurable scale
+    Distributions mirror the sample workbook: diurnal timestamps with morning and
+    evening peaks, Zipf-distributed location popularity, seasonal temperatures and
+    roughly 15% of speed violations below the limit (the pipeline filters those out).
+    Categorical codes are generated first and names attached afterwards, so generation
+    is vectorized and memory is bounded by chunk_size
+    """
+    
+    # Rows per table relative to TrafficFlow, as in data/traffic_flow_data.xlsx
+    TABLE_RATIOS = {
+        'TrafficFlow': 1.0,
+        'Accidents': 2 / 3,
+        'CongestionLevels': 2 / 3,
+        'RoadConditions': 2 / 3,
+        'WeatherData': 2 / 3,
+        'SpeedViolations': 2 / 3,
+        'RoadClosures': 1 / 3
+    }
+    MIN_VEHICLES = 200
+    EXCEL_MAX_ROWS = 1048575  # Excel sheet limit minus the header row
+    
+    STREET_NAMES = ['Oak', 'Maple', 'Cedar', 'Pine', 'Elm', 'Walnut', 'Willow', 'Birch', 'Aspen', 'Spruce',
+                    'Harbor', 'Lake', 'River', 'Hill', 'Park', 'Mill', 'Church', 'Market', 'Station', 'Bridge',
+                    'Morris', 'Walton', 'Aaron', 'Steven', 'Julie', 'Cummings', 'Shields', 'Brooke', 'Miller', 'Reese']
+    STREET_SUFFIXES = ['Street', 'Avenue', 'Road', 'Lane', 'Drive', 'Way', 'Boulevard', 'Place', 'Court', 'Divide',
+                       'Manor', 'Isle', 'Pine', 'Forks', 'Views', 'Branch', 'Brook', 'Harbor', 'Loop', 'Ville']
+    VEHICLE_TYPES = {'Car': 0.45, 'Sedan': 0.12, 'SUV': 0.12, 'Truck': 0.1, 'Van': 0.07,
+                     'Bus': 0.05, 'Motorcycle': 0.05, 'Taxi': 0.03, 'Emergency': 0.01}
+    ACCIDENT_SEVERITY = {'Minor': 0.5, 'Moderate': 0.3, 'Severe': 0.15, 'Fatal': 0.05}
+    CONGESTION_LEVELS = ['Low', 'Moderate', 'High', 'Severe']
+    WEATHER_CONDITIONS = {'Clear': 0.4, 'Cloudy': 0.25, 'Rainy': 0.2, 'Foggy': 0.08, 'Snowy': 0.07}
+    SURFACES = {'Dry': 0.6, 'Wet': 0.25, 'Icy': 0.08, 'Snowy': 0.07}
+    VISIBILITY = {'Clear': 0.6, 'Rainy': 0.2, 'Foggy': 0.12, 'Snowy': 0.08}
+    CLOSURE_REASONS = {'Construction': 0.45, 'Accident': 0.25, 'Flooding': 0.1, 'Event': 0.15, 'Maintenance': 0.05}
+    SPEED_LIMITS = [30, 50, 60, 70, 80, 100]
+    
+    # Relative traffic by hour of day: overnight trough, morning and evening peaks
+    HOURLY_WEIGHTS = np.array([0.3, 0.2, 0.15, 0.15, 0.25, 0.5, 1.0, 1.6, 1.9, 1.4, 1.1, 1.1,
+                               1.2, 1.3, 1.2, 1.3, 1.6, 1.9, 2.0, 1.5, 1.0, 0.8, 0.6, 0.4])
+    
+    def __init__(self, rows: int, seed: int = 42, start_date: str = None, days: int = 365,
+                 locations_per_source: int = None, chunk_size: int = 1000000):
+        self.rows = rows
+        self.seed = seed
+        # Default to last year so every timestamp falls inside the date dimension
+        self.start = pd.Timestamp(start_date or f"{datetime.now().year - 1}-01-01")
+        self.days = days
+        self.locations_per_source = locations_per_source or max(50, int(np.sqrt(rows) * 2))
+        self.chunk_size = chunk_size
+        self._location_cache: Dict[str, List[str]] = {}
+    
+    def table_rows(self) -> Dict[str, int]:
+        """Number of rows generated for each table"""
+        counts = {table: max(1, int(self.rows * ratio)) for table, ratio in self.TABLE_RATIOS.items()}
+        counts['Vehicles'] = max(self.MIN_VEHICLES, self.rows // 50)
+        return counts
+    
+    def _rng(self, table: str, chunk_index: int) -> np.random.Generator:
+        """Independent, reproducible random stream per table and chunk"""
+        return np.random.default_rng([self.seed, sum(map(ord, table)), chunk_index])
+    
+    def _choice(self, rng: np.random.Generator, weights: Dict[str, float], size: int) -> pd.Categorical:
+        categories = list(weights)
+        probabilities = np.array(list(weights.values()))
+        codes = rng.choice(len(categories), size=size, p=probabilities / probabilities.sum())
+        return pd.Categorical.from_codes(codes, categories=categories)
+    
+    def _timestamps(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        hourly = self.HOURLY_WEIGHTS / self.HOURLY_WEIGHTS.sum()
+        seconds = (rng.integers(0, self.days, size) * 86400
+                   + rng.choice(24, size=size, p=hourly) * 3600
+                   + rng.integers(0, 3600, size))
+        return self.start.to_datetime64() + seconds.astype('timedelta64[s]')
+    
+    def _location_names(self, source: str) -> List[str]:
+        """Street names for a source, in a source-specific popularity order"""
+        combinations = len(self.STREET_NAMES) * len(self.STREET_SUFFIXES)
+        names = []
+        for i in range(self.locations_per_source):
+            name = f"{self.STREET_NAMES[i % len(self.STREET_NAMES)]} " \
+                   f"{self.STREET_SUFFIXES[(i // len(self.STREET_NAMES)) % len(self.STREET_SUFFIXES)]}"
+            names.append(name if i < combinations else f"{name} {i // combinations + 1}")
+        order = np.random.default_rng([self.seed, sum(map(ord, source))]).permutation(len(names))
+        return [names[i] for i in order]
+    
+    def _locations(self, rng: np.random.Generator, source: str, size: int) -> pd.Categorical:
+        """Zipf-like popularity over the source's street names"""
+        if source not in self._location_cache:
+            self._location_cache[source] = self._location_names(source)
+        names = self._location_cache[source]
+        weights = 1.0 / np.arange(1, len(names) + 1) ** 1.1
+        codes = rng.choice(len(names), size=size, p=weights / weights.sum())
+        return pd.Categorical.from_codes(codes, categories=names)
+    
+    def _traffic_flow(self, rng, ids, size):
+        timestamps = self._timestamps(rng, size)
+        hour_weight = self.HOURLY_WEIGHTS[pd.DatetimeIndex(timestamps).hour]
+        return pd.DataFrame({
+            'FlowID': ids,
+            'Location': self._locations(rng, 'TrafficFlow', size),
+            'VehicleCount': np.clip(rng.poisson(300 * hour_weight), 1, None),
+            'Timestamp': timestamps
+        })
+    
+    def _accidents(self, rng, ids, size):
+        return pd.DataFrame({
+            'AccidentID': ids,
+            'Location': self._locations(rng, 'Accidents', size),
+            'Severity': self._choice(rng, self.ACCIDENT_SEVERITY, size),
+            'VehiclesInvolved': np.minimum(rng.geometric(0.55, size), 6),
+            'ReportedAt': self._timestamps(rng, size)
+        })
+    
+    def _congestion_levels(self, rng, ids, size):
+        timestamps = self._timestamps(rng, size)
+        # Busier hours skew towards higher congestion levels
+        hour_weight = self.HOURLY_WEIGHTS[pd.DatetimeIndex(timestamps).hour] / self.HOURLY_WEIGHTS.max()
+        level = np.clip(np.round(rng.normal(hour_weight * 3, 0.8)), 0, 3).astype(np.int8)
+        return pd.DataFrame({
+            'CongestionID': ids,
+            'Location': self._locations(rng, 'CongestionLevels', size),
+            'Level': pd.Categorical.from_codes(level, categories=self.CONGESTION_LEVELS),
+            'RecordedAt': timestamps
+        })
+    
+    def _road_conditions(self, rng, ids, size):
+        return pd.DataFrame({
+            'ConditionID': ids,
+            'Location': self._locations(rng, 'RoadConditions', size),
+            'Surface': self._choice(rng, self.SURFACES, size),
+            'Visibility': self._choice(rng, self.VISIBILITY, size),
+            'RecordedAt': self._timestamps(rng, size)
+        })
+    
+    def _weather_data(self, rng, ids, size):
+        timestamps = self._timestamps(rng, size)
+        day_of_year = pd.DatetimeIndex(timestamps).dayofyear.to_numpy()
+        seasonal = 12 - 14 * np.cos(2 * np.pi * (day_of_year - 15) / 365)
+        return pd.DataFrame({
+            'WeatherID': ids,
+            'Temperature_C': np.round(seasonal + rng.normal(0, 4, size), 1),
+            'Humidity_Percent': np.clip(rng.normal(60, 15, size), 10, 100).astype(np.int64),
+            'Condition': self._choice(rng, self.WEATHER_CONDITIONS, size),
+            'Timestamp': timestamps
+        })
+    
+    def _speed_violations(self, rng, ids, size):
+        speed_limit = rng.choice(self.SPEED_LIMITS, size=size)
+        excess = np.round(rng.exponential(18, size)).astype(np.int64) + 1
+        below_limit = rng.random(size) < 0.15
+        excess[below_limit] = -rng.integers(0, 15, below_limit.sum())
+        return pd.DataFrame({
+            'ViolationID': ids,
+            'VehicleID': rng.integers(1, self.table_rows()['Vehicles'] + 1, size),
+            'SpeedRecorded': speed_limit + excess,
+            'SpeedLimit': speed_limit,
+            'Timestamp': self._timestamps(rng, size)
+        })
+    
+    def _road_closures(self, rng, ids, size):
+        return pd.DataFrame({
+            'ClosureID': ids,
+            'Location': self._locations(rng, 'RoadClosures', size),
+            'Reason': self._choice(rng, self.CLOSURE_REASONS, size),
+            'ClosedAt': self._timestamps(rng, size)
+        })
+    
+    def _vehicles(self, rng, ids, size):
+        letters = np.array(list('ABCDEFGHJKLMNPRSTUVWXYZ'))
+        plates = pd.Series(rng.integers(100, 1000, size)).astype(str) + '-' + \
+            pd.Series(letters[rng.integers(0, len(letters), (size, 3))].tolist()).str.join('')
+        return pd.DataFrame({
+            'VehicleID': ids,
+            'PlateNumber': plates.to_numpy(),
+            'VehicleType': self._choice(rng, self.VEHICLE_TYPES, size),
+            'OwnerID': rng.integers(1, max(2, size // 2), size)
+        })
+    
+    def _builders(self) -> Dict[str, Callable]:
+        return {
+            'TrafficFlow': self._traffic_flow,
+            'Accidents': self._accidents,
+            'CongestionLevels': self._congestion_levels,
+            'Vehicles': self._vehicles,
+            'RoadConditions': self._road_conditions,
+            'WeatherData': self._weather_data,
+            'SpeedViolations': self._speed_violations,
+            'RoadClosures': self._road_closures
+        }
+    
+    def generate_table(self, table: str) -> Iterator[pd.DataFrame]:
+        """Generate a table in chunks of at most chunk_size rows"""
+        builder = self._builders()[table]
+        total = self.table_rows()[table]
+        for chunk_index, start in enumerate(range(0, total, self.chunk_size)):
+            size = min(self.chunk_size, total - start)
+            ids = np.arange(start + 1, start + size + 1)
+            yield builder(self._rng(table, chunk_index), ids, size)
+    
+    def write(self, output_path: str, file_format: str, tables: List[str] = None) -> Dict[str, Any]:
+        """
+        Write the dataset as an Excel workbook, or as a directory of CSV or Parquet files
+        Returns a manifest describing what was generated
+        """
+        tables = tables or list(self._builders())
+        counts = self.table_rows()
+        if file_format == 'excel':
+            too_large = [table for table in tables if counts[table] > self.EXCEL_MAX_ROWS]
+            if too_large:
+                raise ValueError(f"Tables {too_large} exceed the Excel row limit; use csv or parquet at this scale")
+            with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
+                for table in tables:
+                    df = pd.concat(self.generate_table(table), ignore_index=True)
+                    df.to_excel(writer, sheet_name=table, index=False)
+                    logger.info(f"Generated {len(df)} rows for {table}")
+        elif file_format in ('csv', 'parquet'):
+            os.makedirs(output_path, exist_ok=True)
+            for table in tables:
+                self._write_table(output_path, table, file_format)
+                logger.info(f"Generated {counts[table]} rows for {table}")
+        else:
+            raise ValueError(f"Unknown format '{file_format}', expected excel, csv or parquet")
+        
+        return {
+            'path': output_path,
+            'format': file_format,
+            'seed': self.seed,
+            'rows': self.rows,
+            'start_date': self.start.date().isoformat(),
+            'days': self.days,
+            'table_rows': {table: counts[table] for table in tables}
+        }
+    
+    def _write_table(self, output_dir: str, table: str, file_format: str):
+        """Append chunks to a single file so memory stays bounded by chunk_size"""
+        path = os.path.join(output_dir, f"{table}.{file_format}")
+        if file_format == 'csv':
+            for chunk_index, chunk in enumerate(self.generate_table(table)):
+                chunk.to_csv(path, index=False, mode='w' if chunk_index == 0 else 'a', header=chunk_index == 0)
+            return
+        
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        writer = None
+        try:
+            for chunk in self.generate_table(table):
+                # Plain strings keep the schema identical across chunks with different categories
+                chunk = chunk.astype({column: str for column in chunk.select_dtypes('category').columns})
+                arrow_table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, arrow_table.schema)
+                writer.write_table(arrow_table)
+        finally:
+            if writer is not None:
+                writer.close()
@@ -14,12 +14,17 @@ DB_CONFIG = {
     'database': os.environ.get('DB_NAME', 'traffic_dwh'),
     'schema': os.environ.get('DB_SCHEMA', 'public'),
     'user': os.environ.get('DB_USER', 'dwh_user'),
-    'password': os.environ.get('DB_PASSWORD', 'dwh_password')
+    'password': os.environ.get('DB_PASSWORD', 'dwh_password'),
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+    'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800))  # seconds
 }
 
 # Source Data Configuration
 SOURCE_CONFIG = {
     'source_file': os.environ.get('SOURCE_FILE', '/app/data/traffic_flow_data.xlsx'),
+    # excel, csv, parquet (CSV/Parquet sources are directories of <table> files), http (a feed base URL)
+    # or postgres (a database URL); auto detects from the path
+    'source_format': os.environ.get('SOURCE_FORMAT', 'auto'),
     'required_tables': [
         'TrafficFlow',
         'Accidents',
@@ -36,7 +41,176 @@ SOURCE_CONFIG = {
 PROCESSING_CONFIG = {
     'log_level': os.environ.get('LOG_LEVEL', 'INFO'),
     'error_handling': os.environ.get('ERROR_HANDLING', 'continue'),
-    'error_threshold': int(os.environ.get('ERROR_THRESHOLD', 100))
+    'error_threshold': float(os.environ.get('ERROR_THRESHOLD', 100)),  # Percent of a source's rows that may be rejected
+    # Streaming mode bounds memory by chunk size instead of total source rows
+    'streaming': os.environ.get('STREAMING', 'False').lower() == 'true',
+    'chunk_size': int(os.environ.get('CHUNK_SIZE', 50000)),
+    'load_queue_size': int(os.environ.get('LOAD_QUEUE_SIZE', 4)),
+    # Processes resolving fact keys against dimension lookups in shared memory (1 = in-process)
+    'fact_workers': int(os.environ.get('FACT_WORKERS', 1)),
+    # Rebuild only these fact sources' rows of FactTrafficEvents (empty = all, see --sources in main.py)
+    'fact_sources': [source.strip() for source in os.environ.get('FACT_SOURCES', '').split(',') if source.strip()]
+}
+
+# HTTP Source Configuration (paginated JSON sensor feeds, used when SOURCE_FILE is a URL)
+HTTP_CONFIG = {
+    'feeds_file': os.environ.get('HTTP_FEEDS_FILE'),  # YAML: table -> list of feed URLs or {url, params}
+    'max_connections': int(os.environ.get('HTTP_MAX_CONNECTIONS', 32)),  # connection pool size
+    'concurrency': int(os.environ.get('HTTP_CONCURRENCY', 8)),  # requests in flight
+    'timeout': float(os.environ.get('HTTP_TIMEOUT', 30.0)),  # seconds per request
+    'retries': int(os.environ.get('HTTP_RETRIES', 5)),
+    'backoff': float(os.environ.get('HTTP_BACKOFF', 0.5)),  # seconds, doubled per retry with full jitter
+    'backoff_max': float(os.environ.get('HTTP_BACKOFF_MAX', 30.0)),
+    'page_size': int(os.environ.get('HTTP_PAGE_SIZE', 1000)),
+    'queue_size': int(os.environ.get('HTTP_QUEUE_SIZE', 16)),  # decoded pages buffered ahead of the consumer
+    'records_key': os.environ.get('HTTP_RECORDS_KEY', 'records'),
+    'cursor_key': os.environ.get('HTTP_CURSOR_KEY', 'next_cursor'),
+    'cursor_param': os.environ.get('HTTP_CURSOR_PARAM', 'cursor'),
+    'limit_param': os.environ.get('HTTP_LIMIT_PARAM', 'limit'),
+    # Last cursor of every feed, so the next run only fetches new records
+    'cursor_file': os.environ.get('HTTP_CURSOR_FILE', os.path.join(os.environ.get('OUTPUT_DIR', '/app/output'), 'http_cursors.json'))
+}
+
+# PostgreSQL Source Configuration (used when SOURCE_FILE is a postgresql:// URL)
+POSTGRES_SOURCE_CONFIG = {
+    'schema': os.environ.get('SOURCE_DB_SCHEMA', 'public'),
+    'fetch_size': int(os.environ.get('SOURCE_DB_FETCH_SIZE', 10000)),  # rows per server-side cursor fetch
+    # Table=Column pairs; only rows above the column's last stored maximum are read
+    'watermarks': dict(
+        pair.split('=', 1) for pair in os.environ.get('SOURCE_DB_WATERMARKS', '').split(',') if '=' in pair
+    ),
+    'watermark_file': os.environ.get('SOURCE_DB_WATERMARK_FILE', os.path.join(os.environ.get('OUTPUT_DIR', '/app/output'), 'source_watermarks.json'))
+}
+
+# Location Normalization Configuration
+LOCATION_CONFIG = {
+    'aliases_file': os.environ.get('LOCATION_ALIASES_FILE'),  # YAML: canonical name -> list of variants
+    'case_fold': os.environ.get('LOCATION_CASE_FOLD', 'True').lower() == 'true'
+}
+
+# Pipeline Scheduling Configuration
+PIPELINE_CONFIG = {
+    'executor': os.environ.get('PIPELINE_EXECUTOR', 'thread'),  # thread or process
+    'max_workers': int(os.environ.get('PIPELINE_MAX_WORKERS', 4))
+}
+
+# Performance Metrics Configuration
+METRICS_CONFIG = {
+    'enabled': os.environ.get('METRICS_ENABLED', 'True').lower() == 'true',
+    'report_dir': os.environ.get('METRICS_DIR', os.environ.get('OUTPUT_DIR', '/app/output')),
+    'prometheus_file': os.environ.get('METRICS_PROM_FILE')  # Defaults to traffic_etl.prom in report_dir
+}
+
+# Profiling Configuration (opt-in, see --profile in main.py)
+PROFILING_CONFIG = {
+    'stages': [stage.strip() for stage in os.environ.get('PROFILE_STAGES', '').split(',') if stage.strip()],
+    'sample_rate': float(os.environ.get('PROFILE_SAMPLE_RATE', 1.0)),
+    'tracemalloc_frames': int(os.environ.get('PROFILE_TRACEMALLOC_FRAMES', 1)),
+    'top': int(os.environ.get('PROFILE_TOP', 30)),
+    'output_dir': os.environ.get('PROFILE_DIR', os.environ.get('OUTPUT_DIR', '/app/output'))
+}
+
+# Intermediate Store Configuration (Arrow IPC files of stage results, see --resume in main.py)
+STORE_CONFIG = {
+    'enabled': os.environ.get('INTERMEDIATE_STORE', 'False').lower() == 'true',
+    'base_dir': os.environ.get('STORE_DIR', os.path.join(os.environ.get('OUTPUT_DIR', '/app/output'), 'intermediate')),
+    'retention_runs': int(os.environ.get('STORE_RETENTION_RUNS', 5)),  # newest runs kept
+    'retention_hours': float(os.environ.get('STORE_RETENTION_HOURS', 72))  # older runs are removed
+}
+
+# Transform Cache Configuration (memoized transformer outputs keyed by input fingerprints)
+CACHE_CONFIG = {
+    'enabled': os.environ.get('TRANSFORM_CACHE', 'False').lower() == 'true',
+    'dir': os.environ.get('CACHE_DIR', os.path.join(os.environ.get('OUTPUT_DIR', '/app/output'), 'cache')),
+    'max_bytes': int(float(os.environ.get('CACHE_MAX_MB', 1024)) * 1024 * 1024)
+}
+
+# Daemon Mode Configuration (see --daemon in main.py)
+DAEMON_CONFIG = {
+    'inbox_dir': os.environ.get('INBOX_DIR', '/app/data/inbox'),
+    'processed_dir': os.environ.get('PROCESSED_DIR'),  # Defaults to <inbox_dir>/processed
+    'failed_dir': os.environ.get('FAILED_DIR'),  # Defaults to <inbox_dir>/failed
+    'poll_interval': float(os.environ.get('DAEMON_POLL_INTERVAL', 2.0)),  # seconds
+    'settle_seconds': float(os.environ.get('DAEMON_SETTLE_SECONDS', 1.0)),  # drop must be unchanged this long
+    # Build the initial dimensions from SOURCE_FILE so keys match the last batch run
+    'bootstrap': os.environ.get('DAEMON_BOOTSTRAP', 'True').lower() == 'true'
+}
+
+# Backfill Configuration (see --backfill and --backfill-worker in main.py)
+BACKFILL_CONFIG = {
+    # Shared by the coordinator and every worker: queue, dimension snapshot and partition facts
+    'dir': os.environ.get('BACKFILL_DIR', os.path.join(os.environ.get('OUTPUT_DIR', '/app/output'), 'backfill')),
+    'partition': os.environ.get('BACKFILL_PARTITION', 'month'),  # day, week or month
+    'workers': int(os.environ.get('BACKFILL_WORKERS', 4)),  # local worker processes; 0 = remote workers only
+    'max_attempts': int(os.environ.get('BACKFILL_MAX_ATTEMPTS', 3)),
+    'stale_seconds': float(os.environ.get('BACKFILL_STALE_SECONDS', 600)),  # requeue after this long without a heartbeat
+    'poll_interval': float(os.environ.get('BACKFILL_POLL_INTERVAL', 5.0))  # seconds
+}
+
+# Rollup Configuration (pre-aggregated KPI tables maintained on fact loads)
+ROLLUP_CONFIG = {
+    'enabled': os.environ.get('ROLLUPS', 'True').lower() == 'true'
+}
+
+# Sketch Configuration (approximate distinct counts, quantiles and heavy hitters of the facts)
+SKETCH_CONFIG = {
+    'enabled': os.environ.get('SKETCHES', 'True').lower() == 'true',
+    'dir': os.environ.get('SKETCH_DIR', os.path.join(os.environ.get('OUTPUT_DIR', '/app/output'), 'sketches')),
+    'hll_precision': int(os.environ.get('SKETCH_HLL_PRECISION', 12)),  # 2^p registers, ~1.04/sqrt(2^p) error
+    'relative_accuracy': float(os.environ.get('SKETCH_RELATIVE_ACCURACY', 0.01)),  # of quantile estimates
+    'top_k': int(os.environ.get('SKETCH_TOP_K', 20)),
+    'max_partitions': int(os.environ.get('SKETCH_MAX_PARTITIONS', 64))  # compacted into one beyond this
+}
+
+# Episode Configuration (congestion and closure durations from contiguous readings)
+EPISODE_CONFIG = {
+    'congestion_reading_minutes': int(os.environ.get('CONGESTION_READING_MINUTES', 15)),  # span of one reading
+    'closure_default_minutes': int(os.environ.get('CLOSURE_DEFAULT_MINUTES', 120)),  # closures without ReopenedAt
+    'gap_minutes': int(os.environ.get('EPISODE_GAP_MINUTES', 15)),  # longer gaps start a new episode
+    'partitions': int(os.environ.get('EPISODE_PARTITIONS', 16)),  # spill partitions sorted one at a time
+    'dir': os.environ.get('EPISODE_DIR', '')  # spill directory, system temp dir if empty
+}
+
+# Deduplication Configuration (re-delivered source records, by natural key or content hash)
+DEDUP_CONFIG = {
+    'enabled': os.environ.get('DEDUP', 'True').lower() == 'true',
+    'dir': os.environ.get('DEDUP_DIR', os.path.join(os.environ.get('OUTPUT_DIR', '/app/output'), 'dedup')),  # seen record hashes
+    'bits_per_key': int(os.environ.get('DEDUP_BLOOM_BITS_PER_KEY', 10)),  # ~1% false positives, confirmed exactly
+    'capacity': int(os.environ.get('DEDUP_BLOOM_CAPACITY', 1000000)),  # initial keys, doubled when exceeded
+    'spill_keys': int(os.environ.get('DEDUP_SPILL_KEYS', 1000000)),  # hashes buffered in memory per build
+    'max_runs': int(os.environ.get('DEDUP_MAX_RUNS', 8))  # sorted runs kept before they are merged
+}
+
+# Feature Configuration (rolling window features per location)
+FEATURE_CONFIG = {
+    'enabled': os.environ.get('FEATURES', 'True').lower() == 'true',
+    'windows': [window.strip() for window in os.environ.get('FEATURE_WINDOWS', '15min,1h,24h').split(',') if window.strip()],
+    'dir': os.environ.get('FEATURE_DIR', os.path.join(os.environ.get('OUTPUT_DIR', '/app/output'), 'features'))  # trailing window state
+}
+
+# Dtype Configuration (compact column types for sources, dimensions and facts)
+DTYPE_CONFIG = {
+    'enabled': os.environ.get('DTYPE_PLAN', 'True').lower() == 'true',
+    'max_category_ratio': float(os.environ.get('DTYPE_MAX_CATEGORY_RATIO', 0.5))  # distinct / present values
+}
+
+# Source Profile Configuration (sampled column statistics of the sources, checked for schema drift)
+SOURCE_PROFILE_CONFIG = {
+    'enabled': os.environ.get('SOURCE_PROFILE', 'True').lower() == 'true',
+    'dir': os.environ.get('SOURCE_PROFILE_DIR', os.path.join(os.environ.get('OUTPUT_DIR', '/app/output'), 'source_profiles')),
+    'sample_size': int(os.environ.get('SOURCE_PROFILE_SAMPLE_SIZE', 10000)),  # reservoir rows per table
+    'null_rate_tolerance': float(os.environ.get('SOURCE_PROFILE_NULL_TOLERANCE', 0.05)),  # absolute change flagged as drift
+    'distinct_tolerance': float(os.environ.get('SOURCE_PROFILE_DISTINCT_TOLERANCE', 0.5)),  # relative change flagged as drift
+    'max_overhead': float(os.environ.get('SOURCE_PROFILE_MAX_OVERHEAD', 0.1))  # of read time, then only sampled
+}
+
+# Logging Configuration (structured log lines and the rate limit of repeated events)
+LOGGING_CONFIG = {
+    'format': os.environ.get('LOG_FORMAT', 'json'),  # json or console
+    'file': os.environ.get('LOG_FILE', '/app/logs/traffic_etl.log'),  # empty to log to stderr only
+    'rate_limit_burst': int(os.environ.get('LOG_RATE_LIMIT_BURST', 10)),  # records of an event per interval, 0 = unlimited
+    'rate_limit_interval': float(os.environ.get('LOG_RATE_LIMIT_INTERVAL', 60.0)),  # seconds
+    'rate_limit_samples': int(os.environ.get('LOG_RATE_LIMIT_SAMPLES', 3))  # suppressed records kept in a summary
 }
 
 
@@ -44,5 +218,23 @@ PROCESSING_CONFIG = {
 CONFIG = {
     'database': DB_CONFIG,
     'source': SOURCE_CONFIG,
-    'processing': PROCESSING_CONFIG
+    'http': HTTP_CONFIG,
+    'postgres': POSTGRES_SOURCE_CONFIG,
+    'processing': PROCESSING_CONFIG,
+    'logging': LOGGING_CONFIG,
+    'location': LOCATION_CONFIG,
+    'pipeline': PIPELINE_CONFIG,
+    'metrics': METRICS_CONFIG,
+    'profiling': PROFILING_CONFIG,
+    'store': STORE_CONFIG,
+    'cache': CACHE_CONFIG,
+    'rollups': ROLLUP_CONFIG,
+    'sketches': SKETCH_CONFIG,
+    'episodes': EPISODE_CONFIG,
+    'dedup': DEDUP_CONFIG,
+    'features': FEATURE_CONFIG,
+    'dtypes': DTYPE_CONFIG,
+    'source_profile': SOURCE_PROFILE_CONFIG,
+    'daemon': DAEMON_CONFIG,
+    'backfill': BACKFILL_CONFIG
 } 
\ No newline at end of file
@@ -1,5 +1,14 @@
-from .oltp_extractors import TrafficDataExtractor
+from .oltp_extractors import TrafficDataExtractor, ExcelExtractor, CsvExtractor, ParquetExtractor
+from .http_extractor import HttpExtractor
+from .postgres_extractor import PostgresExtractor
+from .profiler import SourceProfiler
 
 __all__ = [
-    'TrafficDataExtractor'
+    'TrafficDataExtractor',
+    'ExcelExtractor',
+    'CsvExtractor',
+    'ParquetExtractor',
+    'HttpExtractor',
+    'PostgresExtractor',
+    'SourceProfiler'
 ]
\ No newline at end of file
@@ -1,9 +1,80 @@
+import os
+import glob
+import json
 import pandas as pd
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 import logging
 
+from monitoring import get_recorder
+
 logger = logging.getLogger(__name__)
 
+# Source columns holding event timestamps (parsed when the file format doesn't type them)
+TIMESTAMP_COLUMNS = ['Timestamp', 'ReportedAt', 'RecordedAt', 'ClosedAt']
+
+# Rows of a read whose timestamp column is in [start, end): (column, start, end)
+Period = Tuple[str, pd.Timestamp, pd.Timestamp]
+
+
+class ReadPositions:
+    """
+    Stored read positions of an incremental source (feed cursors, watermarks), by key
+    The positions reached by a run are staged in <path>.<run_id>.pending and only replace
+    the stored ones when committed, once the facts read up to them are loaded, so a failed
+    load reads its rows again. Only the reads that stage positions (a run's fact pass) start
+    from the stored ones; every other read (dimensions, episodes, backfills) is complete
+    """
+    
+    def __init__(self, path: Optional[str]):
+        self.path = path
+    
+    def _pending_path(self) -> str:
+        return f"{self.path}.{get_recorder().run_id}.pending"
+    
+    @staticmethod
+    def _read(path: str) -> Dict[str, Any]:
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+    
+    @staticmethod
+    def _write(path: str, positions: Dict[str, Any]):
+        """Replace a positions file atomically"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(positions, f, indent=2, default=str)
+        os.replace(temp_path, path)
+    
+    def load(self) -> Dict[str, Any]:
+        """Committed positions"""
+        return self._read(self.path) if self.path else {}
+    
+    def stage(self, positions: Dict[str, Any]):
+        """Stage positions reached by this run, committed with commit()"""
+        if not self.path or not positions:
+            return
+        pending_path = self._pending_path()
+        staged = self._read(pending_path)
+        staged.update(positions)
+        self._write(pending_path, staged)
+    
+    def commit(self) -> int:
+        """Store the positions staged by this run, dropping those staged by runs that failed"""
+        if not self.path:
+            return 0
+        pending_path = self._pending_path()
+        staged = self._read(pending_path)
+        if staged:
+            stored = self.load()
+            stored.update(staged)
+            self._write(self.path, stored)
+            logger.info(f"Committed {len(staged)} read positions to {self.path}")
+        for path in glob.glob(f"{glob.escape(self.path)}.*.pending"):
+            os.remove(path)
+        return len(staged)
+
 
 class BaseExtractor:
     """Base class for data extractors"""
@@ -11,7 +82,29 @@ class BaseExtractor:
     def __init__(self, config: Dict[str, Any]):
         self.config = config
         self.source_file = config['source']['source_file']
+        # Read positions of an incremental source, and the tables whose reads resume from and stage them
+        self.positions: Optional[ReadPositions] = None
+        self.stage_tables = set()
+    
+    def _resumed(self, table: str) -> Dict[str, Any]:
+        """Stored positions a read of a table starts from; none unless its reads are to advance them"""
+        if self.positions is None or table not in self.stage_tables:
+            return {}
+        return self.positions.load()
+    
+    def _reached(self, table: str, positions: Dict[str, Any]):
+        """Stage the positions a complete read of a table reached, if its reads are to advance them"""
+        if self.positions is not None and table in self.stage_tables:
+            self.positions.stage(positions)
+    
+    def pushes_down(self, table: str, column: str) -> bool:
+        """Whether extract_chunks can read only the rows of a period of a table's column itself"""
+        return False
     
     def extract(self) -> pd.DataFrame:
         """Extract data from source"""
         raise NotImplementedError("Subclasses must implement extract method")
+    
+    def tables(self) -> List[str]:
+        """Names of the tables available in the source"""
+        raise NotImplementedError("Subclasses must implement tables method")
@@ -0,0 +1,250 @@
+import random
+import asyncio
+import threading
+import logging
+import pandas as pd
+import yaml
+from typing import Dict, Any, List, Iterator, Optional
+from urllib.parse import urljoin
+
+from monitoring import get_recorder
+from .base_extractor import BaseExtractor, ReadPositions, TIMESTAMP_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying: throttling and transient server errors
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+# Marks the end of a table's pages on the queue
+_DONE = object()
+
+
+class HttpExtractor(BaseExtractor):
+    """
+    Extractor for paginated JSON sensor feeds (loop detectors, camera counters)
+    Every table is served by one or more feeds. Feeds are fetched concurrently on an event
+    loop in a background thread, through one pooled session with at most `concurrency`
+    requests in flight; decoded pages pass to the caller through a bounded queue, so a
+    slow consumer pauses the fetchers instead of buffering pages.
+    
+    A page is a JSON object with a list of records and the cursor of the next page. Each
+    feed's position (its last page's cursor and the records consumed from that page) is
+    staged after its table has been read completely by the fact pass and stored once the
+    run's facts are loaded (see ReadPositions); the next run's fact pass resumes after those
+    records, while its other passes read the feeds from the start
+    """
+    
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        http_config = config.get('http', {})
+        self.base_url = self.source_file.rstrip('/') + '/'
+        self.max_connections = http_config.get('max_connections', 32)
+        self.concurrency = http_config.get('concurrency', 8)
+        self.timeout = http_config.get('timeout', 30.0)
+        self.retries = http_config.get('retries', 5)
+        self.backoff = http_config.get('backoff', 0.5)
+        self.backoff_max = http_config.get('backoff_max', 30.0)
+        self.page_size = http_config.get('page_size', 1000)
+        self.queue_size = http_config.get('queue_size', 16)
+        self.records_key = http_config.get('records_key', 'records')
+        self.cursor_key = http_config.get('cursor_key', 'next_cursor')
+        self.cursor_param = http_config.get('cursor_param', 'cursor')
+        self.limit_param = http_config.get('limit_param', 'limit')
+        self.cursor_file = http_config.get('cursor_file')
+        self.positions = ReadPositions(self.cursor_file)
+        self.feeds = self._load_feeds(http_config)
+    
+    def _load_feeds(self, http_config: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Feeds of each table, given inline or in a YAML file (table -> list of URLs or {url, params})
+        Relative URLs are resolved against the source URL
+        """
+        feed_groups = dict(http_config.get('feeds') or {})
+        feeds_file = http_config.get('feeds_file')
+        if feeds_file:
+            with open(feeds_file) as f:
+                feed_groups.update(yaml.safe_load(f) or {})
+            logger.info(f"Loaded feeds of {len(feed_groups)} tables from {feeds_file}")
+        
+        feeds = {}
+        for table, entries in feed_groups.items():
+            feeds[table] = []
+            for entry in entries or []:
+                entry = {'url': entry} if isinstance(entry, str) else dict(entry)
+                entry['url'] = urljoin(self.base_url, entry['url'])
+                entry.setdefault('params', {})
+                feeds[table].append(entry)
+        return feeds
+    
+    def _table_feeds(self, table: str) -> List[Dict[str, Any]]:
+        """Configured feeds of a table, or <source URL>/<table> when none are configured"""
+        return self.feeds.get(table) or [{'url': urljoin(self.base_url, table), 'params': {}}]
+    
+    @staticmethod
+    def _feed_id(table: str, feed: Dict[str, Any]) -> str:
+        params = '&'.join(f"{key}={value}" for key, value in sorted(feed['params'].items()))
+        return f"{table} {feed['url']}?{params}" if params else f"{table} {feed['url']}"
+    
+    def tables(self) -> List[str]:
+        """Tables with configured feeds (any required table falls back to <source URL>/<table>)"""
+        return list(self.feeds) or list(self.config['source']['required_tables'])
+    
+    async def _get(self, session, semaphore: asyncio.Semaphore, url: str, params: Dict[str, Any]) -> Any:
+        """GET a page, retrying transient failures with exponential backoff and full jitter"""
+        import aiohttp  # Only needed for HTTP sources
+        
+        for attempt in range(self.retries + 1):
+            retry_after = None
+            try:
+                async with semaphore:
+                    async with session.get(url, params=params) as response:
+                        if response.status not in RETRY_STATUSES:
+                            response.raise_for_status()
+                            return await response.json(content_type=None)
+                        retry_after = response.headers.get('Retry-After')
+                        error = f"HTTP {response.status}"
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                error = f"{type(e).__name__}: {e}"
+            
+            if attempt == self.retries:
+                raise RuntimeError(f"Giving up on {url} after {attempt + 1} attempts ({error})")
+            delay = random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+            if retry_after is not None and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            logger.warning(f"Retrying {url} in {delay:.2f}s after {error} (attempt {attempt + 1} of {self.retries})")
+            await asyncio.sleep(delay)
+    
+    async def _fetch_feed(self, session, semaphore: asyncio.Semaphore, queue: asyncio.Queue,
+                          feed: Dict[str, Any], position: Any, positions: Dict[str, Any], feed_id: str):
+        """
+        Follow one feed's cursors, queueing the records of every page
+        A feed's position is the cursor of the last page fetched and the number of its records
+        consumed, as that page is fetched again on resume and may have grown since
+        """
+        # Positions stored as a bare cursor point at the start of a page
+        position = position if isinstance(position, dict) else {'cursor': position, 'seen': 0}
+        cursor, seen = position.get('cursor'), position.get('seen', 0)
+        pages = records_total = 0
+        while True:
+            params = dict(feed['params'], **{self.limit_param: self.page_size})
+            if cursor is not None:
+                params[self.cursor_param] = cursor
+            page = await self._get(session, semaphore, feed['url'], params)
+            
+            records = page.get(self.records_key, []) if isinstance(page, dict) else page
+            next_cursor = page.get(self.cursor_key) if isinstance(page, dict) else None
+            if len(records) > seen:
+                await queue.put(records[seen:])  # Blocks while the consumer is behind
+                pages += 1
+                records_total += len(records) - seen
+            positions[feed_id] = {'cursor': cursor, 'seen': max(seen, len(records))}
+            if not records or next_cursor is None or str(next_cursor) == cursor:
+                break
+            cursor, seen = str(next_cursor), 0
+        logger.debug(f"Fetched {records_total} records in {pages} pages from {feed_id}")
+    
+    async def _produce(self, table: str, queue: asyncio.Queue, positions: Dict[str, Any]):
+        """Fetch every feed of a table concurrently, then mark the end of the queue"""
+        import aiohttp  # Only needed for HTTP sources
+        
+        try:
+            stored = self._resumed(table)
+            connector = aiohttp.TCPConnector(limit=self.max_connections)
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            semaphore = asyncio.Semaphore(self.concurrency)
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+                fetches = []
+                for feed in self._table_feeds(table):
+                    feed_id = self._feed_id(table, feed)
+                    fetches.append(self._fetch_feed(
+                        session, semaphore, queue, feed, stored.get(feed_id), positions, feed_id
+                    ))
+                await asyncio.gather(*fetches)
+            await queue.put(_DONE)
+        except Exception as e:
+            await queue.put(e)
+    
+    @staticmethod
+    async def _cancel():
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def _frame(self, records: List[Dict[str, Any]], columns: Optional[List[str]]) -> pd.DataFrame:
+        """DataFrame of decoded records, projected to the requested columns and with parsed timestamps"""
+        df = pd.DataFrame.from_records(records)
+        if columns:
+            df = df[[column for column in columns if column in df.columns]]
+        for column in TIMESTAMP_COLUMNS:
+            if column in df.columns:
+                df[column] = pd.to_datetime(df[column], errors='coerce')
+        return df
+    
+    def extract(self, table: str) -> pd.DataFrame:
+        """Extract every record of a table's feeds"""
+        try:
+            logger.info(f"Extracting data from the feeds of {table}")
+            chunks = list(self.extract_chunks(table, self.page_size))
+            df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+            logger.info(f"Extracted {len(df)} rows from {table}")
+            return df
+        except Exception as e:
+            logger.error(f"Error extracting data from {table}: {str(e)}")
+            raise
+    
+    def extract_chunks(self, table: str, chunk_size: int,
+                       columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """
+        Stream a table's feeds as DataFrames of at most chunk_size rows
+        Cursors are only staged once the whole table has been consumed
+        """
+        feeds = self._table_feeds(table)
+        logger.info(f"Streaming {len(feeds)} feeds of {table} in chunks of {chunk_size}")
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, name=f"http-{table}", daemon=True)
+        thread.start()
+        
+        async def make_queue():
+            return asyncio.Queue(maxsize=self.queue_size)
+        
+        queue = asyncio.run_coroutine_threadsafe(make_queue(), loop).result()
+        positions: Dict[str, Any] = {}
+        producer = asyncio.run_coroutine_threadsafe(self._produce(table, queue, positions), loop)
+        
+        try:
+            pending: List[Dict[str, Any]] = []
+            total = 0
+            done = False
+            while not done:
+                # Only time spent waiting for records counts towards the stage
+                with get_recorder().stage('extract', table) as metrics:
+                    while len(pending) < chunk_size:
+                        item = asyncio.run_coroutine_threadsafe(queue.get(), loop).result()
+                        if item is _DONE:
+                            done = True
+                            break
+                        if isinstance(item, Exception):
+                            raise item
+                        pending.extend(item)
+                    chunk = self._frame(pending[:chunk_size], columns) if pending else None
+                    pending = pending[chunk_size:]
+                    metrics.rows_out = len(chunk) if chunk is not None else 0
+                if chunk is not None:
+                    total += len(chunk)
+                    yield chunk
+            while pending:
+                chunk = self._frame(pending[:chunk_size], columns)
+                pending = pending[chunk_size:]
+                total += len(chunk)
+                yield chunk
+            
+            self._reached(table, positions)
+            logger.info(f"Streamed {total} rows from {table}")
+        finally:
+            # Stop fetchers still running when the consumer stops early, closing the session
+            if not producer.done():
+                asyncio.run_coroutine_threadsafe(self._cancel(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
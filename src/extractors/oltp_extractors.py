@@ -1,7 +1,15 @@
 import pandas as pd
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Iterator, Optional
 import logging
-from .base_extractor import BaseExtractor
+import os
+from itertools import islice
+from openpyxl import load_workbook
+from monitoring import get_recorder
+from src.models.dtypes import DtypePlan
+from .base_extractor import BaseExtractor, Period, TIMESTAMP_COLUMNS
+from .http_extractor import HttpExtractor
+from .postgres_extractor import PostgresExtractor
+from .profiler import SourceProfiler
 
 logger = logging.getLogger(__name__)
 
@@ -9,28 +17,297 @@ logger = logging.getLogger(__name__)
 class ExcelExtractor(BaseExtractor):
     """Extractor for Excel files"""
     
+    def tables(self) -> List[str]:
+        """Sheet names of the workbook"""
+        workbook = load_workbook(self.source_file, read_only=True)
+        try:
+            return list(workbook.sheetnames)
+        finally:
+            workbook.close()
+    
     def extract(self, sheet_name: str) -> pd.DataFrame:
         """Extract data from specified Excel sheet"""
         try:
             logger.info(f"Extracting data from {self.source_file}, sheet: {sheet_name}")
-            df = pd.read_excel(self.source_file, sheet_name=sheet_name)
+            with get_recorder().stage('extract', sheet_name) as metrics:
+                df = pd.read_excel(self.source_file, sheet_name=sheet_name)
+                metrics.rows_out = len(df)
             logger.info(f"Extracted {len(df)} rows from {sheet_name}")
             return df
         except Exception as e:
             logger.error(f"Error extracting data from {sheet_name}: {str(e)}")
             raise
+    
+    def extract_chunks(self, sheet_name: str, chunk_size: int,
+                       columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """
+        Stream an Excel sheet as DataFrames of at most chunk_size rows
+        The workbook is opened read-only so rows are parsed lazily instead of loading the sheet
+        """
+        logger.info(f"Streaming data from {self.source_file}, sheet: {sheet_name} in chunks of {chunk_size}")
+        workbook = load_workbook(self.source_file, read_only=True, data_only=True)
+        try:
+            rows = workbook[sheet_name].iter_rows(values_only=True)
+            header = list(next(rows, ()))
+            
+            # Project to the requested columns while reading (columns the sheet lacks are skipped)
+            if columns:
+                positions = [header.index(column) for column in columns if column in header]
+            else:
+                positions = list(range(len(header)))
+            names = [header[position] for position in positions]
+            
+            total = 0
+            while True:
+                # Only time spent reading counts towards the stage, not the consumer's work between chunks
+                with get_recorder().stage('extract', sheet_name) as metrics:
+                    raw_rows = list(islice(rows, chunk_size))
+                    batch = [
+                        [row[position] for position in positions]
+                        for row in raw_rows
+                        if not all(value is None for value in row)  # Skip blank rows as read_excel does
+                    ]
+                    chunk = pd.DataFrame(batch, columns=names)
+                    metrics.rows_out = len(chunk)
+                if not raw_rows:
+                    break
+                if chunk.empty:
+                    continue
+                total += len(chunk)
+                yield chunk
+            logger.info(f"Streamed {total} rows from {sheet_name}")
+        finally:
+            workbook.close()
+
+
+class CsvExtractor(BaseExtractor):
+    """Extractor for a directory of CSV files, one <table>.csv per source table"""
+    
+    def _path(self, table: str) -> str:
+        return os.path.join(self.source_file, f"{table}.csv")
+    
+    def tables(self) -> List[str]:
+        """Tables with a CSV file in the source directory"""
+        return [name[:-len('.csv')] for name in sorted(os.listdir(self.source_file)) if name.endswith('.csv')]
+    
+    def _read_options(self, path: str, columns: Optional[List[str]]) -> Dict[str, Any]:
+        """Column projection and timestamp parsing for a CSV file"""
+        header = list(pd.read_csv(path, nrows=0).columns)
+        usecols = [column for column in columns if column in header] if columns else None
+        selected = usecols if usecols is not None else header
+        return {
+            'usecols': usecols,
+            'parse_dates': [column for column in TIMESTAMP_COLUMNS if column in selected]
+        }
+    
+    def extract(self, table: str) -> pd.DataFrame:
+        """Extract data from the CSV file of a table"""
+        path = self._path(table)
+        try:
+            logger.info(f"Extracting data from {path}")
+            with get_recorder().stage('extract', table) as metrics:
+                df = pd.read_csv(path, **self._read_options(path, None))
+                metrics.rows_out = len(df)
+            logger.info(f"Extracted {len(df)} rows from {table}")
+            return df
+        except Exception as e:
+            logger.error(f"Error extracting data from {table}: {str(e)}")
+            raise
+    
+    def extract_chunks(self, table: str, chunk_size: int,
+                       columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """Stream the CSV file of a table as DataFrames of at most chunk_size rows"""
+        path = self._path(table)
+        logger.info(f"Streaming data from {path} in chunks of {chunk_size}")
+        reader = pd.read_csv(path, chunksize=chunk_size, **self._read_options(path, columns))
+        total = 0
+        with reader:
+            while True:
+                with get_recorder().stage('extract', table) as metrics:
+                    chunk = next(reader, None)
+                    metrics.rows_out = len(chunk) if chunk is not None else 0
+                if chunk is None:
+                    break
+                total += len(chunk)
+                yield chunk
+        logger.info(f"Streamed {total} rows from {table}")
+
+
+class ParquetExtractor(BaseExtractor):
+    """Extractor for a directory of Parquet files, one <table>.parquet per source table"""
+    
+    def _path(self, table: str) -> str:
+        return os.path.join(self.source_file, f"{table}.parquet")
+    
+    def tables(self) -> List[str]:
+        """Tables with a Parquet file in the source directory"""
+        return [name[:-len('.parquet')] for name in sorted(os.listdir(self.source_file)) if name.endswith('.parquet')]
+    
+    def extract(self, table: str) -> pd.DataFrame:
+        """Extract data from the Parquet file of a table"""
+        path = self._path(table)
+        try:
+            logger.info(f"Extracting data from {path}")
+            with get_recorder().stage('extract', table) as metrics:
+                df = pd.read_parquet(path)
+                metrics.rows_out = len(df)
+            logger.info(f"Extracted {len(df)} rows from {table}")
+            return df
+        except Exception as e:
+            logger.error(f"Error extracting data from {table}: {str(e)}")
+            raise
+    
+    def pushes_down(self, table: str, column: str) -> bool:
+        """Periods of timestamp columns are applied as dataset filters"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        schema = pq.read_schema(self._path(table))
+        return column in schema.names and pa.types.is_timestamp(schema.field(column).type) \
+            and schema.field(column).type.tz is None
+    
+    def extract_chunks(self, table: str, chunk_size: int, columns: Optional[List[str]] = None,
+                       period: Optional[Period] = None) -> Iterator[pd.DataFrame]:
+        """
+        Stream the Parquet file of a table one record batch at a time
+        With a period (see pushes_down), row groups whose statistics lie outside it are skipped
+        and only its rows are returned
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq  # pandas' Parquet engine, only needed for Parquet sources
+        import pyarrow.dataset as ds
+        
+        path = self._path(table)
+        logger.info(f"Streaming data from {path} in chunks of {chunk_size}")
+        parquet_file = pq.ParquetFile(path)
+        if columns:
+            columns = [column for column in columns if column in parquet_file.schema_arrow.names]
+        
+        if period is None:
+            batches = parquet_file.iter_batches(batch_size=chunk_size, columns=columns)
+        else:
+            column, start, end = period
+            column_type = parquet_file.schema_arrow.field(column).type
+            condition = (ds.field(column) >= pa.scalar(start, type=column_type)) \
+                & (ds.field(column) < pa.scalar(end, type=column_type))
+            batches = iter(ds.dataset(path, format='parquet').to_batches(
+                columns=columns, filter=condition, batch_size=chunk_size
+            ))
+        total = 0
+        while True:
+            with get_recorder().stage('extract', table) as metrics:
+                batch = next(batches, None)
+                chunk = batch.to_pandas() if batch is not None else None
+                metrics.rows_out = len(chunk) if chunk is not None else 0
+            if chunk is None:
+                break
+            if chunk.empty:
+                continue
+            total += len(chunk)
+            yield chunk
+        logger.info(f"Streamed {total} rows from {table}")
 
 
 class TrafficDataExtractor:
     """Extracts all required tables for the traffic flow data warehouse"""
     
-    def __init__(self, config: Dict[str, Any]):
-        self.excel_extractor = ExcelExtractor(config)
+    EXTRACTORS = {
+        'excel': ExcelExtractor,
+        'csv': CsvExtractor,
+        'parquet': ParquetExtractor,
+        'http': HttpExtractor,
+        'postgres': PostgresExtractor
+    }
+    
+    def __init__(self, config: Dict[str, Any], profile: bool = False, stage_tables: Optional[List[str]] = None):
+        source_format = self.detect_format(config['source'])
+        self.file_extractor = self.EXTRACTORS[source_format](config)
+        # Complete reads of these tables stage the read positions of an incremental source
+        self.file_extractor.stage_tables = set(stage_tables or [])
         self.required_tables = config['source']['required_tables']
+        self.dtypes = DtypePlan(config)
+        # Tables read whole are profiled as read, before their dtype casts
+        profiler = SourceProfiler(config)
+        self.profiler = profiler if profile and profiler.enabled else None
+    
+    @classmethod
+    def detect_format(cls, source_config: Dict[str, Any]) -> str:
+        """Source format from configuration, or from the source path when set to 'auto'"""
+        source_format = source_config.get('source_format', 'auto')
+        if source_format != 'auto':
+            if source_format not in cls.EXTRACTORS:
+                raise ValueError(f"Unknown source format '{source_format}', expected one of {list(cls.EXTRACTORS)}")
+            return source_format
+        
+        source_file = source_config['source_file']
+        if source_file.startswith(('http://', 'https://')):
+            return 'http'
+        if source_file.startswith(('postgresql://', 'postgresql+', 'postgres://')):
+            return 'postgres'
+        if os.path.isdir(source_file):
+            has_parquet = any(name.endswith('.parquet') for name in os.listdir(source_file))
+            return 'parquet' if has_parquet else 'csv'
+        return 'excel'
+    
+    def resumes(self) -> bool:
+        """Whether the fact pass reads from positions stored by earlier runs, i.e. only rows added since"""
+        positions = self.file_extractor.positions
+        return positions is not None and bool(positions.load())
+    
+    def commit_positions(self) -> int:
+        """Store the read positions staged by this run, once the facts read up to them are loaded"""
+        positions = self.file_extractor.positions
+        return positions.commit() if positions is not None else 0
+    
+    def available_tables(self) -> List[str]:
+        """Required tables present in the source, e.g. in a partial micro-batch drop"""
+        present = set(self.file_extractor.tables())
+        return [table for table in self.required_tables if table in present]
     
     def extract_all(self) -> Dict[str, pd.DataFrame]:
         """Extract all required tables"""
         data = {}
         for table in self.required_tables:
-            data[table] = self.excel_extractor.extract(table)
-        return data 
\ No newline at end of file
+            data[table] = self.extract(table)
+        return data
+    
+    def extract(self, table: str) -> pd.DataFrame:
+        """Extract a single required table"""
+        if self.profiler is None:
+            return self.dtypes.apply(table, self.file_extractor.extract(table))
+        # Read as a one-chunk stream, so the profiler can time the read
+        df, = self.profiler.profile_chunks(table, (self.file_extractor.extract(table) for _ in range(1)))
+        return self.dtypes.apply(table, df)
+    
+    def pushes_down(self, table: str, column: str) -> bool:
+        """Whether the source reads only the rows of a period itself, rather than the whole table"""
+        return self.file_extractor.pushes_down(table, column)
+    
+    def extract_chunks(self, table: str, chunk_size: int, columns: Optional[List[str]] = None,
+                       period: Optional[Period] = None) -> Iterator[pd.DataFrame]:
+        """
+        Stream a required table in chunks, optionally only the rows of a period
+        A period the source can't apply itself is applied to the chunks as they are read
+        """
+        if period is None:
+            chunks = self.file_extractor.extract_chunks(table, chunk_size, columns)
+        elif self.pushes_down(table, period[0]):
+            chunks = self.file_extractor.extract_chunks(table, chunk_size, columns, period=period)
+        else:
+            chunks = self._filter_period(table, chunk_size, columns, period)
+        if self.profiler is not None and columns is None:
+            chunks = self.profiler.profile_chunks(table, chunks)
+        for chunk in chunks:
+            yield self.dtypes.apply(table, chunk)
+    
+    def _filter_period(self, table: str, chunk_size: int, columns: Optional[List[str]],
+                       period: Period) -> Iterator[pd.DataFrame]:
+        """Rows of a period from a read of the whole table"""
+        column, start, end = period
+        read_columns = columns + [column] if columns and column not in columns else columns
+        for chunk in self.file_extractor.extract_chunks(table, chunk_size, read_columns):
+            timestamps = pd.to_datetime(chunk[column], errors='coerce')
+            rows = ((timestamps >= start) & (timestamps < end)).to_numpy()
+            if rows.any():
+                chunk = chunk[rows]
+                yield chunk if read_columns is columns else chunk.drop(columns=[column])
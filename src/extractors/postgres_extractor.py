@@ -0,0 +1,162 @@
+import logging
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Iterator, Optional
+from sqlalchemy import create_engine, inspect, types
+from sqlalchemy.sql import text
+
+from monitoring import get_recorder
+from .base_extractor import BaseExtractor, Period, ReadPositions, TIMESTAMP_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+
+class PostgresExtractor(BaseExtractor):
+    """
+    Extractor for source tables in an operational PostgreSQL database
+    SOURCE_FILE is the database URL. Tables are read through server-side (named) cursors:
+    with stream_results the psycopg2 dialect declares a named cursor, and rows are fetched
+    fetch_size at a time, so a table is never held client-side as a whole. Chunks get the
+    same dtypes whatever rows they hold, derived from the reflected column types.
+    
+    Periods of timestamp columns are read with a WHERE predicate, so only their rows are
+    fetched. With a watermark column configured for a table, the fact pass only reads rows
+    above the last stored watermark; other reads (dimensions, episodes, backfills) read the
+    whole table. The new maximum is staged once the table has been consumed and stored once
+    the run's facts are loaded (see ReadPositions)
+    """
+    
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        postgres_config = config.get('postgres', {})
+        self.schema = postgres_config.get('schema') or None
+        self.fetch_size = postgres_config.get('fetch_size', 10000)
+        self.watermarks = dict(postgres_config.get('watermarks') or {})
+        self.watermark_file = postgres_config.get('watermark_file')
+        self.positions = ReadPositions(self.watermark_file)
+        self.engine = create_engine(self.source_file, pool_pre_ping=True)
+        self._columns: Dict[str, Dict[str, Any]] = {}
+    
+    def tables(self) -> List[str]:
+        """Tables of the source schema"""
+        return inspect(self.engine).get_table_names(schema=self.schema)
+    
+    def _qualified(self, name: str) -> str:
+        preparer = self.engine.dialect.identifier_preparer
+        return f"{preparer.quote(self.schema)}.{preparer.quote(name)}" if self.schema else preparer.quote(name)
+    
+    def _column_types(self, table: str) -> Dict[str, Any]:
+        """Reflected column types of a table, in table order"""
+        if table not in self._columns:
+            columns = inspect(self.engine).get_columns(table, schema=self.schema)
+            self._columns[table] = {column['name']: column for column in columns}
+        return self._columns[table]
+    
+    @staticmethod
+    def _dtype(column: Dict[str, Any]) -> Optional[str]:
+        """pandas dtype of a column, matching what the file extractors produce ('integer': int64 or float64)"""
+        column_type = column['type']
+        if isinstance(column_type, (types.DateTime, types.Date)) or column['name'] in TIMESTAMP_COLUMNS:
+            return 'datetime64[ns]'
+        if isinstance(column_type, types.Integer):
+            return 'integer'
+        if isinstance(column_type, (types.Float, types.Numeric)):
+            return 'float64'
+        if isinstance(column_type, types.Boolean):
+            return 'bool' if not column.get('nullable', True) else 'object'
+        return None
+    
+    def pushes_down(self, table: str, column: str) -> bool:
+        """Periods of date and timestamp columns are applied in the query"""
+        column_types = self._column_types(table)
+        return column in column_types and isinstance(column_types[column]['type'], (types.DateTime, types.Date))
+    
+    def _query(self, table: str, columns: Optional[List[str]], period: Optional[Period] = None):
+        """SELECT of the projected columns, within the period and above the stored watermark when the read resumes"""
+        table_columns = self._column_types(table)
+        selected = [column for column in columns if column in table_columns] if columns else list(table_columns)
+        watermark_column = self.watermarks.get(table)
+        
+        # The watermark column is read even when not requested, to track the new maximum; with none of the
+        # requested columns present, one column is still read so chunks keep their row counts
+        read = selected + [watermark_column] if watermark_column and watermark_column not in selected else selected
+        read = read or list(table_columns)[:1]
+        preparer = self.engine.dialect.identifier_preparer
+        sql = f"SELECT {', '.join(preparer.quote(column) for column in read)} FROM {self._qualified(table)}"
+        
+        conditions, params = [], {}
+        watermark = self._resumed(table).get(table) if watermark_column else None
+        if watermark is not None:
+            # Stored as ISO text; bound as a datetime like the period bounds, not compared as text
+            if self.pushes_down(table, watermark_column):
+                watermark = pd.Timestamp(watermark).to_pydatetime()
+            conditions.append(f"{preparer.quote(watermark_column)} > :watermark")
+            params['watermark'] = watermark
+        if period is not None:
+            column, start, end = period
+            conditions.append(f"{preparer.quote(column)} >= :period_start AND {preparer.quote(column)} < :period_end")
+            params.update(period_start=start.to_pydatetime(), period_end=end.to_pydatetime())
+        if conditions:
+            sql += f" WHERE {' AND '.join(conditions)}"
+        return text(sql), params, selected, watermark_column
+    
+    def _frame(self, rows, keys: List[str], table: str) -> pd.DataFrame:
+        """DataFrame of fetched rows with the table's dtypes"""
+        df = pd.DataFrame.from_records(rows, columns=keys, coerce_float=True)
+        column_types = self._column_types(table)
+        for column in keys:
+            dtype = self._dtype(column_types[column])
+            if dtype == 'datetime64[ns]':
+                df[column] = pd.to_datetime(df[column], errors='coerce')
+            elif dtype == 'integer':
+                # Integers with nulls become floats, as when pandas reads a chunk of a file
+                df[column] = df[column].astype('float64' if df[column].isna().any() else 'int64')
+            elif dtype is not None and df[column].dtype != dtype:
+                df[column] = df[column].astype(dtype)
+        return df
+    
+    def extract(self, table: str) -> pd.DataFrame:
+        """Extract a whole table (still fetched in batches through a server-side cursor)"""
+        try:
+            logger.info(f"Extracting data from source table {table}")
+            chunks = list(self.extract_chunks(table, self.fetch_size))
+            df = pd.concat(chunks, ignore_index=True) if chunks else \
+                self._frame([], list(self._column_types(table)), table)
+            logger.info(f"Extracted {len(df)} rows from {table}")
+            return df
+        except Exception as e:
+            logger.error(f"Error extracting data from {table}: {str(e)}")
+            raise
+    
+    def extract_chunks(self, table: str, chunk_size: int, columns: Optional[List[str]] = None,
+                       period: Optional[Period] = None) -> Iterator[pd.DataFrame]:
+        """Stream a table as DataFrames of at most chunk_size rows through a named cursor, optionally of a period"""
+        query, params, selected, watermark_column = self._query(table, columns, period)
+        batch_size = min(chunk_size, self.fetch_size)
+        logger.info(f"Streaming source table {table} in chunks of {chunk_size}"
+                    + (f" above the stored {watermark_column} watermark" if 'watermark' in params else ""))
+        
+        total = 0
+        high_water = None
+        with self.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(query, params)
+            keys = list(result.keys())
+            partitions = result.partitions(chunk_size)
+            while True:
+                with get_recorder().stage('extract', table) as metrics:
+                    rows = next(partitions, None)
+                    chunk = self._frame(rows, keys, table) if rows else None
+                    metrics.rows_out = len(chunk) if chunk is not None else 0
+                if chunk is None:
+                    break
+                if watermark_column:
+                    chunk_max = chunk[watermark_column].max()
+                    if not pd.isna(chunk_max) and (high_water is None or chunk_max > high_water):
+                        high_water = chunk_max
+                total += len(chunk)
+                yield chunk if len(selected) == len(keys) else chunk[selected]
+        
+        if high_water is not None:
+            high_water = high_water.item() if isinstance(high_water, np.generic) else high_water
+            self._reached(table, {table: high_water.isoformat() if hasattr(high_water, 'isoformat') else high_water})
+        logger.info(f"Streamed {total} rows from {table}")
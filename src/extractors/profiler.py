@@ -0,0 +1,250 @@
+import os
+import json
+import math
+import time
+import logging
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterable, Iterator
+
+from monitoring import get_recorder
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TableCounters:
+    """Streaming counters and row sample of one table while it is read"""
+    rows: int = 0
+    counted: int = 0  # Rows added to the streaming counters; once over budget later rows only feed the sample
+    nulls: Dict[str, int] = field(default_factory=dict)
+    dtypes: Dict[str, List[str]] = field(default_factory=dict)  # Types the column was read as, in order seen
+    minimums: Dict[str, Any] = field(default_factory=dict)
+    maximums: Dict[str, Any] = field(default_factory=dict)
+    sample: Optional[pd.DataFrame] = None
+    weight: float = 1.0  # Algorithm L state: W and the row index of the next sampled row
+    next_row: int = 0
+    read_seconds: float = 0.0
+    profile_seconds: float = 0.0
+
+
+class SourceProfiler:
+    """
+    Sampled column profiles of the source tables, taken while they are extracted
+    Null counts and the min/max of numeric and timestamp columns are streaming counters
+    over the rows read. Distinct counts are estimated from a reservoir sample of sample_size
+    rows (Algorithm L, so the sampling work grows with the sample size and only
+    logarithmically with the rows read), and are exact when a table fits in the sample.
+    Once profiling a table has taken max_overhead of the time spent reading it, its later
+    chunks only feed the sample, and its null rates and ranges are those of the rows counted.
+    
+    Each table's profile is written to <dir>/<table>.json and compared with the one of the
+    previous run: new or missing columns, changed types, null rates moving by more than
+    null_rate_tolerance and distinct counts changing by more than distinct_tolerance of
+    the earlier count are logged as schema drift
+    """
+    
+    def __init__(self, config: Dict[str, Any]):
+        profile_config = config.get('source_profile', {})
+        self.enabled = profile_config.get('enabled', True)
+        self.dir = profile_config.get('dir', 'source_profiles')
+        self.sample_size = max(1, profile_config.get('sample_size', 10000))
+        self.null_rate_tolerance = profile_config.get('null_rate_tolerance', 0.05)
+        self.distinct_tolerance = profile_config.get('distinct_tolerance', 0.5)
+        self.max_overhead = profile_config.get('max_overhead', 0.1)  # Of the time spent reading a table
+        self._rng = np.random.default_rng()
+        self._tables: Dict[str, TableCounters] = {}
+    
+    def _skips(self, weights: np.ndarray) -> np.ndarray:
+        """Rows passed over before the next one enters the full reservoir, at each weight W"""
+        return np.floor(np.log(1 - self._rng.random(len(weights))) / np.log1p(-weights)).astype(np.int64)
+    
+    def _sample(self, counters: TableCounters, chunk: pd.DataFrame, first_row: int):
+        """Update the reservoir with a chunk whose first row is row first_row of the table"""
+        if counters.sample is None or len(counters.sample) < self.sample_size:
+            # Fill the reservoir, then start skipping
+            take = chunk.iloc[:self.sample_size - (0 if counters.sample is None else len(counters.sample))]
+            counters.sample = take if counters.sample is None else pd.concat([counters.sample, take], ignore_index=True)
+            if len(counters.sample) < self.sample_size:
+                return
+            counters.weight = float(np.exp(np.log(1 - self._rng.random()) / self.sample_size))
+            counters.next_row = first_row + len(take) + int(self._skips(np.array([counters.weight]))[0])
+        
+        # Algorithm L in batches: W shrinks by a random factor at every sampled row, and the next
+        # sampled row follows after a geometric skip at the new W, so both are cumulative sums
+        end_row = first_row + len(chunk)
+        rows, slots = [], []
+        while counters.next_row < end_row:
+            expected = self.sample_size * math.log(end_row / max(counters.next_row, 1)) + 16
+            batch = int(min(expected, end_row - counters.next_row))
+            weights = counters.weight * np.exp(np.cumsum(np.log(1 - self._rng.random(batch)) / self.sample_size))
+            sampled = counters.next_row + np.concatenate([[0], np.cumsum(self._skips(weights) + 1)])
+            count = int(np.searchsorted(sampled, end_row))
+            count = min(count, batch)
+            rows.append(sampled[:count] - first_row)
+            slots.append(self._rng.integers(self.sample_size, size=count))
+            counters.weight = float(weights[count - 1])
+            counters.next_row = int(sampled[count])
+        if not rows:
+            return
+        
+        # A sampled row replaces a random slot, and a later row of the chunk may replace it again
+        rows, slots = np.concatenate(rows), np.concatenate(slots)
+        _, last = np.unique(slots[::-1], return_index=True)
+        last = len(slots) - 1 - last
+        # The sample is a set, so replaced slots are dropped and their new rows appended
+        keep = np.ones(self.sample_size, dtype=bool)
+        keep[slots[last]] = False
+        counters.sample = pd.concat([counters.sample[keep], chunk.iloc[rows[last]]], ignore_index=True)
+    
+    def update(self, table: str, chunk: pd.DataFrame):
+        """Add a chunk of a table, as read from the source"""
+        counters = self._tables.setdefault(table, TableCounters())
+        started = time.perf_counter()
+        # The read time is only known for chunks streamed through profile_chunks
+        counted = not counters.counted or not counters.read_seconds or \
+            counters.profile_seconds <= self.max_overhead * counters.read_seconds
+        with get_recorder().stage('profile', table, rows_in=len(chunk)) as metrics:
+            nulls = chunk.isna().sum() if counted else None
+            for column in chunk.columns:
+                values = chunk[column]
+                dtypes = counters.dtypes.setdefault(column, [])
+                if str(values.dtype) not in dtypes:
+                    dtypes.append(str(values.dtype))
+                if nulls is None:
+                    continue
+                count = int(nulls[column])
+                counters.nulls[column] = counters.nulls.get(column, 0) + count
+                # Only orderable types get a range; a column read as several types keeps the first one's
+                if count == len(chunk) or len(dtypes) > 1 or not (
+                        pd.api.types.is_numeric_dtype(values) or pd.api.types.is_datetime64_any_dtype(values)):
+                    continue
+                low, high = values.min(), values.max()
+                counters.minimums[column] = min(counters.minimums.get(column, low), low)
+                counters.maximums[column] = max(counters.maximums.get(column, high), high)
+            self._sample(counters, chunk, counters.rows)
+            counters.rows += len(chunk)
+            counters.counted += len(chunk) if counted else 0
+            metrics.rows_out = len(chunk)
+        counters.profile_seconds += time.perf_counter() - started
+    
+    def profile_chunks(self, table: str, chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """Profile a table's chunks as they pass through, finishing its profile after the last one"""
+        chunks = iter(chunks)
+        counters = self._tables.setdefault(table, TableCounters())
+        while True:
+            started = time.perf_counter()
+            chunk = next(chunks, None)
+            counters.read_seconds += time.perf_counter() - started
+            if chunk is None:
+                break
+            self.update(table, chunk)
+            yield chunk
+        self.finish(table)
+    
+    @staticmethod
+    def _value(value) -> Any:
+        """JSON value of a column minimum or maximum"""
+        if isinstance(value, pd.Timestamp):
+            return value.isoformat()
+        return value.item() if isinstance(value, np.generic) else value
+    
+    def _distinct(self, sample: pd.Series, rows: int, nulls: int) -> int:
+        """
+        Distinct values of a column, estimated from its sample with the Haas-Stokes Duj1 estimator
+        (as PostgreSQL's ANALYZE does): n * d / (n - f1 + f1 * n / N) for n sampled values of N,
+        d of them distinct and f1 seen once, so an all-unique sample estimates a unique column
+        """
+        counts = sample.dropna().value_counts()
+        counts = counts[counts > 0]
+        if rows <= len(sample) or counts.empty:
+            return len(counts)
+        sampled = int(counts.sum())
+        total = max(rows - nulls, sampled)
+        once = int((counts == 1).sum())
+        estimate = sampled * len(counts) / (sampled - once + once * sampled / total)
+        return int(min(total, max(len(counts), round(estimate))))
+    
+    def profile(self, table: str) -> Dict[str, Any]:
+        """Profile of the rows of a table added so far"""
+        counters = self._tables[table]
+        sample = counters.sample if counters.sample is not None else pd.DataFrame()
+        columns = {}
+        for column, dtypes in counters.dtypes.items():
+            null_rate = counters.nulls.get(column, 0) / counters.counted if counters.counted else 0.0
+            columns[column] = {
+                'dtype': '|'.join(dtypes),
+                'null_rate': round(null_rate, 6),
+                'distinct': self._distinct(sample[column], counters.rows, int(round(null_rate * counters.rows))),
+                'distinct_exact': counters.rows <= len(sample),
+                'min': self._value(counters.minimums.get(column)),
+                'max': self._value(counters.maximums.get(column))
+            }
+        return {
+            'table': table,
+            'run_id': get_recorder().run_id,
+            'profiled_at': datetime.now().isoformat(timespec='seconds'),
+            'rows': counters.rows,
+            'counted_rows': counters.counted,
+            'sample_rows': len(sample),
+            'columns': columns
+        }
+    
+    def drift(self, previous: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+        """Schema and cardinality changes of a table since its previous profile"""
+        table = current['table']
+        changes = []
+        old_columns, new_columns = previous.get('columns', {}), current['columns']
+        for column in new_columns:
+            if column not in old_columns:
+                changes.append(f"{table}.{column} is a new column")
+        for column, old in old_columns.items():
+            new = new_columns.get(column)
+            if new is None:
+                changes.append(f"{table}.{column} is missing")
+                continue
+            if new['dtype'] != old['dtype']:
+                changes.append(f"{table}.{column} type changed from {old['dtype']} to {new['dtype']}")
+            if abs(new['null_rate'] - old['null_rate']) > self.null_rate_tolerance:
+                changes.append(f"{table}.{column} null rate changed from {old['null_rate']:.1%} to {new['null_rate']:.1%}")
+            if abs(new['distinct'] - old['distinct']) > self.distinct_tolerance * max(old['distinct'], 1):
+                changes.append(f"{table}.{column} distinct values changed from {old['distinct']} to {new['distinct']}")
+        return changes
+    
+    def _path(self, table: str) -> str:
+        return os.path.join(self.dir, f"{table}.json")
+    
+    def finish(self, table: str) -> Optional[Dict[str, Any]]:
+        """Write a table's profile, replacing the previous run's after logging the drift from it"""
+        counters = self._tables.get(table)
+        if counters is None or not counters.dtypes:
+            self._tables.pop(table, None)
+            return None
+        current = self.profile(table)
+        del self._tables[table]
+        
+        path = self._path(table)
+        previous = None
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    previous = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read the previous profile of {table}: {str(e)}")
+        current['drift'] = self.drift(previous, current) if previous is not None else []
+        for change in current['drift']:
+            logger.warning(f"Schema drift: {change}")
+        
+        os.makedirs(self.dir, exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(current, f, indent=2, default=str)
+        os.replace(temp_path, path)
+        
+        share = counters.profile_seconds / counters.read_seconds if counters.read_seconds > 0 else 0.0
+        logger.info(f"Profiled {table}: {current['rows']} rows, {len(current['columns'])} columns from a "
+                    f"{current['sample_rows']} row sample in {counters.profile_seconds:.3f}s "
+                    f"({share:.1%} of its extraction), {len(current['drift'])} drift warnings")
+        return current
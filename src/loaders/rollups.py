@@ -0,0 +1,166 @@
+import os
+import logging
+import pandas as pd
+from typing import Dict, Any, List, Iterable, Optional
+from sqlalchemy import inspect, bindparam
+from sqlalchemy.sql import text
+
+logger = logging.getLogger(__name__)
+
+
+class RollupMaintainer:
+    """
+    Aggregate fact tables for the KPIs of the design document
+    Every measure is kept as a sum and a count of non-null values, so rollups are
+    additive: a load that appends facts only merges the date partitions it touched,
+    and averages (congestion index, severity, speed excess) are sum / count
+    """
+    
+    SOURCE_TABLE = 'FactTrafficEvents'
+    HOURLY_TABLE = 'AggHourlyLocationEvent'
+    DAILY_TABLE = 'AggDailyLocation'
+    GRAINS = {
+        HOURLY_TABLE: ['date_key', 'hour', 'location_key', 'event_type_key'],
+        DAILY_TABLE: ['date_key', 'location_key']
+    }
+    MEASURES = ['vehicle_count', 'avg_speed', 'vehicles_involved', 'incident_severity_score',
+                'speed_excess', 'duration_minutes', 'congestion_level_score']
+    
+    def __init__(self, loader):
+        self.loader = loader
+    
+    def aggregate(self, fact_df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+        """Hourly x location x event type and daily x location rollups of a set of facts"""
+        columns = {'event_count': 1, 'hour': fact_df['time_key'] // 100}
+        for measure in self.MEASURES:
+            # Sums are kept in float64 whatever the compact type of the fact column
+            values = pd.to_numeric(fact_df[measure], errors='coerce').astype('float64') if measure in fact_df.columns \
+                else pd.Series(float('nan'), index=fact_df.index)
+            columns[f'{measure}_sum'] = values.fillna(0)
+            columns[f'{measure}_count'] = values.notna().astype('int64')
+        df = fact_df[['date_key', 'location_key', 'event_type_key']].assign(**columns)
+        
+        hourly = df.groupby(self.GRAINS[self.HOURLY_TABLE], as_index=False, sort=True).sum()
+        daily = hourly.drop(columns=['hour', 'event_type_key']).groupby(
+            self.GRAINS[self.DAILY_TABLE], as_index=False, sort=True
+        ).sum()
+        return {self.HOURLY_TABLE: hourly, self.DAILY_TABLE: daily}
+    
+    def combine(self, parts: Iterable[Dict[str, pd.DataFrame]]) -> Dict[str, pd.DataFrame]:
+        """Merge rollups of several fact batches into one"""
+        parts = list(parts)
+        combined = {}
+        for table, grain in self.GRAINS.items():
+            frames = [part[table] for part in parts if table in part and not part[table].empty]
+            if frames:
+                combined[table] = pd.concat(frames, ignore_index=True).groupby(
+                    grain, as_index=False, sort=True
+                ).sum()
+        return combined
+    
+    def apply(self, rollups: Dict[str, pd.DataFrame], replace: bool):
+        """Write rollups after a fact load: replace them, or merge into the touched date partitions"""
+        for table, df in rollups.items():
+            if replace:
+                self.loader._write(table, df)
+            elif self.loader.use_db:
+                self._merge_database(table, df)
+            else:
+                self._merge_csv(table, df)
+            touched = df['date_key'].nunique()
+            logger.info(f"{'Rebuilt' if replace else 'Updated'} {table}: {len(df)} rows across {touched} dates")
+    
+    def _merge_csv(self, table: str, df: pd.DataFrame):
+        path = os.path.join(self.loader.output_dir, f"{table}.csv")
+        if not os.path.exists(path):
+            self.loader._write(table, df)
+            return
+        
+        existing = pd.read_csv(path)
+        touched = existing['date_key'].isin(df['date_key'].unique())
+        merged = self.combine([{table: existing[touched]}, {table: df}])[table] if touched.any() else df
+        result = pd.concat([existing[~touched], merged], ignore_index=True)
+        self.loader._write(table, result.sort_values(self.GRAINS[table], ignore_index=True))
+    
+    def _merge_database(self, table: str, df: pd.DataFrame):
+        """Re-aggregate the touched date partitions in one transaction"""
+        schema = self.loader.db_config['schema']
+        dates = [int(date_key) for date_key in df['date_key'].unique()]
+        qualified = f'"{schema}"."{table}"'
+        
+        with self.loader.engine.begin() as conn:
+            if inspect(conn).has_table(table, schema=schema):
+                select = text(f"SELECT * FROM {qualified} WHERE date_key IN :dates").bindparams(
+                    bindparam('dates', expanding=True)
+                )
+                existing = pd.read_sql(select, conn, params={'dates': dates})
+                delete = text(f"DELETE FROM {qualified} WHERE date_key IN :dates").bindparams(
+                    bindparam('dates', expanding=True)
+                )
+                conn.execute(delete, {'dates': dates})
+                df = self.combine([{table: existing}, {table: df}])[table]
+            df.to_sql(name=table, schema=schema, con=conn, if_exists='append', index=False, chunksize=1000)
+    
+    def replace_range(self, fact_parts: List[Dict[str, pd.DataFrame]], start_key: int, end_key: int):
+        """Replace the rollups of the date keys in [start_key, end_key) by those of a new set of facts"""
+        self._replace_dates(
+            fact_parts, 'date_key >= :start_key AND date_key < :end_key', {'start_key': start_key, 'end_key': end_key},
+            lambda date_keys: (date_keys < start_key) | (date_keys >= end_key), f"dates {start_key} to {end_key}"
+        )
+    
+    def rebuild_dates(self, dates: List[int], chunk_size: int = 100000):
+        """Re-aggregate the rollups of some date partitions from the loaded facts"""
+        if not dates:
+            return
+        parts = []
+        if self.loader.use_db:
+            schema = self.loader.db_config['schema']
+            select = text(f'SELECT * FROM "{schema}"."{self.SOURCE_TABLE}" WHERE date_key IN :dates').bindparams(
+                bindparam('dates', expanding=True)
+            )
+            with self.loader.engine.connect() as conn:
+                for chunk in pd.read_sql(select, conn, params={'dates': dates}, chunksize=chunk_size):
+                    parts.append(self.aggregate(chunk))
+        else:
+            path = os.path.join(self.loader.output_dir, f"{self.SOURCE_TABLE}.csv")
+            for chunk in pd.read_csv(path, chunksize=chunk_size):
+                chunk = chunk[chunk['date_key'].isin(dates)]
+                if not chunk.empty:
+                    parts.append(self.aggregate(chunk))
+        self._replace_dates(
+            parts, 'date_key IN :dates', {'dates': dates}, lambda date_keys: ~date_keys.isin(dates),
+            f"{len(dates)} dates", expanding=['dates']
+        )
+    
+    def _replace_dates(self, fact_parts: List[Dict[str, pd.DataFrame]], where: str, params: Dict[str, Any],
+                       keep, description: str, expanding: Optional[List[str]] = None):
+        """Replace the rollup rows selected by a condition (SQL, and keep() on CSV date keys) by new rollups"""
+        rollups = self.combine(fact_parts)
+        for table in self.GRAINS:
+            df = rollups.get(table)
+            if self.loader.use_db:
+                schema = self.loader.db_config['schema']
+                delete = text(f'DELETE FROM "{schema}"."{table}" WHERE {where}')
+                if expanding:
+                    delete = delete.bindparams(*(bindparam(name, expanding=True) for name in expanding))
+                with self.loader.engine.begin() as conn:
+                    if inspect(conn).has_table(table, schema=schema):
+                        conn.execute(delete, params)
+                    if df is not None:
+                        df.to_sql(name=table, schema=schema, con=conn, if_exists='append', index=False, chunksize=1000)
+            else:
+                path = os.path.join(self.loader.output_dir, f"{table}.csv")
+                frames = [df] if df is not None else []
+                if os.path.exists(path):
+                    existing = pd.read_csv(path)
+                    frames.insert(0, existing[keep(existing['date_key'])])
+                if frames:
+                    result = pd.concat(frames, ignore_index=True)
+                    self.loader._write(table, result.sort_values(self.GRAINS[table], ignore_index=True))
+            logger.info(f"Replaced {table} for {description}: {0 if df is None else len(df)} rows")
+    
+    def refresh(self, fact_parts: List[Dict[str, pd.DataFrame]], replace: bool):
+        """Combine per-chunk rollups of one fact load and apply them"""
+        rollups = self.combine(fact_parts)
+        if rollups:
+            self.apply(rollups, replace)
@@ -1,71 +1,322 @@
 import pandas as pd
 import os
-from sqlalchemy import create_engine
+import json
+from sqlalchemy import create_engine, inspect, bindparam
 import logging
-from typing import Dict, Any
+import queue
+import threading
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 from sqlalchemy.sql import text
+from monitoring import get_recorder
+from loaders.rollups import RollupMaintainer
 
 logger = logging.getLogger(__name__)
 
 class WarehouseLoader:
     """Loader for warehouse tables (dimensions and facts)"""
     
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], use_db: Optional[bool] = None, output_dir: Optional[str] = None):
         self.config = config
         self.db_config = config['database']
-        self.output_dir = os.environ.get('OUTPUT_DIR', '/app/output')
-        self.use_db = os.environ.get('USE_DATABASE', 'True').lower() == 'true'
+        # Explicit arguments override the environment, e.g. to benchmark both loader modes
+        self.output_dir = output_dir or os.environ.get('OUTPUT_DIR', '/app/output')
+        self.use_db = use_db if use_db is not None else os.environ.get('USE_DATABASE', 'True').lower() == 'true'
         
         if self.use_db:
             # Create database connection
             self.connection_string = f"{self.db_config['type']}://{self.db_config['user']}:{self.db_config['password']}@{self.db_config['host']}:{self.db_config['port']}/{self.db_config['database']}"
-            self.engine = create_engine(self.connection_string)
+            # Pre-ping and recycle pooled connections, which long-running daemon mode keeps open
+            self.engine = create_engine(
+                self.connection_string,
+                pool_size=self.db_config['pool_size'],
+                pool_recycle=self.db_config['pool_recycle'],
+                pool_pre_ping=True
+            )
             logger.info(f"Database connection established to {self.db_config['host']}:{self.db_config['port']}/{self.db_config['database']}")
         else:
             # Ensure output directory exists
             os.makedirs(self.output_dir, exist_ok=True)
             logger.info(f"CSV output directory set to {self.output_dir}")
+        
+        self.rollups = RollupMaintainer(self) if config['rollups']['enabled'] else None
+    
+    def _maintains_rollups(self, table_name: str) -> bool:
+        return self.rollups is not None and table_name == RollupMaintainer.SOURCE_TABLE
+    
+    def _write(self, table_name: str, df: pd.DataFrame, append: bool = False):
+        """Write a dataframe to the database or CSV file, replacing the table unless appending"""
+        with get_recorder().stage('load', table_name, rows_in=len(df)) as metrics:
+            if self.use_db:
+                # Load to database
+                schema = self.db_config['schema']
+                table = f"{schema}.{table_name}"
+                
+                try:
+                    df.to_sql(
+                        name=table_name,
+                        schema=schema,
+                        con=self.engine,
+                        if_exists='append' if append else 'replace',
+                        index=False,
+                        chunksize=1000
+                    )
+                    logger.debug(f"Wrote {len(df)} rows to database table {table}")
+                except Exception as e:
+                    logger.error(f"Error loading {table_name} to database: {str(e)}")
+                    raise
+            else:
+                # Save to CSV
+                output_path = os.path.join(self.output_dir, f"{table_name}.csv")
+                # Appending to a table that doesn't exist yet (a daemon's first batch) starts it with a header
+                append = append and os.path.exists(output_path) and os.path.getsize(output_path) > 0
+                df.to_csv(output_path, index=False, mode='a' if append else 'w', header=not append)
+            metrics.rows_out = len(df)
     
     def load_table(self, table_name: str, df: pd.DataFrame):
         """Load dataframe to database or CSV file"""
         if df.empty:
             logger.warning(f"Empty dataframe for {table_name}, skipping load")
             return
-            
+        
+        self._write(table_name, df)
+        if self._maintains_rollups(table_name):
+            self.rollups.refresh([self.rollups.aggregate(df)], replace=True)
+        if self.use_db:
+            logger.info(f"Loaded {len(df)} rows to database table {self.db_config['schema']}.{table_name}")
+        else:
+            logger.info(f"Saved {len(df)} rows to CSV file {os.path.join(self.output_dir, f'{table_name}.csv')}")
+    
+    def load_table_chunks(self, table_name: str, chunks: Iterable[pd.DataFrame], queue_size: int = 4,
+                          append: bool = False) -> int:
+        """
+        Load a stream of dataframe chunks into one table, replacing it unless appending
+        Chunks are handed to a writer thread through a bounded queue, so a producer
+        that outpaces the database blocks instead of buffering chunks in memory.
+        Rollups of a fact table are aggregated per chunk and written once at the end
+        """
+        chunk_queue = queue.Queue(maxsize=queue_size)
+        errors = []
+        rows_loaded = 0
+        rollup_parts = [] if self._maintains_rollups(table_name) else None
+        
+        def writer():
+            nonlocal rows_loaded
+            append_chunk = append
+            while True:
+                chunk = chunk_queue.get()
+                if chunk is None:
+                    return
+                try:
+                    self._write(table_name, chunk, append=append_chunk)
+                    append_chunk = True
+                    rows_loaded += len(chunk)
+                    if rollup_parts is not None:
+                        rollup_parts.append(self.rollups.aggregate(chunk))
+                except Exception as e:
+                    errors.append(e)
+                    return
+        
+        writer_thread = threading.Thread(target=writer, name=f"{table_name}-writer", daemon=True)
+        writer_thread.start()
+        
+        try:
+            for chunk in chunks:
+                if chunk.empty:
+                    continue
+                # Block while the queue is full, but stop producing if the writer failed
+                while writer_thread.is_alive():
+                    try:
+                        chunk_queue.put(chunk, timeout=1)
+                        break
+                    except queue.Full:
+                        continue
+                if errors:
+                    break
+        finally:
+            if writer_thread.is_alive():
+                chunk_queue.put(None)
+            writer_thread.join()
+        
+        if errors:
+            raise errors[0]
+        if rollup_parts:
+            self.rollups.refresh(rollup_parts, replace=not append)
+        
+        target = f"database table {self.db_config['schema']}.{table_name}" if self.use_db else \
+            f"CSV file {os.path.join(self.output_dir, f'{table_name}.csv')}"
+        logger.info(f"Streamed {rows_loaded} rows to {target}")
+        return rows_loaded
+    
+    def replace_slice(self, table_name: str, chunks: Iterable[pd.DataFrame], fact_slice: Dict[str, Any]) -> int:
+        """
+        Replace the fact rows of some sources (see FactTableTransformer.source_slice) by a stream of chunks
+        Rows of the other sources are left untouched. With a database the delete and the inserts
+        run in one transaction; a CSV table is rewritten to a temporary file that replaces it
+        once complete. Rollups are re-aggregated for the dates of the removed and the new rows
+        """
+        where = 'event_type_key IN :event_type_keys OR (event_type_key = :default_key AND location_key IN :location_keys)'
+        params = {key: fact_slice[key] for key in ['event_type_keys', 'default_key', 'location_keys']}
+        expanding = [bindparam('event_type_keys', expanding=True), bindparam('location_keys', expanding=True)]
+        dates = set()
+        rows_loaded = 0
+        
+        with get_recorder().stage('load', table_name) as metrics:
+            if self.use_db:
+                schema = self.db_config['schema']
+                qualified = f'"{schema}"."{table_name}"'
+                with self.engine.begin() as conn:
+                    removed = 0
+                    if inspect(conn).has_table(table_name, schema=schema):
+                        select = text(f"SELECT DISTINCT date_key FROM {qualified} WHERE {where}").bindparams(*expanding)
+                        dates.update(int(row[0]) for row in conn.execute(select, params))
+                        delete = text(f"DELETE FROM {qualified} WHERE {where}").bindparams(*expanding)
+                        removed = conn.execute(delete, params).rowcount
+                    for chunk in chunks:
+                        if chunk.empty:
+                            continue
+                        chunk.to_sql(name=table_name, schema=schema, con=conn, if_exists='append', index=False,
+                                     chunksize=1000)
+                        rows_loaded += len(chunk)
+                        dates.update(int(date_key) for date_key in chunk['date_key'].unique())
+            else:
+                output_path = os.path.join(self.output_dir, f"{table_name}.csv")
+                temp_path = f"{output_path}.tmp"
+                header = True
+                removed = 0
+                try:
+                    if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+                        existing = pd.read_csv(output_path)
+                        event_type_keys = existing['event_type_key']
+                        in_slice = event_type_keys.isin(params['event_type_keys']) | (
+                            (event_type_keys == params['default_key'])
+                            & existing['location_key'].isin(params['location_keys'])
+                        )
+                        removed = int(in_slice.sum())
+                        dates.update(int(date_key) for date_key in existing.loc[in_slice, 'date_key'].unique())
+                        existing[~in_slice].to_csv(temp_path, index=False)
+                        header = False
+                        del existing
+                    for chunk in chunks:
+                        if chunk.empty:
+                            continue
+                        chunk.to_csv(temp_path, index=False, mode='w' if header else 'a', header=header)
+                        header = False
+                        rows_loaded += len(chunk)
+                        dates.update(int(date_key) for date_key in chunk['date_key'].unique())
+                    if not header:
+                        os.replace(temp_path, output_path)
+                finally:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+            metrics.rows_in = metrics.rows_out = rows_loaded
+        
+        if self._maintains_rollups(table_name):
+            self.rollups.rebuild_dates(sorted(dates))
+        logger.info(f"Replaced {removed} {table_name} rows of {', '.join(fact_slice['sources'])} "
+                    f"with {rows_loaded} rows")
+        return rows_loaded
+    
+    @staticmethod
+    def _rejects_in_period(rejects: pd.DataFrame, period: Tuple[pd.Timestamp, pd.Timestamp],
+                           timestamps: Dict[str, str]) -> pd.Series:
+        """Rejects whose record's timestamp column (source -> column) falls in [start, end)"""
+        start, end = period
+        values = [
+            json.loads(record).get(timestamps.get(source_table)) if isinstance(record, str) else None
+            for source_table, record in zip(rejects['source_table'], rejects['record'])
+        ]
+        dates = pd.to_datetime(pd.Series(values, index=rejects.index, dtype=object), errors='coerce')
+        return (dates >= start) & (dates < end)
+    
+    def load_rejects(self, table_name: str, df: pd.DataFrame, sources: Optional[List[str]] = None,
+                     period: Optional[Tuple[pd.Timestamp, pd.Timestamp]] = None,
+                     timestamps: Optional[Dict[str, str]] = None) -> int:
+        """
+        Load the rejected source rows of a run (see DataQualityRules)
+        With sources, the earlier rejects of those sources are replaced, in one transaction with a
+        database; without, the rows are appended to the rejects of earlier runs. With a period too,
+        only the earlier rejects whose record's timestamp (timestamps: source -> column) is in
+        [start, end) are replaced, as a backfill of that range rebuilds its facts
+        """
+        with get_recorder().stage('load', table_name, rows_in=len(df)) as metrics:
+            if self.use_db:
+                schema = self.db_config['schema']
+                qualified = f'"{schema}"."{table_name}"'
+                with self.engine.begin() as conn:
+                    if sources and inspect(conn).has_table(table_name, schema=schema):
+                        if period is None:
+                            delete = text(f"DELETE FROM {qualified} WHERE source_table IN :sources") \
+                                .bindparams(bindparam('sources', expanding=True))
+                            conn.execute(delete, {'sources': list(sources)})
+                        else:
+                            select = text(f"SELECT DISTINCT source_table, record FROM {qualified} "
+                                          f"WHERE source_table IN :sources").bindparams(bindparam('sources', expanding=True))
+                            existing = pd.DataFrame(conn.execute(select, {'sources': list(sources)}).fetchall(),
+                                                    columns=['source_table', 'record'])
+                            replaced = existing[self._rejects_in_period(existing, period, timestamps)]
+                            if not replaced.empty:
+                                conn.execute(text(f"DELETE FROM {qualified} WHERE source_table = :source_table "
+                                                  f"AND record = :record"), replaced.to_dict('records'))
+                    if not df.empty:
+                        df.to_sql(name=table_name, schema=schema, con=conn, if_exists='append', index=False, chunksize=1000)
+            else:
+                output_path = os.path.join(self.output_dir, f"{table_name}.csv")
+                exists = os.path.exists(output_path) and os.path.getsize(output_path) > 0
+                if sources and exists:
+                    existing = pd.read_csv(output_path, dtype=str, keep_default_na=False)
+                    replaced = existing['source_table'].isin(sources)
+                    if period is not None:
+                        replaced &= self._rejects_in_period(existing, period, timestamps)
+                    pd.concat([existing[~replaced], df], ignore_index=True).to_csv(output_path, index=False)
+                elif not df.empty:
+                    df.to_csv(output_path, index=False, mode='a' if exists else 'w', header=not exists)
+            metrics.rows_out = len(df)
+        
+        if not df.empty:
+            logger.info(f"Loaded {len(df)} rejected records to {table_name}")
+        return len(df)
+    
+    def read_table(self, table_name: str) -> Optional[pd.DataFrame]:
+        """A loaded table, or None if it doesn't exist yet"""
         if self.use_db:
-            # Load to database
             schema = self.db_config['schema']
-            table = f"{schema}.{table_name}"
-            
+            if not inspect(self.engine).has_table(table_name, schema=schema):
+                return None
+            return pd.read_sql_table(table_name, self.engine, schema=schema)
+        output_path = os.path.join(self.output_dir, f"{table_name}.csv")
+        if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+            return None
+        return pd.read_csv(output_path)
+    
+    def max_value(self, table_name: str, column: str) -> Optional[int]:
+        """Largest value of a column in a loaded table, or None if the table doesn't exist yet"""
+        if self.use_db:
+            # Quote the names: pandas creates tables with case-sensitive identifiers
+            qualified = f'"{self.db_config["schema"]}"."{table_name}"'
             try:
-                df.to_sql(
-                    name=table_name,
-                    schema=schema,
-                    con=self.engine,
-                    if_exists='replace',
-                    index=False,
-                    chunksize=1000
-                )
-                logger.info(f"Loaded {len(df)} rows to database table {table}")
+                with self.engine.connect() as conn:
+                    result = conn.execute(text(f"SELECT MAX({column}) FROM {qualified}"))
+                    value = result.scalar()
             except Exception as e:
-                logger.error(f"Error loading {table_name} to database: {str(e)}")
-                raise
+                logger.warning(f"Could not read {column} from {table_name}: {str(e)}")
+                return None
         else:
-            # Save to CSV
             output_path = os.path.join(self.output_dir, f"{table_name}.csv")
-            df.to_csv(output_path, index=False)
-            logger.info(f"Saved {len(df)} rows to CSV file {output_path}")
-
+            if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+                return None
+            value = pd.read_csv(output_path, usecols=[column])[column].max()
+        return None if pd.isna(value) else int(value)
+    
     async def load_dimension(self, dimension_name, data):
         try:
             async with self.engine.begin() as conn:
                 # SCD Type 2 implementation
                 await self._handle_scd2_updates(conn, dimension_name, data)
-                
+        
         except Exception as e:
             self.logger.error(f"Dimension load failed: {str(e)}")
             raise
-
+    
     async def load_facts(self, fact_data):
         try:
             async with self.engine.begin() as conn:
@@ -2,7 +2,10 @@ import pandas as pd
 import logging
 import os
 import sys
-from typing import Dict, Any
+import argparse
+import threading
+from functools import partial
+from typing import Dict, Any, List
 from datetime import datetime
 
 # Import config module
@@ -10,79 +13,524 @@ from config.config import CONFIG
 
 # Import extractors and transformers
 from extractors import TrafficDataExtractor
-from transformers.dimension import (
-    LocationDimensionTransformer,
-    DateDimensionTransformer,
-    TimeDimensionTransformer,
-    VehicleDimensionTransformer,
-    EventTypeDimensionTransformer,
-    EnvironmentalDimensionTransformer
+from transformers.dimension import DIMENSION_TRANSFORMERS, STATIC_DIMENSIONS, DIMENSION_NATURAL_KEYS, merge_dimension
+from transformers import (
+    FactTableTransformer, LocationNormalizer, TransformCache, EpisodeDetector, RecordDeduplicator, DataQualityRules
 )
-from transformers import FactTableTransformer
 
 # Import loaders
 from loaders.warehouse_loader import WarehouseLoader
 
-# Configure logging
-log_level = getattr(logging, CONFIG['processing']['log_level'])
-logging.basicConfig(
-    level=log_level,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/app/logs/traffic_etl.log'),
-        logging.StreamHandler()
-    ]
-)
+# Import pipeline scheduler and instrumentation
+from pipeline import DagExecutor, IntermediateStore
+from monitoring import get_recorder, StageProfiler, configure_logging
+from service import IngestDaemon, BackfillRunner
+from analytics import TrafficSketches, SketchStore, RollingFeatures
+from src.models.dtypes import DtypePlan
+
+# Configure logging: JSON lines written by a listener thread, with repeated events rate limited
+configure_logging(CONFIG)
 
 logger = logging.getLogger(__name__)
 
+FACT_TABLE = 'FactTrafficEvents'
 
-def main():
-    """Main ETL process"""
-    start_time = datetime.now()
-    logger.info("Starting Traffic Flow ETL process")
+# One loader per process so concurrent load nodes share its connection pool
+_loader = None
+_loader_lock = threading.Lock()
+
+
+def get_loader(config: Dict[str, Any]) -> WarehouseLoader:
+    """Return the loader shared by all nodes running in this process"""
+    global _loader
+    with _loader_lock:
+        if _loader is None:
+            _loader = WarehouseLoader(config)
+        return _loader
+
+
+def fact_sources(config: Dict[str, Any]) -> List[str]:
+    """Fact sources this run builds: those selected with --sources, or all of them"""
+    selected = config['processing'].get('fact_sources') or list(FactTableTransformer.SOURCE_TIMESTAMPS)
+    unknown = [source_name for source_name in selected if source_name not in FactTableTransformer.SOURCE_TIMESTAMPS]
+    if unknown:
+        raise ValueError(f"Unknown fact sources {unknown}, expected some of {list(FactTableTransformer.SOURCE_TIMESTAMPS)}")
+    return [source_name for source_name in FactTableTransformer.SOURCE_TIMESTAMPS if source_name in selected]
+
+
+def position_tables(config: Dict[str, Any]) -> List[str]:
+    """Fact sources whose fact pass resumes from and advances the stored read positions (none in a rebuild)"""
+    return [] if config['processing'].get('fact_sources') else fact_sources(config)
+
+
+def resumes(config: Dict[str, Any]) -> bool:
+    """Whether the fact sources are read from positions stored by earlier runs, so only new rows are read"""
+    return bool(position_tables(config)) and TrafficDataExtractor(config).resumes()
+
+
+def incremental(config: Dict[str, Any]) -> bool:
+    """
+    Whether this run adds the rows read since the stored positions to the loaded ones
+    Its facts are appended and its dimensions merged into the loaded ones, keeping their keys
+    """
+    return bool(config['processing'].get('incremental'))
+
+
+def extract_sources(config: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, pd.DataFrame]:
+    """Extract every required table and canonicalize its locations"""
+    logger.info("Starting data extraction")
+    extractor = TrafficDataExtractor(config, profile=True, stage_tables=position_tables(config))
+    source_data = extractor.extract_all()
+    logger.info(f"Extracted data from {len(source_data)} tables")
     
-    try:
-        # Use configuration from config.py
-        config = CONFIG
-        
-        # 1. EXTRACT
-        logger.info("Starting data extraction")
-        extractor = TrafficDataExtractor(config)
-        source_data = extractor.extract_all()
-        logger.info(f"Extracted data from {len(source_data)} tables")
-        
-        # 2. TRANSFORM DIMENSIONS
-        logger.info("Starting dimension transformations")
+    # Canonicalize location names once so every stage shares the same categorical codes
+    return LocationNormalizer(config).normalize_sources(source_data)
+
+
+def extract_dimension_sources(config: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, pd.DataFrame]:
+    """
+    Extract only what the dimensions need, without materializing fact sources
+    Non-fact tables are read whole; fact tables are reduced to their distinct locations
+    """
+    logger.info("Starting dimension source extraction")
+    extractor = TrafficDataExtractor(config, profile=True)
+    chunk_size = config['processing']['chunk_size']
+    
+    source_data = {}
+    for table in extractor.required_tables:
+        if table not in FactTableTransformer.SOURCE_TIMESTAMPS:
+            source_data[table] = extractor.extract(table)
+            continue
         
-        # Transform each dimension
-        dimensions = {
-            'DimLocation': LocationDimensionTransformer(config).transform(source_data),
-            'DimDate': DateDimensionTransformer(config).transform(),
-            'DimTime': TimeDimensionTransformer(config).transform(),
-            'DimVehicle': VehicleDimensionTransformer(config).transform(source_data),
-            'DimEventType': EventTypeDimensionTransformer(config).transform(),
-            'DimEnvironmental': EnvironmentalDimensionTransformer(config).transform(source_data)
-        }
-        # 3. TRANSFORM FACT TABLE
-        logger.info("Starting fact table transformation")
-        fact_transformer = FactTableTransformer(config)
-        fact_traffic_events = fact_transformer.transform(source_data, dimensions)
+        locations = []
+        for chunk in extractor.extract_chunks(table, chunk_size, columns=['Location']):
+            if 'Location' in chunk.columns:
+                locations.append(pd.Series(chunk['Location'].unique()))
+        locations = pd.concat(locations, ignore_index=True).drop_duplicates() if locations else pd.Series(dtype=object)
+        source_data[table] = pd.DataFrame({'Location': locations})
+    
+    return LocationNormalizer(config).normalize_sources(source_data)
+
+
+def run_transform(config: Dict[str, Any], table_name: str, transformer, inputs: tuple, rows_in: int) -> pd.DataFrame:
+    """Run a transformer as a measured stage, reusing a cached result when its inputs are unchanged"""
+    cache = TransformCache(config)
+    with get_recorder().stage('transform', table_name, rows_in=rows_in) as metrics:
+        df, hit = cache.transform(transformer, *inputs)
+        metrics.rows_out = len(df)
+        if cache.enabled:
+            metrics.cache_hits, metrics.cache_misses = (1, 0) if hit else (0, 1)
+    return df
+
+
+def transform_dimension(config: Dict[str, Any], dim_name: str, inputs: Dict[str, Any]) -> pd.DataFrame:
+    """
+    Build a single dimension, from source data unless it is static
+    An incremental run merges it into the loaded one, so the keys of the facts loaded before stay valid
+    """
+    transformer = DIMENSION_TRANSFORMERS[dim_name](config)
+    source_data = inputs.get('extract')
+    rows_in = sum(len(df) for df in source_data.values()) if source_data else 0
+    transform_inputs = (source_data,) if source_data is not None else ()
+    df = run_transform(config, dim_name, transformer, transform_inputs, rows_in)
+    if incremental(config) and dim_name in DIMENSION_NATURAL_KEYS:
+        # DimEnvironmental is loaded without its date, so it is rebuilt from the weather read whole
+        current = get_loader(config).read_table(dim_name)
+        _, natural_key = DIMENSION_NATURAL_KEYS[dim_name]
+        if current is not None and all(column in current.columns for column in natural_key):
+            df = merge_dimension(dim_name, current, df)
+    return df
+
+
+def dedup_sources(config: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, pd.DataFrame]:
+    """Drop records repeated within the fact sources (a full load ignores earlier loads, an incremental one doesn't)"""
+    source_data = dict(inputs['extract'])
+    dedup = RecordDeduplicator(config, replace=not incremental(config))
+    for source_name in fact_sources(config):
+        if source_name in source_data:
+            source_data[source_name] = dedup.filter(source_name, source_data[source_name])
+    dedup.discard()
+    for source_name, count in dedup.dropped.items():
+        logger.info(f"Dropped {count} duplicate {source_name} records")
+    return source_data
+
+
+def record_seen_keys(config: Dict[str, Any], inputs: Dict[str, Any]) -> int:
+    """
+    Replace the seen record keys with those of the loaded fact sources
+    A rebuild of some sources adds their new keys instead, as the set mixes every source's keys
+    """
+    selective = bool(config['processing'].get('fact_sources'))
+    dedup = RecordDeduplicator(config, replace=not selective and not incremental(config), rebuild=selective)
+    for source_name in fact_sources(config):
+        if source_name in inputs['dedup']:
+            dedup.filter(source_name, inputs['dedup'][source_name])
+    dedup.commit()
+    return dedup.store.count
+
+
+def transform_facts(config: Dict[str, Any], inputs: Dict[str, Any]) -> pd.DataFrame:
+    """Build the fact table from source data and every dimension"""
+    logger.info("Starting fact table transformation")
+    dimensions = {dim_name: inputs[f'transform:{dim_name}'] for dim_name in DIMENSION_TRANSFORMERS}
+    source_data = inputs['dedup'] if 'dedup' in inputs else inputs['extract']
+    source_data = {
+        table: df for table, df in source_data.items()
+        if table in fact_sources(config) or table not in FactTableTransformer.SOURCE_TIMESTAMPS
+    }
+    rows_in = sum(len(df) for df in source_data.values())
+    transformer = FactTableTransformer(config)
+    fact_df = run_transform(config, FACT_TABLE, transformer, (source_data, dimensions), rows_in)
+    # A cached result leaves the rejects loaded by the run that built it
+    if transformer.quality.checked:
+        load_rejects(config, transformer.quality)
+    return fact_df
+
+
+def load_rejects(config: Dict[str, Any], quality: DataQualityRules) -> int:
+    """Replace the rejected records of the transformed fact sources by those of this run (an incremental run appends them)"""
+    sources = None if incremental(config) else fact_sources(config)
+    return get_loader(config).load_rejects(DataQualityRules.REJECT_TABLE, quality.drain(), sources)
+
+
+def detect_episodes(config: Dict[str, Any], inputs: Dict[str, Any]):
+    """Detect congestion and closure episodes in a chunked pass over their sources"""
+    extractor = TrafficDataExtractor(config)
+    detector = EpisodeDetector(config)
+    chunk_size = config['processing']['chunk_size']
+    return detector.detect(
+        (source_name, chunk)
+        for source_name in EpisodeDetector.SOURCES
+        if source_name in extractor.required_tables and source_name in fact_sources(config)
+        for chunk in extractor.extract_chunks(source_name, chunk_size, columns=detector.columns(source_name))
+    )
+
+
+def stream_facts(config: Dict[str, Any], store: IntermediateStore, inputs: Dict[str, Any]) -> int:
+    """Stream fact sources chunk by chunk through key resolution into the loader"""
+    logger.info("Starting streaming fact table build")
+    dimensions = {dim_name: inputs[f'transform:{dim_name}'] for dim_name in DIMENSION_TRANSFORMERS}
+    # This is the run's last read of the fact sources, so it alone advances their read positions
+    extractor = TrafficDataExtractor(config, profile=True, stage_tables=position_tables(config))
+    processing_config = config['processing']
+    episode_durations = inputs['episodes']
+    
+    def source_chunks():
+        for source_name in fact_sources(config):
+            if source_name in extractor.required_tables:
+                for chunk in extractor.extract_chunks(source_name, processing_config['chunk_size']):
+                    yield source_name, chunk
+    
+    # Re-delivered records are dropped before key resolution; the seen keys are replaced once loaded
+    selective = bool(processing_config.get('fact_sources'))
+    appending = incremental(config)
+    dedup = RecordDeduplicator(config, replace=not selective and not appending, rebuild=selective)
+    loader = get_loader(config)
+    transformer = FactTableTransformer(config)
+    transformer.episode_durations = episode_durations
+    first_event_id = (loader.max_value(FACT_TABLE, 'event_id') or 0) + 1 if selective or appending else 1
+    fact_chunks = transformer.transform_stream(dedup.filter_stream(source_chunks()), dimensions, first_event_id)
+    if store.enabled:
+        fact_chunks = stored_chunks(store, FACT_TABLE, fact_chunks)
+    # Sketches and features summarize the whole fact table, so a rebuild of some sources leaves them
+    sketch_store = SketchStore(config)
+    sketches = TrafficSketches(config) if sketch_store.enabled and not selective else None
+    if sketches is not None:
+        fact_chunks = sketches.update_stream(fact_chunks, dimensions['DimVehicle'])
+    features = RollingFeatures(config)
+    features.enabled = features.enabled and not selective
+    if features.enabled:
+        fact_chunks = features.update_stream(fact_chunks)
+    
+    try:
+        if selective:
+            fact_slice = FactTableTransformer.source_slice(dimensions, fact_sources(config))
+            rows = loader.replace_slice(FACT_TABLE, fact_chunks, fact_slice)
+        else:
+            rows = loader.load_table_chunks(FACT_TABLE, fact_chunks, processing_config['load_queue_size'],
+                                            append=appending)
+    except Exception:
+        dedup.discard()
+        raise
+    finally:
+        episode_durations.cleanup()
+    dedup.commit()
+    extractor.commit_positions()
+    load_rejects(config, transformer.quality)
+    if sketches is not None:
+        sketch_store.save(sketches, get_recorder().run_id, replace=not appending)
+    if features.enabled:
+        features.apply(loader, replace=not appending)
+    return rows
+
+
+def commit_positions(config: Dict[str, Any], inputs: Dict[str, Any]) -> int:
+    """Store the read positions of the fact sources once their facts are loaded"""
+    return TrafficDataExtractor(config).commit_positions()
+
+
+def stored_chunks(store: IntermediateStore, table_name: str, chunks):
+    """Keep a copy of every chunk in the intermediate store as it passes through"""
+    for number, chunk in enumerate(chunks):
+        store.put(f"{table_name}/part-{number:05d}", chunk)
+        yield chunk
+
+
+def sketch_facts(config: Dict[str, Any], inputs: Dict[str, Any]) -> int:
+    """Sketch the loaded facts and persist the sketches, replacing those of earlier runs unless incremental"""
+    fact_df = inputs[f'transform:{FACT_TABLE}']
+    recorder = get_recorder()
+    with recorder.stage('sketch', FACT_TABLE, rows_in=len(fact_df)) as metrics:
+        sketches = TrafficSketches(config)
+        sketches.update(fact_df, inputs['transform:DimVehicle'])
+        SketchStore(config).save(sketches, recorder.run_id, replace=not incremental(config))
+        metrics.rows_out = len(fact_df)
+    return len(fact_df)
+
+
+def build_features(config: Dict[str, Any], inputs: Dict[str, Any]) -> int:
+    """Rebuild the rolling window features of the loaded fact table (an incremental run updates them)"""
+    features = RollingFeatures(config)
+    features.update(inputs[f'transform:{FACT_TABLE}'])
+    return features.apply(get_loader(config), replace=not incremental(config))
+
+
+def load_table(config: Dict[str, Any], table_name: str, inputs: Dict[str, Any]) -> int:
+    """Load one transformed table into the warehouse"""
+    df = inputs[f'transform:{table_name}']
+    
+    # Remove date column from environmental dimension (It was there for mapping purposes)
+    if table_name == 'DimEnvironmental':
+        df = df.drop('date', axis=1)
+    
+    get_loader(config).load_table(table_name, df)
+    return len(df)
+
+
+def append_facts(config: Dict[str, Any], table_name: str, inputs: Dict[str, Any]) -> int:
+    """Append the facts of an incremental run, numbering them after the last event ID"""
+    df = inputs[f'transform:{table_name}']
+    loader = get_loader(config)
+    first_event_id = (loader.max_value(table_name, 'event_id') or 0) + 1
+    if not df.empty:
+        df = df.assign(event_id=df['event_id'] - df['event_id'].min() + first_event_id)
+    return loader.load_table_chunks(table_name, [df], config['processing']['load_queue_size'], append=True)
+
+
+def load_fact_slice(config: Dict[str, Any], inputs: Dict[str, Any]) -> int:
+    """Replace the loaded facts of the selected sources, numbering the new rows after the last event ID"""
+    df = inputs[f'transform:{FACT_TABLE}']
+    dimensions = {dim_name: inputs[f'transform:{dim_name}'] for dim_name in ['DimEventType', 'DimLocation']}
+    loader = get_loader(config)
+    first_event_id = (loader.max_value(FACT_TABLE, 'event_id') or 0) + 1
+    if not df.empty:
+        df = df.assign(event_id=df['event_id'] - df['event_id'].min() + first_event_id)
+    fact_slice = FactTableTransformer.source_slice(dimensions, fact_sources(config))
+    return loader.replace_slice(FACT_TABLE, [df], fact_slice)
+
+
+def build_pipeline(config: Dict[str, Any], store: IntermediateStore, facts: bool = True) -> DagExecutor:
+    """Declare the ETL stages and their dependencies; without facts only the dimensions are built and loaded"""
+    profiler = StageProfiler(config, get_recorder().run_id)
+    dag = DagExecutor(config, wrap=profiler.wrap, store=store)
+    
+    streaming = config['processing']['streaming']
+    
+    # 1. EXTRACT - in streaming mode fact sources are read later, chunk by chunk
+    dag.add_node('extract', partial(extract_dimension_sources if streaming or not facts else extract_sources, config))
+    
+    # 2. TRANSFORM DIMENSIONS - static dimensions don't wait for extraction
+    for dim_name in DIMENSION_TRANSFORMERS:
+        depends_on = [] if dim_name in STATIC_DIMENSIONS else ['extract']
+        dag.add_node(f'transform:{dim_name}', partial(transform_dimension, config, dim_name), depends_on)
+    
+    # 3. LOAD DIMENSIONS - each dimension loads as soon as it is built
+    for dim_name in DIMENSION_TRANSFORMERS:
+        dag.add_node(f'load:{dim_name}', partial(load_table, config, dim_name), [f'transform:{dim_name}'])
+    
+    dimension_transforms = [f'transform:{dim_name}' for dim_name in DIMENSION_TRANSFORMERS]
+    dimension_loads = [f'load:{dim_name}' for dim_name in DIMENSION_TRANSFORMERS]
+    if not facts:
+        return dag
+    
+    # 4. TRANSFORM AND LOAD FACT TABLE - only after every dimension it references is loaded
+    if streaming:
+        # Episode durations need a pass over whole sources, which runs alongside the dimensions
+        dag.add_node('episodes', partial(detect_episodes, config))
+        dag.add_node(
+            f'load:{FACT_TABLE}',
+            partial(stream_facts, config, store),
+            ['episodes'] + dimension_transforms + dimension_loads
+        )
+    else:
+        dedup = config['dedup']['enabled']
+        selective = bool(config['processing'].get('fact_sources'))
+        if dedup:
+            dag.add_node('dedup', partial(dedup_sources, config), ['extract'])
+        dag.add_node(
+            f'transform:{FACT_TABLE}',
+            partial(transform_facts, config),
+            ['dedup' if dedup else 'extract'] + dimension_transforms
+        )
+        if selective:
+            dag.add_node(
+                f'load:{FACT_TABLE}',
+                partial(load_fact_slice, config),
+                [f'transform:{FACT_TABLE}', 'transform:DimEventType', 'transform:DimLocation'] + dimension_loads
+            )
+        else:
+            dag.add_node(
+                f'load:{FACT_TABLE}',
+                partial(append_facts if incremental(config) else load_table, config, FACT_TABLE),
+                [f'transform:{FACT_TABLE}'] + dimension_loads
+            )
         
-        # 4. LOAD DATA WAREHOUSE
-        logger.info("Starting data warehouse loading")
-        loader = WarehouseLoader(config)
+        # Seen record keys are replaced once the facts they identify are loaded
+        if dedup:
+            dag.add_node(f'dedup:{FACT_TABLE}', partial(record_seen_keys, config), ['dedup', f'load:{FACT_TABLE}'])
         
-        # Remove date column from environmental dimension (It was there for mapping purposes)
-        if 'DimEnvironmental' in dimensions:
-            dimensions['DimEnvironmental'] = dimensions['DimEnvironmental'].drop('date', axis=1)
+        # Incremental sources resume after the rows loaded, not after those read
+        dag.add_node(f'positions:{FACT_TABLE}', partial(commit_positions, config), [f'load:{FACT_TABLE}'])
         
-        # Load dimensions first (in correct order for foreign keys)
-        for dim_name, dim_df in dimensions.items():
-            loader.load_table(dim_name, dim_df)
+        # 5. SKETCHES - persisted once the facts they summarize are loaded (streaming updates them per chunk)
+        # Sketches and features cover the whole fact table, so a rebuild of some sources leaves them
+        if config['sketches']['enabled'] and not selective:
+            dag.add_node(
+                f'sketch:{FACT_TABLE}',
+                partial(sketch_facts, config),
+                [f'transform:{FACT_TABLE}', 'transform:DimVehicle', f'load:{FACT_TABLE}']
+            )
         
-        # Load fact table
-        loader.load_table('FactTrafficEvents', fact_traffic_events)
+        # 6. FEATURES - rolling windows per location over the loaded facts
+        if config['features']['enabled'] and not selective:
+            dag.add_node(
+                f'features:{FACT_TABLE}',
+                partial(build_features, config),
+                [f'transform:{FACT_TABLE}', f'load:{FACT_TABLE}']
+            )
+    
+    return dag
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    """Parse command line options that override config.py"""
+    parser = argparse.ArgumentParser(description="Traffic Flow Data Warehouse ETL")
+    parser.add_argument(
+        '--profile', metavar='STAGES',
+        help="Comma-separated stages to profile with cProfile and tracemalloc, "
+             "e.g. 'extract,transform:FactTrafficEvents,load' or 'all'"
+    )
+    parser.add_argument(
+        '--profile-sample-rate', type=float, metavar='RATE',
+        help="Fraction of selected stage runs that are actually profiled (0-1)"
+    )
+    parser.add_argument(
+        '--resume', metavar='RUN_ID',
+        help="Resume a run from its intermediate store, skipping nodes that already finished"
+    )
+    parser.add_argument(
+        '--daemon', action='store_true',
+        help="Run as a resident service ingesting micro-batches dropped into INBOX_DIR"
+    )
+    parser.add_argument(
+        '--once', action='store_true',
+        help="With --daemon, process the drops already in the inbox and exit"
+    )
+    parser.add_argument(
+        '--sources', metavar='SOURCES',
+        help="Comma-separated fact sources to rebuild, e.g. 'SpeedViolations'; only their rows of "
+             "FactTrafficEvents are replaced and the rest of the table is kept"
+    )
+    parser.add_argument(
+        '--backfill', metavar='START:END',
+        help="Rebuild the facts of a date range (YYYY-MM-DD:YYYY-MM-DD, end inclusive) as parallel partitions"
+    )
+    parser.add_argument(
+        '--backfill-worker', action='store_true',
+        help="Work on the partitions of a backfill planned by another process sharing BACKFILL_DIR"
+    )
+    return parser.parse_args(argv)
+
+
+def apply_args(config: Dict[str, Any], args: argparse.Namespace) -> Dict[str, Any]:
+    """Return a copy of the configuration with command line overrides applied"""
+    config = dict(config)
+    profiling_config = dict(config['profiling'])
+    if args.profile:
+        profiling_config['stages'] = [stage.strip() for stage in args.profile.split(',') if stage.strip()]
+    if args.profile_sample_rate is not None:
+        profiling_config['sample_rate'] = args.profile_sample_rate
+    config['profiling'] = profiling_config
+    if args.resume:
+        config['store'] = dict(config['store'], enabled=True)
+    if args.sources:
+        config['processing'] = dict(
+            config['processing'], fact_sources=[source.strip() for source in args.sources.split(',') if source.strip()]
+        )
+    return config
+
+
+def run_backfill(config: Dict[str, Any], args: argparse.Namespace, store: IntermediateStore):
+    """Build and load the dimensions, then backfill the facts of the range partition by partition"""
+    try:
+        start, end = (pd.Timestamp(value) for value in args.backfill.split(':'))
+    except ValueError:
+        raise ValueError(f"Invalid backfill range '{args.backfill}', expected YYYY-MM-DD:YYYY-MM-DD")
+    end += pd.Timedelta(days=1)
+    if end <= start:
+        raise ValueError(f"Backfill range '{args.backfill}' ends before it starts")
+    
+    dag = build_pipeline(config, store, facts=False)
+    results = dag.run()
+    dag.log_summary()
+    dimensions = {dim_name: store.resolve(results[f'transform:{dim_name}']) for dim_name in DIMENSION_TRANSFORMERS}
+    
+    runner = BackfillRunner(config)
+    runner.plan(start, end, dimensions)
+    runner.run()
+    runner.finalize()
+    return runner.verify()
+
+
+def main(argv=None):
+    """Main ETL process"""
+    # Use configuration from config.py, overridden by command line options
+    args = parse_args(argv)
+    config = apply_args(CONFIG, args)
+    fact_sources(config)  # Reject unknown --sources before anything runs
+    
+    if args.daemon:
+        logger.info("Starting Traffic Flow ETL daemon")
+        IngestDaemon(config).run(once=args.once)
+        return
+    
+    if args.backfill_worker:
+        logger.info("Starting backfill worker")
+        completed = BackfillRunner(config).work()
+        logger.info(f"Backfill worker completed {completed} partitions")
+        return
+    
+    start_time = datetime.now()
+    logger.info("Starting Traffic Flow ETL process")
+    recorder = get_recorder()
+    recorder.start_run()
+    status = 'failed'
+    
+    # Intermediate results are keyed by run, so a resumed run reuses the earlier run's files
+    store = IntermediateStore(config, args.resume or recorder.run_id)
+    
+    try:
+        if args.backfill:
+            run_backfill(config, args, store)
+        else:
+            if resumes(config):
+                logger.info("Fact sources resume from stored read positions: appending their new facts")
+                config = dict(config, processing=dict(config['processing'], incremental=True))
+            dag = build_pipeline(config, store)
+            dag.run()
+            dag.log_summary()
+        DtypePlan.log_report(recorder.stages())
+        status = 'success'
         
         # Log completion
         end_time = datetime.now()
@@ -91,7 +539,11 @@ def main():
     except Exception as e:
         logger.error(f"ETL process failed: {str(e)}", exc_info=True)
         raise
+    finally:
+        recorder.write_report(config, status)
+        if store.enabled:
+            store.cleanup()
 
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
\ No newline at end of file
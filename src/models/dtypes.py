@@ -0,0 +1,152 @@
+import logging
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List
+
+from monitoring import get_recorder, StageMetrics
+
+logger = logging.getLogger(__name__)
+
+CATEGORY = 'category'
+TEXT = 'string[pyarrow]'
+TIMESTAMP = 'datetime64[ns]'
+
+
+class DtypePlan:
+    """
+    Compact column types of the source, dimension and fact tables
+    Surrogate keys take the narrowest integer type their range fits, measures are float32
+    or nullable integers, low-cardinality labels are categoricals and free text is stored
+    in Arrow strings. A cast is only made when it is lossless: a column whose values don't
+    fit its planned type keeps the type it has. A planned categorical whose share of distinct
+    values is above max_category_ratio is stored in Arrow strings instead, and a cast that
+    would make a column larger is not made
+    """
+    
+    # Source columns, whichever table they appear in; natural IDs keep their types so
+    # dedup hashes and dimension lookups don't change
+    SOURCE_COLUMNS = {
+        'Location': CATEGORY,
+        'Severity': CATEGORY,
+        'Level': CATEGORY,
+        'Condition': CATEGORY,
+        'Surface': CATEGORY,
+        'Visibility': CATEGORY,
+        'Reason': CATEGORY,
+        'VehicleType': CATEGORY,
+        'PlateNumber': TEXT,
+        'VehicleCount': 'Int32',
+        'VehiclesInvolved': 'Int16',
+        'SpeedRecorded': 'Int16',
+        'SpeedLimit': 'Int16',
+        'Timestamp': TIMESTAMP,
+        'ReportedAt': TIMESTAMP,
+        'RecordedAt': TIMESTAMP,
+        'ClosedAt': TIMESTAMP
+    }
+    
+    # Dimension and fact columns; dimension attributes stay objects for the loaders and lookups
+    TABLE_COLUMNS = {
+        'DimDate': {'date_key': 'int32', 'day': 'int8', 'day_of_week': 'int8', 'month': 'int8',
+                    'quarter': 'int8', 'year': 'int16'},
+        'DimTime': {'time_key': 'int16', 'hour': 'int8', 'minute': 'int8'},
+        'DimLocation': {'location_key': 'int32'},
+        'DimVehicle': {'vehicle_key': 'int32'},
+        'DimEventType': {'event_type_key': 'int16', 'severity_scale': 'int8'},
+        'DimEnvironmental': {'environmental_key': 'int32'},
+        'FactTrafficEvents': {
+            'event_id': 'int64',
+            'date_key': 'int32',
+            'time_key': 'int16',
+            'location_key': 'int32',
+            'vehicle_key': 'int32',
+            'event_type_key': 'int16',
+            'environmental_key': 'int32',
+            'vehicle_count': 'Int32',
+            'avg_speed': 'float32',
+            'vehicles_involved': 'Int16',
+            'incident_severity_score': 'float32',
+            'speed_excess': 'float32',
+            'duration_minutes': 'Int32',
+            'congestion_level_score': 'float32'
+        }
+    }
+    
+    _warned = set()
+    
+    def __init__(self, config: Dict[str, Any]):
+        dtype_config = config.get('dtypes', {})
+        self.enabled = dtype_config.get('enabled', True)
+        self.max_category_ratio = dtype_config.get('max_category_ratio', 0.5)
+    
+    def columns(self, table: str) -> Dict[str, str]:
+        """Planned type of each column of a table"""
+        return self.TABLE_COLUMNS.get(table, self.SOURCE_COLUMNS)
+    
+    def _cast(self, values: pd.Series, dtype: str) -> pd.Series:
+        """Cast a column, raising ValueError when its values don't fit the type"""
+        if dtype == CATEGORY:
+            present = values.count()
+            if present and values.nunique() / present > self.max_category_ratio:
+                return values.astype(TEXT)
+            return values.astype(CATEGORY)
+        if dtype == TEXT:
+            return values.astype(TEXT)
+        if dtype == TIMESTAMP:
+            return pd.to_datetime(values)
+        
+        if not pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            values = pd.to_numeric(values)
+        if dtype.startswith('float'):
+            return values.astype(dtype)
+        
+        # Integers: nullable when planned so (measures) or when the column has nulls
+        info = np.iinfo(dtype.lower())
+        present = values.dropna()
+        if len(present):
+            if pd.api.types.is_float_dtype(present) and not (present % 1 == 0).all():
+                raise ValueError("values have fractions")
+            if present.min() < info.min or present.max() > info.max:
+                raise ValueError(f"values out of the {dtype.lower()} range")
+        nullable = dtype[0] == 'I' or len(present) < len(values)
+        return values.astype(dtype.lower().capitalize() if nullable else dtype)
+    
+    def apply(self, table: str, df: pd.DataFrame) -> pd.DataFrame:
+        """Cast a table's columns to their planned types, recording its memory before and after"""
+        if not self.enabled or df is None:
+            return df
+        planned = {column: dtype for column, dtype in self.columns(table).items()
+                   if column in df.columns and str(df[column].dtype) != dtype
+                   and not (dtype == TIMESTAMP and pd.api.types.is_datetime64_any_dtype(df[column]))}
+        if not planned:
+            return df
+        
+        with get_recorder().stage('dtypes', table, rows_in=len(df)) as metrics:
+            usage = df.memory_usage(deep=True, index=False)
+            metrics.bytes_before = int(usage.sum())
+            casts = {}
+            for column, dtype in planned.items():
+                try:
+                    cast = self._cast(df[column], dtype)
+                except (ValueError, TypeError) as e:
+                    if (table, column) not in self._warned:
+                        self._warned.add((table, column))
+                        logger.warning(f"Keeping {table}.{column} as {df[column].dtype} instead of {dtype}: {str(e)}")
+                    continue
+                # Small chunks can be larger as categoricals (or Arrow strings) than as they were read
+                if cast.memory_usage(deep=True, index=False) <= usage[column]:
+                    casts[column] = cast
+            df = df.assign(**casts)
+            # Only the cast columns are measured again
+            metrics.bytes_after = int(usage.drop(list(casts)).sum()) + \
+                int(df[list(casts)].memory_usage(deep=True, index=False).sum())
+            metrics.rows_out = len(df)
+        return df
+    
+    @staticmethod
+    def log_report(stages: List[StageMetrics]):
+        """Log the memory of every typed table before and after its casts"""
+        for metrics in sorted((m for m in stages if m.stage == 'dtypes'), key=lambda m: m.name):
+            saved = 1 - metrics.bytes_after / metrics.bytes_before if metrics.bytes_before else 0.0
+            logger.info(f"Memory of {metrics.name}: {metrics.bytes_before / 2**20:.2f} MiB -> "
+                        f"{metrics.bytes_after / 2**20:.2f} MiB ({saved:.0%} saved, {metrics.rows_in} rows)")
@@ -0,0 +1,16 @@
+from .metrics import MetricsRecorder, StageMetrics, get_recorder, current_rss_bytes, peak_rss_bytes
+from .profiling import StageProfiler
+from .logs import configure_logging, flush_logs, shutdown_logging, RepeatedEvents
+
+__all__ = [
+    'MetricsRecorder',
+    'StageMetrics',
+    'get_recorder',
+    'current_rss_bytes',
+    'peak_rss_bytes',
+    'StageProfiler',
+    'configure_logging',
+    'flush_logs',
+    'shutdown_logging',
+    'RepeatedEvents'
+]
@@ -0,0 +1,271 @@
+import os
+import sys
+import queue
+import atexit
+import logging
+import threading
+import multiprocessing.util
+from dataclasses import dataclass, field
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Any, List, Optional, Tuple
+
+import structlog
+
+LOG_FORMATS = ['json', 'console']
+
+_timestamper = structlog.processors.TimeStamper(fmt='iso')
+
+# Fields of every event, whether it was logged through structlog or the standard library
+SHARED_PROCESSORS = [structlog.stdlib.add_log_level, structlog.stdlib.add_logger_name, _timestamper]
+
+# structlog loggers hand their event dicts to the standard library handlers, which render them.
+# Tracebacks are formatted here, in the thread that logged them, as the handlers run on another one
+structlog.configure(
+    processors=[
+        structlog.stdlib.filter_by_level,
+        *SHARED_PROCESSORS,
+        structlog.processors.format_exc_info,
+        structlog.stdlib.ProcessorFormatter.wrap_for_formatter
+    ],
+    logger_factory=structlog.stdlib.LoggerFactory(),
+    wrapper_class=structlog.stdlib.BoundLogger,
+    cache_logger_on_first_use=True
+)
+
+
+@dataclass
+class EventWindow:
+    """Records of one repeated event in the current rate limit interval"""
+    started: float
+    logged: int = 0
+    suppressed: int = 0
+    samples: List[Any] = field(default_factory=list)  # Fields of the first suppressed records
+    record: Optional[logging.LogRecord] = None  # Last suppressed record, the template of the summary
+
+
+class RepeatedEvents:
+    """
+    Rate limit of repeated log events
+    Records are grouped by logger, level and event (the message template of standard library
+    records). The first burst records of a group in every interval are logged; later ones are
+    only counted, keeping the fields of the first samples of them, and are logged as one
+    summary event with a suppressed count when the group is next seen after the interval or
+    on flush. A burst of 0 logs every record
+    """
+    
+    def __init__(self, burst: int, interval: float, samples: int):
+        self.burst = burst
+        self.interval = interval
+        self.samples = samples
+        self._windows: Dict[Tuple[str, int, str], EventWindow] = {}
+        self._pruned = 0.0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _event(record: logging.LogRecord) -> str:
+        return str(record.msg.get('event')) if isinstance(record.msg, dict) else str(record.msg)
+    
+    @staticmethod
+    def _fields(record: logging.LogRecord) -> Any:
+        """Sample of a suppressed record: its event fields, or its message"""
+        if isinstance(record.msg, dict):
+            return {key: value for key, value in record.msg.items()
+                    if key not in ('event', 'level', 'logger', 'timestamp')}
+        return record.getMessage()
+    
+    def _summary(self, window: EventWindow) -> Optional[logging.LogRecord]:
+        """Event logged in place of the suppressed records of a window"""
+        if not window.suppressed:
+            return None
+        record = logging.makeLogRecord(window.record.__dict__)
+        event = {
+            'event': self._event(window.record),
+            'suppressed': window.suppressed,
+            'interval_seconds': self.interval,
+            'samples': window.samples,
+            'logger': record.name,
+            'level': record.levelname.lower()
+        }
+        # Logged as a structlog event, so the handlers render its fields
+        record.msg, record.args = _timestamper(None, None, event), ()
+        record.exc_info = record.exc_text = None
+        record._logger, record._name = logging.getLogger(record.name), record.levelname.lower()
+        return record
+    
+    def admit(self, record: logging.LogRecord) -> List[logging.LogRecord]:
+        """Records to log for a new one: itself, a summary of its group's last interval, or neither"""
+        if self.burst <= 0:
+            return [record]
+        key = (record.name, record.levelno, self._event(record))
+        now = record.created
+        admitted = []
+        with self._lock:
+            if now - self._pruned >= self.interval:
+                admitted.extend(self._prune(now))
+            window = self._windows.get(key)
+            if window is None or now - window.started >= self.interval:
+                summary = self._summary(window) if window is not None else None
+                if summary is not None:
+                    admitted.append(summary)
+                window = self._windows[key] = EventWindow(started=now)
+            if window.logged < self.burst:
+                window.logged += 1
+                admitted.append(record)
+            else:
+                window.suppressed += 1
+                window.record = record
+                if len(window.samples) < self.samples:
+                    window.samples.append(self._fields(record))
+        return admitted
+    
+    def _prune(self, now: float) -> List[logging.LogRecord]:
+        """Drop the windows that ended, returning their summaries"""
+        self._pruned = now
+        summaries = []
+        for key, window in list(self._windows.items()):
+            if now - window.started >= self.interval:
+                del self._windows[key]
+                summary = self._summary(window)
+                if summary is not None:
+                    summaries.append(summary)
+        return summaries
+    
+    def reset(self):
+        """Forget every window, e.g. the parent's in a forked process"""
+        self._lock = threading.Lock()
+        self._windows = {}
+    
+    def drain(self) -> List[logging.LogRecord]:
+        """Summaries of every window with suppressed records, starting new windows"""
+        with self._lock:
+            windows, self._windows = self._windows, {}
+        return [summary for summary in map(self._summary, windows.values()) if summary is not None]
+
+
+class AsyncLogHandler(QueueHandler):
+    """
+    Queue handler of the root logger, rate limiting records before they are queued
+    Records are rendered and written by the handlers of a listener thread, so logging
+    never waits for a file or terminal. In a forked process the records are handed to
+    those handlers directly, as the listener thread stays with the parent
+    """
+    
+    def __init__(self, listener: QueueListener, limiter: RepeatedEvents):
+        super().__init__(listener.queue)
+        self.listener = listener
+        self.limiter = limiter
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Records don't leave the process, so they are queued unformatted
+        if record.args:
+            record.msg, record.args = record.getMessage(), None
+        return record
+    
+    def enqueue(self, record: logging.LogRecord):
+        if self.listener.queue is self.queue:
+            self.queue.put_nowait(record)
+        else:
+            self.listener.handle(record)
+    
+    def emit(self, record: logging.LogRecord):
+        try:
+            for admitted in self.limiter.admit(record):
+                self.enqueue(self.prepare(admitted))
+        except Exception:
+            self.handleError(record)
+    
+    def flush(self):
+        """Log the summaries of the events suppressed so far"""
+        for summary in self.limiter.drain():
+            self.enqueue(summary)
+    
+    def detach(self):
+        """Write records of this process directly, without a listener thread"""
+        self.queue = None
+        self.limiter.reset()  # The parent's suppressed records are its to report
+
+
+_handler: Optional[AsyncLogHandler] = None
+
+
+def _renderer(log_format: str):
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"Unknown log format '{log_format}', expected one of {LOG_FORMATS}")
+    if log_format == 'console':
+        return structlog.dev.ConsoleRenderer(colors=False)
+    return structlog.processors.JSONRenderer()
+
+
+def configure_logging(config: Dict[str, Any], log_file: bool = True) -> AsyncLogHandler:
+    """
+    Route the root logger and structlog through the rate limit to a listener thread
+    writing JSON lines (or console lines) to stderr and, unless log_file is False, the log file
+    """
+    global _handler
+    logging_config = config.get('logging', {})
+    formatter = structlog.stdlib.ProcessorFormatter(
+        foreign_pre_chain=SHARED_PROCESSORS,
+        processors=[
+            structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+            structlog.processors.format_exc_info,
+            _renderer(logging_config.get('format', 'json'))
+        ]
+    )
+    handlers = [logging.StreamHandler(sys.stderr)]
+    path = logging_config.get('file') if log_file else None
+    if path:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        handlers.append(logging.FileHandler(path))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    limiter = RepeatedEvents(
+        logging_config.get('rate_limit_burst', 10),
+        logging_config.get('rate_limit_interval', 60.0),
+        logging_config.get('rate_limit_samples', 3)
+    )
+    listener = QueueListener(queue.SimpleQueue(), *handlers, respect_handler_level=True)
+    
+    root = logging.getLogger()
+    if _handler is not None:
+        shutdown_logging()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    _handler = AsyncLogHandler(listener, limiter)
+    root.addHandler(_handler)
+    root.setLevel(getattr(logging, config.get('processing', {}).get('log_level', 'INFO')))
+    listener.start()
+    multiprocessing.util.register_after_fork(_handler, _flush_at_exit)
+    return _handler
+
+
+def flush_logs():
+    """Log the summaries of the repeated events suppressed so far"""
+    if _handler is not None:
+        _handler.flush()
+
+
+def shutdown_logging():
+    """Flush the suppressed events and wait for the listener to write every queued record"""
+    if _handler is None:
+        return
+    _handler.flush()
+    if _handler.queue is not None:
+        _handler.listener.stop()
+    for handler in _handler.listener.handlers:
+        handler.flush()
+
+
+def _after_fork():
+    if _handler is not None:
+        _handler.detach()
+
+
+def _flush_at_exit(handler: AsyncLogHandler):
+    # Pool workers end without running atexit hooks, but with multiprocessing finalizers
+    multiprocessing.util.Finalize(handler, handler.flush, exitpriority=0)
+
+
+os.register_at_fork(after_in_child=_after_fork)
+atexit.register(shutdown_logging)
@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import uuid
+import resource
+import threading
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Dict, Any, List, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process (falls back to the peak where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process so far"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # ru_maxrss is in KiB on Linux
+
+
+@dataclass
+class StageMetrics:
+    stage: str  # extract, transform, fact, load
+    name: str  # Sheet, dimension, fact source or table name
+    calls: int = 0
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    rows_in: int = 0
+    rows_out: int = 0
+    peak_rss_bytes: int = 0  # Highest process RSS observed while the stage ran
+    status: str = 'ok'
+    cache_hits: int = 0  # Calls served from the transform cache
+    cache_misses: int = 0
+    bytes_before: int = 0  # Memory of the frames a dtypes stage cast, before and after
+    bytes_after: int = 0
+    
+    @property
+    def rows_per_second(self) -> float:
+        rows = self.rows_out or self.rows_in
+        return rows / self.wall_seconds if self.wall_seconds > 0 else 0.0
+    
+    def to_dict(self) -> Dict[str, Any]:
+        metrics = asdict(self)
+        metrics['wall_seconds'] = round(self.wall_seconds, 6)
+        metrics['cpu_seconds'] = round(self.cpu_seconds, 6)
+        metrics['rows_per_second'] = round(self.rows_per_second, 2)
+        return metrics
+
+
+class MetricsRecorder:
+    """
+    Collects per-stage performance metrics for one ETL run
+    Repeated stages with the same name (e.g. streamed chunks) are accumulated
+    """
+    
+    SAMPLE_INTERVAL = 0.05  # seconds between RSS samples while stages are running
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[Tuple[str, str], StageMetrics] = {}
+        self._active: Dict[int, StageMetrics] = {}
+        self._sampler: Optional[threading.Thread] = None
+        self.run_id = None
+        self.started_at = None
+    
+    def start_run(self, run_id: Optional[str] = None):
+        """Reset the recorder for a new run"""
+        with self._lock:
+            self._stages = {}
+            self.run_id = run_id or f"{datetime.now():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:6]}"
+            self.started_at = datetime.now()
+    
+    def _sample(self):
+        """Track the RSS high-water mark of every running stage"""
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._sampler = None
+                    return
+                rss = current_rss_bytes()
+                for metrics in self._active.values():
+                    metrics.peak_rss_bytes = max(metrics.peak_rss_bytes, rss)
+            time.sleep(self.SAMPLE_INTERVAL)
+    
+    @contextmanager
+    def stage(self, stage: str, name: str, rows_in: int = 0) -> Iterator[StageMetrics]:
+        """
+        Measure a block of work; the caller may set rows_in/rows_out on the yielded metrics
+        CPU time is that of the calling thread, so concurrent stages don't count each other
+        """
+        metrics = StageMetrics(stage, name, calls=1, rows_in=rows_in, peak_rss_bytes=current_rss_bytes())
+        token = id(metrics)
+        with self._lock:
+            self._active[token] = metrics
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample, name='metrics-sampler', daemon=True)
+                self._sampler.start()
+        
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield metrics
+        except Exception:
+            metrics.status = 'failed'
+            raise
+        finally:
+            metrics.wall_seconds = time.perf_counter() - wall_start
+            metrics.cpu_seconds = time.thread_time() - cpu_start
+            with self._lock:
+                del self._active[token]
+                metrics.peak_rss_bytes = max(metrics.peak_rss_bytes, current_rss_bytes())
+            self.merge([metrics])
+    
+    def merge(self, stages: List[StageMetrics]):
+        """Accumulate finished stage metrics, e.g. those recorded in a worker process"""
+        with self._lock:
+            for metrics in stages:
+                key = (metrics.stage, metrics.name)
+                total = self._stages.get(key)
+                if total is None:
+                    self._stages[key] = metrics
+                    continue
+                total.calls += metrics.calls
+                total.wall_seconds += metrics.wall_seconds
+                total.cpu_seconds += metrics.cpu_seconds
+                total.rows_in += metrics.rows_in
+                total.rows_out += metrics.rows_out
+                total.peak_rss_bytes = max(total.peak_rss_bytes, metrics.peak_rss_bytes)
+                total.cache_hits += metrics.cache_hits
+                total.cache_misses += metrics.cache_misses
+                total.bytes_before += metrics.bytes_before
+                total.bytes_after += metrics.bytes_after
+                if metrics.status != 'ok':
+                    total.status = metrics.status
+    
+    def drain(self) -> List[StageMetrics]:
+        """Remove and return all recorded stages"""
+        with self._lock:
+            stages = list(self._stages.values())
+            self._stages = {}
+            return stages
+    
+    def stages(self) -> List[StageMetrics]:
+        with self._lock:
+            return list(self._stages.values())
+    
+    def report(self, status: str = 'success') -> Dict[str, Any]:
+        """Build the machine-readable run report"""
+        finished_at = datetime.now()
+        started_at = self.started_at or finished_at
+        return {
+            'run_id': self.run_id,
+            'status': status,
+            'started_at': started_at.isoformat(),
+            'finished_at': finished_at.isoformat(),
+            'duration_seconds': round((finished_at - started_at).total_seconds(), 3),
+            'peak_rss_bytes': peak_rss_bytes(),
+            'cache_hits': sorted(f"{m.stage}:{m.name}" for m in self.stages() if m.cache_hits),
+            'stages': [metrics.to_dict() for metrics in self.stages()]
+        }
+    
+    def _prometheus_text(self, report: Dict[str, Any]) -> str:
+        """Render the report in the Prometheus text exposition format"""
+        lines = []
+        
+        def metric(name: str, help_text: str, samples: List[Tuple[Dict[str, str], float]]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{str(val)}"' for key, val in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        
+        stage_metrics = [
+            ('wall_seconds', 'Wall-clock seconds spent in a pipeline stage'),
+            ('cpu_seconds', 'CPU seconds spent in a pipeline stage'),
+            ('rows_in', 'Rows read by a pipeline stage'),
+            ('rows_out', 'Rows produced by a pipeline stage'),
+            ('rows_per_second', 'Throughput of a pipeline stage'),
+            ('peak_rss_bytes', 'Peak process RSS observed during a pipeline stage'),
+            ('cache_hits', 'Calls of a pipeline stage served from the transform cache'),
+            ('bytes_before', 'Memory of the frames of a table before their dtype casts'),
+            ('bytes_after', 'Memory of the frames of a table after their dtype casts')
+        ]
+        for field_name, help_text in stage_metrics:
+            metric(f"traffic_etl_stage_{field_name}", help_text, [
+                ({'stage': stage['stage'], 'name': stage['name']}, stage[field_name])
+                for stage in report['stages']
+            ])
+        
+        metric('traffic_etl_run_duration_seconds', 'Duration of the last ETL run', [({}, report['duration_seconds'])])
+        metric('traffic_etl_run_success', 'Whether the last ETL run succeeded', [({}, int(report['status'] == 'success'))])
+        metric('traffic_etl_run_peak_rss_bytes', 'Peak process RSS of the last ETL run', [({}, report['peak_rss_bytes'])])
+        metric('traffic_etl_run_timestamp_seconds', 'Completion time of the last ETL run',
+               [({}, round(datetime.fromisoformat(report['finished_at']).timestamp(), 3))])
+        return '\n'.join(lines) + '\n'
+    
+    def write_report(self, config: Dict[str, Any], status: str = 'success') -> Dict[str, Any]:
+        """Write the JSON run report and the Prometheus textfile-collector file"""
+        metrics_config = config.get('metrics', {})
+        report = self.report(status)
+        if not metrics_config.get('enabled', True):
+            return report
+        
+        report_dir = metrics_config.get('report_dir', '/app/output')
+        os.makedirs(report_dir, exist_ok=True)
+        report_path = os.path.join(report_dir, f"run_report_{self.run_id}.json")
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        
+        # Write to a temporary file first so the node exporter never reads a partial file
+        prometheus_path = metrics_config.get('prometheus_file') or os.path.join(report_dir, 'traffic_etl.prom')
+        os.makedirs(os.path.dirname(os.path.abspath(prometheus_path)), exist_ok=True)
+        temp_path = f"{prometheus_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write(self._prometheus_text(report))
+        os.replace(temp_path, prometheus_path)
+        
+        logger.info(f"Wrote run report to {report_path} and metrics to {prometheus_path}")
+        return report
+
+
+_recorder = MetricsRecorder()
+
+
+def get_recorder() -> MetricsRecorder:
+    """Return the metrics recorder shared by every stage in this process"""
+    return _recorder
@@ -0,0 +1,120 @@
+import os
+import io
+import re
+import random
+import pstats
+import cProfile
+import tracemalloc
+import threading
+import logging
+from functools import partial
+from typing import Dict, Any, Callable
+
+logger = logging.getLogger(__name__)
+
+# tracemalloc is process-wide, so overlapping profiled stages share one tracing session
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+
+
+def _start_tracemalloc(frames: int) -> bool:
+    """Start tracing allocations unless someone else already traces them; return whether we own a session"""
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0:
+            if tracemalloc.is_tracing():
+                return False  # Tracing was started outside the profiler, leave it alone
+            tracemalloc.start(frames)
+        _tracemalloc_users += 1
+        return True
+
+
+def _stop_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0:
+            tracemalloc.stop()
+
+
+class StageProfiler:
+    """
+    Opt-in cProfile and tracemalloc hooks for chosen pipeline stages
+    Stages that are not selected are returned unwrapped, so profiling costs nothing when disabled
+    """
+    
+    def __init__(self, config: Dict[str, Any], run_id: str = 'latest'):
+        profiling_config = config.get('profiling', {})
+        self.stages = set(profiling_config.get('stages') or [])
+        self.sample_rate = profiling_config.get('sample_rate', 1.0)
+        self.tracemalloc_frames = profiling_config.get('tracemalloc_frames', 1)
+        self.top = profiling_config.get('top', 30)
+        self.output_dir = os.path.join(profiling_config.get('output_dir', '/app/output'), 'profiles', run_id)
+    
+    def enabled_for(self, stage: str) -> bool:
+        """
+        Whether a stage is selected for profiling
+        A stage such as 'load:DimLocation' is selected by 'all', its full name,
+        its step ('load') or its table ('DimLocation')
+        """
+        if not self.stages or self.sample_rate <= 0:
+            return False
+        step, _, table = stage.partition(':')
+        return bool({'all', stage, step, table} & self.stages)
+    
+    def wrap(self, stage: str, func: Callable[..., Any]) -> Callable[..., Any]:
+        """Return func profiled as the given stage, or func itself when the stage isn't selected"""
+        if not self.enabled_for(stage):
+            return func
+        return partial(self.run, stage, func)
+    
+    def run(self, stage: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run func under cProfile and tracemalloc, subject to sampling, and write the reports"""
+        if random.random() >= self.sample_rate:
+            return func(*args, **kwargs)
+        
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # Newer interpreters allow a single active profiler; skip rather than fail the stage
+            logger.warning(f"Could not profile stage {stage}: {str(e)}")
+            profile = None
+        traced = _start_tracemalloc(self.tracemalloc_frames)
+        
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if profile is not None:
+                profile.disable()
+            snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+            peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+            if traced:
+                _stop_tracemalloc()
+            self._write_reports(stage, profile, snapshot, peak)
+    
+    def _write_reports(self, stage: str, profile, snapshot, peak):
+        """Write pstats, a readable hot-function summary and the top allocations of a stage"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        base_path = os.path.join(self.output_dir, re.sub(r'[^A-Za-z0-9_.-]', '_', stage))
+        
+        if profile is not None:
+            profile.dump_stats(f"{base_path}.pstats")
+            summary = io.StringIO()
+            pstats.Stats(profile, stream=summary).sort_stats('cumulative').print_stats(self.top)
+            with open(f"{base_path}.profile.txt", 'w') as f:
+                f.write(summary.getvalue())
+        
+        if snapshot is not None:
+            snapshot = snapshot.filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>')
+            ])
+            with open(f"{base_path}.alloc.txt", 'w') as f:
+                if peak is not None:
+                    f.write(f"Peak traced memory: {peak / 1024 / 1024:.1f} MiB\n")
+                f.write(f"Top {self.top} allocation sites still held at the end of {stage}:\n")
+                for stat in snapshot.statistics('lineno')[:self.top]:
+                    f.write(f"{stat}\n")
+        
+        logger.info(f"Wrote profile for stage {stage} to {base_path}.*")
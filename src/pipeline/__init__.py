@@ -0,0 +1,12 @@
+from .dag import DagExecutor, PipelineNode, NodeTiming
+from .intermediate_store import IntermediateStore, StoredFrame
+from .work_queue import WorkQueue
+
+__all__ = [
+    'DagExecutor',
+    'PipelineNode',
+    'NodeTiming',
+    'IntermediateStore',
+    'StoredFrame',
+    'WorkQueue'
+]
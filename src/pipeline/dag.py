@@ -0,0 +1,189 @@
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Callable, Optional, Tuple
+
+from monitoring import get_recorder, StageMetrics
+from .intermediate_store import IntermediateStore
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PipelineNode:
+    name: str
+    func: Callable[[Dict[str, Any]], Any]  # Receives the results of its dependencies keyed by node name
+    depends_on: List[str] = field(default_factory=list)
+
+
+@dataclass
+class NodeTiming:
+    name: str
+    start: float  # Seconds since the start of the run
+    end: float
+    
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+def _run_node(name: str, func: Callable[[Dict[str, Any]], Any], inputs: Dict[str, Any], parent_pid: int,
+              store: Optional[IntermediateStore] = None) -> Tuple[Any, float, float, List[StageMetrics]]:
+    """
+    Run a node and return its result with wall-clock start and end times
+    Stage metrics recorded in a worker process are returned so the parent can merge them
+    With a store, inputs arrive as handles to memory-mapped files and the result is
+    stored in the worker, so only handles cross process boundaries
+    """
+    start = time.time()
+    if store is not None:
+        inputs = {dep: store.resolve(value) for dep, value in inputs.items()}
+    result = func(inputs)
+    if store is not None:
+        result = store.save_result(name, result)
+    end = time.time()
+    worker_metrics = get_recorder().drain() if os.getpid() != parent_pid else []
+    return result, start, end, worker_metrics
+
+
+class DagExecutor:
+    """Runs a dependency graph of pipeline nodes, executing ready nodes concurrently"""
+    
+    EXECUTORS = {
+        'thread': ThreadPoolExecutor,
+        'process': ProcessPoolExecutor  # Node functions and results must be picklable
+    }
+    
+    def __init__(self, config: Dict[str, Any], wrap: Optional[Callable[[str, Callable], Callable]] = None,
+                 store: Optional[IntermediateStore] = None):
+        pipeline_config = config.get('pipeline', {})
+        self.wrap = wrap  # Optional hook applied to every node function, e.g. a profiler
+        self.store = store if store is not None and store.enabled else None
+        self.executor_type = pipeline_config.get('executor', 'thread')
+        self.max_workers = pipeline_config.get('max_workers', 4)
+        if self.executor_type not in self.EXECUTORS:
+            raise ValueError(f"Unknown pipeline executor '{self.executor_type}', expected one of {list(self.EXECUTORS)}")
+        
+        self.nodes: Dict[str, PipelineNode] = {}
+        self.timings: Dict[str, NodeTiming] = {}
+    
+    def add_node(self, name: str, func: Callable[[Dict[str, Any]], Any], depends_on: List[str] = None):
+        """Declare a node and the nodes whose results it needs"""
+        if name in self.nodes:
+            raise ValueError(f"Duplicate pipeline node: {name}")
+        if self.wrap is not None:
+            func = self.wrap(name, func)
+        self.nodes[name] = PipelineNode(name, func, list(depends_on or []))
+    
+    def _validate(self) -> List[str]:
+        """Check dependencies exist and the graph is acyclic; return a topological order"""
+        for node in self.nodes.values():
+            missing = [dep for dep in node.depends_on if dep not in self.nodes]
+            if missing:
+                raise ValueError(f"Node {node.name} depends on undeclared nodes: {missing}")
+        
+        order = []
+        remaining = {name: len(node.depends_on) for name, node in self.nodes.items()}
+        ready = [name for name, count in remaining.items() if count == 0]
+        while ready:
+            name = ready.pop()
+            order.append(name)
+            for dependent in self._dependents(name):
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+        
+        if len(order) != len(self.nodes):
+            cycle = sorted(name for name in self.nodes if name not in order)
+            raise ValueError(f"Pipeline graph contains a cycle through: {cycle}")
+        return order
+    
+    def _dependents(self, name: str) -> List[str]:
+        return [node.name for node in self.nodes.values() if name in node.depends_on]
+    
+    def run(self) -> Dict[str, Any]:
+        """Execute every node once its dependencies have finished; return all node results"""
+        self._validate()
+        self.timings = {}
+        results: Dict[str, Any] = {}
+        waiting = {name: set(node.depends_on) for name, node in self.nodes.items()}
+        run_start = time.time()
+        
+        logger.info(f"Running {len(self.nodes)} pipeline nodes on a {self.executor_type} pool "
+                    f"with {self.max_workers} workers")
+        
+        with self.EXECUTORS[self.executor_type](max_workers=self.max_workers) as pool:
+            running = {}
+            
+            def submit_ready():
+                while True:
+                    ready = [name for name, deps in waiting.items() if not deps]
+                    if not ready:
+                        return
+                    for name in ready:
+                        del waiting[name]
+                        # Nodes finished by an earlier attempt of a resumed run are not rerun
+                        if self.store is not None and self.store.has_result(name):
+                            results[name] = self.store.load_result(name)
+                            logger.info(f"Pipeline node {name} restored from the intermediate store")
+                            for deps in waiting.values():
+                                deps.discard(name)
+                            continue
+                        node = self.nodes[name]
+                        inputs = {dep: results[dep] for dep in node.depends_on}
+                        future = pool.submit(_run_node, name, node.func, inputs, os.getpid(), self.store)
+                        running[future] = name
+            
+            submit_ready()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        result, start, end, worker_metrics = future.result()
+                    except Exception:
+                        logger.error(f"Pipeline node {name} failed, cancelling pending nodes")
+                        for pending in running:
+                            pending.cancel()
+                        raise
+                    
+                    results[name] = result
+                    get_recorder().merge(worker_metrics)
+                    self.timings[name] = NodeTiming(name, start - run_start, end - run_start)
+                    logger.debug(f"Pipeline node {name} finished in {end - start:.2f} seconds")
+                    for deps in waiting.values():
+                        deps.discard(name)
+                submit_ready()
+        
+        return results
+    
+    def critical_path(self) -> Tuple[List[str], float]:
+        """Return the chain of dependent nodes with the largest total duration, and that duration"""
+        finish: Dict[str, float] = {}
+        previous: Dict[str, str] = {}
+        for name in self._validate():
+            node = self.nodes[name]
+            upstream = [dep for dep in node.depends_on if dep in finish]
+            longest = max(upstream, key=lambda dep: finish[dep], default=None)
+            duration = self.timings[name].duration if name in self.timings else 0.0
+            finish[name] = duration + (finish[longest] if longest else 0.0)
+            if longest:
+                previous[name] = longest
+        
+        if not finish:
+            return [], 0.0
+        
+        end = max(finish, key=finish.get)
+        path = [end]
+        while path[-1] in previous:
+            path.append(previous[path[-1]])
+        return list(reversed(path)), finish[end]
+    
+    def log_summary(self):
+        """Log per-node timings and the critical path of the last run"""
+        for timing in sorted(self.timings.values(), key=lambda t: t.start):
+            logger.info(f"Node {timing.name}: started at {timing.start:.2f}s, took {timing.duration:.2f}s")
+        path, duration = self.critical_path()
+        logger.info(f"Critical path ({duration:.2f}s): {' -> '.join(path)}")
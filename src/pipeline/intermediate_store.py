@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import shutil
+import logging
+import pandas as pd
+import pyarrow as pa
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class StoredFrame:
+    """Handle to a DataFrame persisted in the intermediate store, cheap to pass between processes"""
+    path: str
+    rows: int
+
+
+class IntermediateStore:
+    """
+    Arrow IPC files holding stage results, one directory per run
+    Files are written uncompressed so readers can memory-map them: Arrow buffers are
+    used in place, and numeric columns without nulls reach pandas without a copy
+    """
+    
+    SUFFIX = '.arrow'
+    NODES_DIR = 'nodes'  # Per-node manifests describing stored results, used to resume a run
+    
+    def __init__(self, config: Dict[str, Any], run_id: str):
+        store_config = config['store']
+        self.enabled = store_config['enabled']
+        self.base_dir = store_config['base_dir']
+        self.retention_runs = store_config['retention_runs']
+        self.retention_hours = store_config['retention_hours']
+        self.run_id = run_id
+        self.run_dir = os.path.join(self.base_dir, run_id)
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.run_dir, *key.split('/')) + self.SUFFIX
+    
+    def put(self, key: str, df: pd.DataFrame) -> StoredFrame:
+        """Write a DataFrame as an Arrow IPC file under the run"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        
+        # Write then rename so readers never map a partially written file
+        tmp_path = f"{path}.tmp"
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+        return StoredFrame(path, len(df))
+    
+    def read_table(self, handle: StoredFrame) -> pa.Table:
+        """Open a stored frame memory-mapped, without reading it into memory"""
+        with pa.memory_map(handle.path, 'r') as source:
+            return pa.ipc.open_file(source).read_all()
+    
+    def get(self, handle: StoredFrame) -> pd.DataFrame:
+        """Read a stored frame into pandas from its memory map"""
+        return self.read_table(handle).to_pandas(split_blocks=True)
+    
+    def store(self, key: str, value: Any) -> Any:
+        """Replace DataFrames (alone or in a dict) by handles to stored copies; other values pass through"""
+        try:
+            if isinstance(value, pd.DataFrame):
+                return self.put(key, value)
+            if isinstance(value, dict) and value and all(isinstance(df, pd.DataFrame) for df in value.values()):
+                return {name: self.put(f"{key}/{name}", df) for name, df in value.items()}
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+            # Columns Arrow can't type (e.g. mixed objects) keep the result in memory
+            logger.warning(f"Keeping {key} in memory, it can't be stored as Arrow: {str(e)}")
+        return value
+    
+    def resolve(self, value: Any) -> Any:
+        """Inverse of store: turn handles back into DataFrames"""
+        if isinstance(value, StoredFrame):
+            return self.get(value)
+        if isinstance(value, dict) and value and all(isinstance(item, StoredFrame) for item in value.values()):
+            return {name: self.get(handle) for name, handle in value.items()}
+        return value
+    
+    def _manifest_path(self, node: str) -> str:
+        return os.path.join(self.run_dir, self.NODES_DIR, node.replace(':', '__') + '.json')
+    
+    def save_result(self, node: str, value: Any) -> Any:
+        """Store a node's result and record a manifest so the run can be inspected or resumed"""
+        stored = self.store(node.replace(':', '/'), value)
+        if isinstance(stored, StoredFrame):
+            manifest = {'type': 'frame', 'path': stored.path, 'rows': stored.rows}
+        elif isinstance(stored, dict) and stored and all(isinstance(item, StoredFrame) for item in stored.values()):
+            manifest = {'type': 'frames', 'items': {name: [item.path, item.rows] for name, item in stored.items()}}
+        elif isinstance(stored, (int, float, str, bool)) or stored is None:
+            manifest = {'type': 'value', 'value': stored}
+        else:
+            return stored  # Not resumable, but still handed to dependents
+        
+        path = self._manifest_path(node)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(manifest, f)
+        return stored
+    
+    def load_result(self, node: str) -> Optional[Any]:
+        """Stored result of a node from this run's manifest, or None if it didn't finish"""
+        path = self._manifest_path(node)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest['type'] == 'frame':
+            return StoredFrame(manifest['path'], manifest['rows'])
+        if manifest['type'] == 'frames':
+            return {name: StoredFrame(path, rows) for name, (path, rows) in manifest['items'].items()}
+        return manifest['value']
+    
+    def has_result(self, node: str) -> bool:
+        return os.path.exists(self._manifest_path(node))
+    
+    def keys(self) -> List[str]:
+        """Keys of all frames stored for this run"""
+        keys = []
+        for root, _, files in os.walk(self.run_dir):
+            for name in files:
+                if name.endswith(self.SUFFIX):
+                    relative = os.path.relpath(os.path.join(root, name), self.run_dir)
+                    keys.append(relative[:-len(self.SUFFIX)].replace(os.sep, '/'))
+        return sorted(keys)
+    
+    def cleanup(self) -> List[str]:
+        """
+        Apply the retention policy: keep the newest retention_runs runs and drop runs
+        older than retention_hours. The current run is always kept
+        """
+        if not os.path.isdir(self.base_dir):
+            return []
+        
+        runs = sorted(
+            (entry for entry in os.scandir(self.base_dir) if entry.is_dir()),
+            key=lambda entry: entry.stat().st_mtime,
+            reverse=True
+        )
+        cutoff = time.time() - self.retention_hours * 3600
+        removed = []
+        for position, entry in enumerate(runs):
+            if entry.name == self.run_id:
+                continue
+            if position >= self.retention_runs or entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed.append(entry.name)
+        
+        if removed:
+            logger.info(f"Removed {len(removed)} intermediate store runs past retention: {removed}")
+        return removed
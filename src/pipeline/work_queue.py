@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import socket
+import logging
+import threading
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class WorkQueue:
+    """
+    Work queue kept as JSON files in a shared directory
+    Each task is a file that moves between state directories: it is claimed by renaming it
+    from pending/ to running/, which is atomic, so workers on several hosts can share one
+    queue on a network filesystem without a coordinator. A worker touches its running file
+    while it works; tasks whose file goes stale (the worker died) are put back in pending/.
+    Failed tasks are retried up to max_attempts and then parked in failed/
+    """
+    
+    STATES = ['pending', 'running', 'done', 'failed']
+    
+    def __init__(self, directory: str, max_attempts: int = 3, stale_seconds: float = 600):
+        self.directory = directory
+        self.max_attempts = max_attempts
+        self.stale_seconds = stale_seconds
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        for state in self.STATES:
+            os.makedirs(os.path.join(directory, state), exist_ok=True)
+    
+    def _path(self, state: str, task_id: str) -> str:
+        return os.path.join(self.directory, state, f"{task_id}.json")
+    
+    def _write(self, path: str, task: Dict[str, Any]):
+        temp_path = f"{path}.{self.worker_id}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(task, f, indent=2, default=str)
+        os.replace(temp_path, path)
+    
+    @staticmethod
+    def _read(path: str) -> Dict[str, Any]:
+        with open(path) as f:
+            return json.load(f)
+    
+    def ids(self, state: str) -> List[str]:
+        """Task IDs in a state, in order"""
+        return sorted(name[:-len('.json')] for name in os.listdir(os.path.join(self.directory, state))
+                      if name.endswith('.json'))
+    
+    def tasks(self, state: str) -> List[Dict[str, Any]]:
+        tasks = []
+        for task_id in self.ids(state):
+            try:
+                tasks.append(self._read(self._path(state, task_id)))
+            except FileNotFoundError:
+                continue  # Moved by another worker meanwhile
+        return tasks
+    
+    def counts(self) -> Dict[str, int]:
+        return {state: len(self.ids(state)) for state in self.STATES}
+    
+    def clear(self):
+        """Remove every task"""
+        for state in self.STATES:
+            for task_id in self.ids(state):
+                os.remove(self._path(state, task_id))
+    
+    def put(self, task_id: str, task: Dict[str, Any]):
+        """Enqueue a task, replacing a task with the same ID in any state"""
+        for state in self.STATES:
+            if os.path.exists(self._path(state, task_id)):
+                os.remove(self._path(state, task_id))
+        self._write(self._path('pending', task_id), dict(task, id=task_id, attempts=0))
+    
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Take the first pending task, or None when nothing is pending"""
+        for task_id in self.ids('pending'):
+            running_path = self._path('running', task_id)
+            try:
+                os.rename(self._path('pending', task_id), running_path)
+            except FileNotFoundError:
+                continue  # Claimed by another worker
+            task = self._read(running_path)
+            task.update(worker=self.worker_id, claimed_at=time.time())
+            self._write(running_path, task)
+            return task
+        return None
+    
+    def heartbeat(self, task: Dict[str, Any], stop: threading.Event, interval: float):
+        """Touch a running task's file until stop is set, so it is not taken for stale"""
+        while not stop.wait(interval):
+            try:
+                os.utime(self._path('running', task['id']))
+            except FileNotFoundError:
+                return
+    
+    def _release(self, task: Dict[str, Any]):
+        # Gone if the task was requeued as stale meanwhile; it will then simply run again
+        try:
+            os.remove(self._path('running', task['id']))
+        except FileNotFoundError:
+            pass
+    
+    def complete(self, task: Dict[str, Any], result: Dict[str, Any]):
+        self._write(self._path('done', task['id']), dict(task, result=result, finished_at=time.time()))
+        self._release(task)
+    
+    def fail(self, task: Dict[str, Any], error: str) -> bool:
+        """Record a failed attempt; True if the task was put back for a retry"""
+        task = dict(task, attempts=task.get('attempts', 0) + 1, error=error)
+        retry = task['attempts'] < self.max_attempts
+        self._write(self._path('pending' if retry else 'failed', task['id']), task)
+        self._release(task)
+        return retry
+    
+    def requeue_stale(self) -> List[str]:
+        """Put running tasks whose worker stopped touching them back in pending/"""
+        requeued = []
+        now = time.time()
+        for task_id in self.ids('running'):
+            path = self._path('running', task_id)
+            try:
+                if now - os.path.getmtime(path) < self.stale_seconds:
+                    continue
+                os.rename(path, self._path('pending', task_id))
+            except FileNotFoundError:
+                continue
+            logger.warning(f"Requeued task {task_id}: its worker stopped responding")
+            requeued.append(task_id)
+        return requeued
@@ -0,0 +1,7 @@
+from .ingest_daemon import IngestDaemon
+from .backfill import BackfillRunner
+
+__all__ = [
+    'IngestDaemon',
+    'BackfillRunner'
+]
@@ -0,0 +1,433 @@
+import os
+import json
+import shutil
+import logging
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Iterator, Optional, Tuple
+from sqlalchemy import inspect
+from sqlalchemy.sql import text
+
+from extractors import TrafficDataExtractor
+from transformers import FactTableTransformer, EpisodeDetector, DataQualityRules
+from loaders.warehouse_loader import WarehouseLoader
+from pipeline import WorkQueue
+from monitoring import get_recorder
+
+logger = logging.getLogger(__name__)
+
+FACT_TABLE = 'FactTrafficEvents'
+
+
+def _run_worker(config: Dict[str, Any]) -> int:
+    """Entry point of a local backfill worker process"""
+    return BackfillRunner(config).work()
+
+
+def _date_key(timestamp: pd.Timestamp) -> int:
+    return timestamp.year * 10000 + timestamp.month * 100 + timestamp.day
+
+
+class BackfillRunner:
+    """
+    Re-processes a date range of the sources as independent partitions
+    The range is split into day, week or month partitions, each an extract -> fact -> load
+    job on a file work queue under the backfill directory. Jobs are run by a local process
+    pool and by any number of `--backfill-worker` processes on hosts sharing the directory.
+    
+    Dimensions are built once by the coordinator and snapshotted next to the queue, and a
+    counting pass gives every partition its own block of event IDs, so partitions can run
+    in any order, on any host, and be retried. Each partition reads only its own rows: a
+    source that can filter a period itself (Postgres, Parquet with typed timestamps) is
+    queried per partition, any other is read once by the counting pass, which spills its
+    rows to per-partition files next to the queue. A partition load replaces the facts of
+    its dates and its event ID block. Once every partition is done the coordinator assembles
+    the CSV fact table, rebuilds the rollups of the range and checks the warehouse
+    """
+    
+    # Partition size -> pandas frequency of the partition boundaries
+    FREQUENCIES = {'day': 'D', 'week': 'W-MON', 'month': 'MS'}
+    PLAN_FILE = 'plan.json'
+    
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        backfill_config = config['backfill']
+        self.dir = backfill_config['dir']
+        self.partition = backfill_config['partition']
+        if self.partition not in self.FREQUENCIES:
+            raise ValueError(f"Unknown backfill partition '{self.partition}', expected one of {list(self.FREQUENCIES)}")
+        self.workers = backfill_config['workers']
+        self.poll_interval = backfill_config['poll_interval']
+        self.queue = WorkQueue(os.path.join(self.dir, 'queue'), backfill_config['max_attempts'],
+                               backfill_config['stale_seconds'])
+        self.dimensions_dir = os.path.join(self.dir, 'dimensions')
+        self.facts_dir = os.path.join(self.dir, 'facts')
+        self.spill_dir = os.path.join(self.dir, 'sources')
+        self.loader = WarehouseLoader(config)
+        self._dimensions: Optional[Dict[str, pd.DataFrame]] = None
+    
+    def _sources(self) -> List[str]:
+        """Fact sources of the backfill"""
+        required_tables = self.config['source']['required_tables']
+        return [source_name for source_name in FactTableTransformer.SOURCE_TIMESTAMPS if source_name in required_tables]
+    
+    def _spill_path(self, partition_id: str, source_name: str, sequence: int) -> str:
+        return os.path.join(self.spill_dir, partition_id, f"{source_name}.{sequence:06d}.pkl")
+    
+    def _boundaries(self, start: pd.Timestamp, end: pd.Timestamp) -> List[pd.Timestamp]:
+        """Partition boundaries of [start, end), aligned to days, weeks or months"""
+        inner = pd.date_range(start, end, freq=self.FREQUENCIES[self.partition], inclusive='neither')
+        return [start] + list(inner) + [end]
+    
+    @staticmethod
+    def _partition_ids(boundaries: List[pd.Timestamp]) -> List[str]:
+        return [f"{partition_start:%Y%m%d}" for partition_start in boundaries[:-1]]
+    
+    def _count(self, boundaries: List[pd.Timestamp]) -> Tuple[np.ndarray, List[str]]:
+        """
+        Source rows falling in each partition, and the sources spilled to per-partition files
+        Sources that filter periods themselves are counted from their timestamp column only;
+        the others are read whole once, and the rows of every partition are spilled
+        """
+        edges = np.array(boundaries, dtype='datetime64[ns]')
+        partition_ids = self._partition_ids(boundaries)
+        counts = np.zeros(len(boundaries) - 1, dtype=np.int64)
+        extractor = TrafficDataExtractor(self.config)
+        chunk_size = self.config['processing']['chunk_size']
+        spilled = []
+        for source_name in self._sources():
+            column = FactTableTransformer.SOURCE_TIMESTAMPS[source_name]
+            spill = not extractor.pushes_down(source_name, column)
+            if spill:
+                spilled.append(source_name)
+            chunks = extractor.extract_chunks(source_name, chunk_size, columns=None if spill else [column])
+            for sequence, chunk in enumerate(chunks):
+                timestamps = pd.to_datetime(chunk[column], errors='coerce')
+                partitions = np.searchsorted(edges, timestamps.to_numpy('datetime64[ns]'), side='right') - 1
+                valid = timestamps.notna().to_numpy() & (partitions >= 0) & (partitions < len(counts))
+                counts += np.bincount(partitions[valid], minlength=len(counts))
+                if not spill:
+                    continue
+                for partition in np.unique(partitions[valid]):
+                    path = self._spill_path(partition_ids[partition], source_name, sequence)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    chunk[valid & (partitions == partition)].to_pickle(path)
+        if spilled:
+            logger.info(f"Spilled the rows of {', '.join(spilled)} to {len(partition_ids)} partitions")
+        return counts, spilled
+    
+    def plan(self, start: pd.Timestamp, end: pd.Timestamp, dimensions: Dict[str, pd.DataFrame]) -> List[str]:
+        """
+        Split [start, end) into partitions and enqueue one job for each
+        The dimensions the jobs resolve keys against are written next to the queue
+        """
+        shutil.rmtree(self.dimensions_dir, ignore_errors=True)
+        shutil.rmtree(self.facts_dir, ignore_errors=True)
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+        os.makedirs(self.dimensions_dir)
+        os.makedirs(self.facts_dir)
+        for dim_name, df in dimensions.items():
+            df.to_pickle(os.path.join(self.dimensions_dir, f"{dim_name}.pkl"))
+        
+        boundaries = self._boundaries(start, end)
+        counts, spilled = self._count(boundaries)
+        next_event_id = (self.loader.max_value(FACT_TABLE, 'event_id') or 0) + 1
+        first_event_id = next_event_id
+        
+        self.queue.clear()
+        partitions = []
+        for partition_id, partition_start, partition_end, source_rows in zip(
+                self._partition_ids(boundaries), boundaries, boundaries[1:], counts):
+            self.queue.put(partition_id, {
+                'start': partition_start.isoformat(),
+                'end': partition_end.isoformat(),
+                'first_event_id': next_event_id,
+                'source_rows': int(source_rows)
+            })
+            next_event_id += int(source_rows)
+            partitions.append(partition_id)
+        
+        plan = {
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'partition': self.partition,
+            'partitions': partitions,
+            'spilled': spilled,
+            'first_event_id': first_event_id,
+            'next_event_id': next_event_id
+        }
+        with open(os.path.join(self.dir, self.PLAN_FILE), 'w') as f:
+            json.dump(plan, f, indent=2)
+        logger.info(f"Planned backfill of {start:%Y-%m-%d} to {end:%Y-%m-%d}: {len(partitions)} {self.partition} "
+                    f"partitions, {int(counts.sum())} source rows")
+        return partitions
+    
+    def _load_plan(self) -> Dict[str, Any]:
+        with open(os.path.join(self.dir, self.PLAN_FILE)) as f:
+            return json.load(f)
+    
+    def _load_dimensions(self) -> Dict[str, pd.DataFrame]:
+        if self._dimensions is None:
+            self._dimensions = {
+                name[:-len('.pkl')]: pd.read_pickle(os.path.join(self.dimensions_dir, name))
+                for name in os.listdir(self.dimensions_dir) if name.endswith('.pkl')
+            }
+        return self._dimensions
+    
+    def _facts_path(self, partition_id: str) -> str:
+        return os.path.join(self.facts_dir, f"{partition_id}.parquet")
+    
+    def _rejects_path(self, partition_id: str) -> str:
+        return os.path.join(self.facts_dir, f"{partition_id}.rejects.parquet")
+    
+    def _partition_chunks(self, task: Dict[str, Any], sources: List[str],
+                          columns: Optional[Dict[str, List[str]]] = None) -> Iterator[Tuple[str, pd.DataFrame]]:
+        """
+        Chunks of the partition's rows of some sources, optionally projected per source: read
+        from the spilled files, or from the source with the partition's period pushed down
+        """
+        start, end = pd.Timestamp(task['start']), pd.Timestamp(task['end'])
+        spilled = set(self._load_plan()['spilled'])
+        extractor = TrafficDataExtractor(self.config)
+        chunk_size = self.config['processing']['chunk_size']
+        for source_name in sources:
+            source_columns = columns.get(source_name) if columns is not None else None
+            if source_name in spilled:
+                spill_dir = os.path.join(self.spill_dir, task['id'])
+                names = sorted(os.listdir(spill_dir)) if os.path.isdir(spill_dir) else []
+                for name in names:
+                    if name.startswith(f"{source_name}."):
+                        chunk = pd.read_pickle(os.path.join(spill_dir, name))
+                        yield source_name, chunk if source_columns is None else \
+                            chunk[[column for column in source_columns if column in chunk.columns]]
+                continue
+            period = (FactTableTransformer.SOURCE_TIMESTAMPS[source_name], start, end)
+            for chunk in extractor.extract_chunks(source_name, chunk_size, columns=source_columns, period=period):
+                yield source_name, chunk
+    
+    def run_partition(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        """Extract the partition's source rows, build their facts and load them"""
+        start, end = pd.Timestamp(task['start']), pd.Timestamp(task['end'])
+        with get_recorder().stage('backfill', task['id'], rows_in=task['source_rows']) as metrics:
+            # Episodes are detected within the partition
+            detector = EpisodeDetector(self.config)
+            episode_columns = {source_name: detector.columns(source_name) for source_name in EpisodeDetector.SOURCES}
+            episode_chunks = self._partition_chunks(
+                task, [source_name for source_name in self._sources() if source_name in EpisodeDetector.SOURCES],
+                episode_columns
+            )
+            transformer = FactTableTransformer(self.config)
+            transformer.episode_durations = detector.detect(episode_chunks)
+            try:
+                fact_chunks = [chunk for chunk in transformer.transform_stream(
+                    self._partition_chunks(task, self._sources()), self._load_dimensions(), task['first_event_id']
+                ) if not chunk.empty]
+            finally:
+                transformer.episode_durations.cleanup()
+            facts = pd.concat(fact_chunks, ignore_index=True) if fact_chunks else pd.DataFrame()
+            # Rejects are loaded with the facts at the end, so a retried partition replaces its own
+            rejects_path = self._rejects_path(task['id'])
+            temp_path = f"{rejects_path}.{self.queue.worker_id}.tmp"
+            transformer.quality.drain().to_parquet(temp_path, index=False)
+            os.replace(temp_path, rejects_path)
+            
+            last_event_id = task['first_event_id'] + task['source_rows']
+            if not facts.empty and facts['event_id'].max() >= last_event_id:
+                raise RuntimeError(f"Partition {task['id']} produced more facts than its {task['source_rows']} source rows")
+            self._load_partition(task, facts)
+            metrics.rows_out = len(facts)
+        
+        start_key, end_key = _date_key(start), _date_key(end)
+        return {
+            'rows': len(facts),
+            'dated_rows': int(facts['date_key'].between(start_key, end_key - 1).sum()) if not facts.empty else 0,
+            'min_event_id': int(facts['event_id'].min()) if not facts.empty else None,
+            'max_event_id': int(facts['event_id'].max()) if not facts.empty else None
+        }
+    
+    def _load_partition(self, task: Dict[str, Any], facts: pd.DataFrame):
+        """
+        Keep the partition's facts for the final assembly and, with a database, replace the
+        facts of its dates and event ID block in one transaction, so a retry doesn't duplicate rows
+        """
+        path = self._facts_path(task['id'])
+        temp_path = f"{path}.{self.queue.worker_id}.tmp"
+        facts.to_parquet(temp_path, index=False)
+        os.replace(temp_path, path)
+        if not self.loader.use_db:
+            return
+        
+        schema = self.loader.db_config['schema']
+        start_key, end_key = _date_key(pd.Timestamp(task['start'])), _date_key(pd.Timestamp(task['end']))
+        with self.loader.engine.begin() as conn:
+            if inspect(conn).has_table(FACT_TABLE, schema=schema):
+                conn.execute(text(
+                    f'DELETE FROM "{schema}"."{FACT_TABLE}" WHERE (date_key >= :start_key AND date_key < :end_key) '
+                    f'OR (event_id >= :first_event_id AND event_id < :last_event_id)'
+                ), {
+                    'start_key': start_key, 'end_key': end_key, 'first_event_id': task['first_event_id'],
+                    'last_event_id': task['first_event_id'] + task['source_rows']
+                })
+            if not facts.empty:
+                facts.to_sql(name=FACT_TABLE, schema=schema, con=conn, if_exists='append', index=False, chunksize=1000)
+        logger.info(f"Loaded {len(facts)} facts of partition {task['id']}")
+    
+    def work(self) -> int:
+        """Claim and run partitions until none is pending; returns the number completed"""
+        completed = 0
+        while True:
+            self.queue.requeue_stale()
+            task = self.queue.claim()
+            if task is None:
+                return completed
+            
+            logger.info(f"Backfilling partition {task['id']} ({task['start']} to {task['end']}, "
+                        f"attempt {task['attempts'] + 1})")
+            stop = threading.Event()
+            heartbeat = threading.Thread(
+                target=self.queue.heartbeat, args=(task, stop, max(1.0, self.queue.stale_seconds / 4)), daemon=True
+            )
+            heartbeat.start()
+            try:
+                result = self.run_partition(task)
+            except Exception as e:
+                stop.set()
+                retry = self.queue.fail(task, f"{type(e).__name__}: {str(e)}")
+                logger.error(f"Partition {task['id']} failed{', will retry' if retry else ''}: {str(e)}", exc_info=True)
+            else:
+                stop.set()
+                self.queue.complete(task, result)
+                completed += 1
+            finally:
+                stop.set()
+                heartbeat.join()
+    
+    def run(self):
+        """Work through the queue with the local worker processes, then wait for remote workers"""
+        if self.workers > 0:
+            logger.info(f"Starting {self.workers} local backfill workers")
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                futures = [pool.submit(_run_worker, self.config) for _ in range(self.workers)]
+                completed = sum(future.result() for future in futures)
+            logger.info(f"Local workers completed {completed} partitions")
+        
+        while True:
+            self.queue.requeue_stale()
+            counts = self.queue.counts()
+            if counts['pending'] == 0 and counts['running'] == 0:
+                return
+            logger.info(f"Waiting for backfill workers: {counts['pending']} pending, {counts['running']} running")
+            # A partition requeued from a dead worker is taken over by this process
+            if self.workers > 0 and counts['pending']:
+                self.work()
+                continue
+            self.queue.requeue_stale()
+            threading.Event().wait(self.poll_interval)
+    
+    def _check_partitions(self, plan: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """Done partitions in order, and every inconsistency between them and the plan"""
+        problems = []
+        for task in self.queue.tasks('failed'):
+            problems.append(f"partition {task['id']} failed after {task['attempts']} attempts: {task.get('error')}")
+        done = {task['id']: task for task in self.queue.tasks('done')}
+        for partition_id in plan['partitions']:
+            task = done.get(partition_id)
+            if task is None:
+                if not any(partition_id in problem for problem in problems):
+                    problems.append(f"partition {partition_id} did not finish")
+                continue
+            result = task['result']
+            path = self._facts_path(partition_id)
+            stored_rows = pq.read_metadata(path).num_rows if os.path.exists(path) else None
+            if stored_rows != result['rows']:
+                problems.append(f"partition {partition_id} loaded {result['rows']} facts but kept {stored_rows}")
+            last_event_id = task['first_event_id'] + task['source_rows']
+            if result['rows'] and not (task['first_event_id'] <= result['min_event_id']
+                                       and result['max_event_id'] < last_event_id):
+                problems.append(f"partition {partition_id} event IDs leave their block")
+        return [done[partition_id] for partition_id in plan['partitions'] if partition_id in done], problems
+    
+    def finalize(self):
+        """Assemble the CSV fact table, load the rejected records and rebuild the rollups of the backfilled range"""
+        plan = self._load_plan()
+        done, problems = self._check_partitions(plan)
+        if problems:
+            raise RuntimeError(f"Backfill incomplete: {'; '.join(problems)}")
+        
+        start_key, end_key = _date_key(pd.Timestamp(plan['start'])), _date_key(pd.Timestamp(plan['end']))
+        if not self.loader.use_db:
+            # Facts outside the range and outside the backfill's event IDs are kept
+            path = os.path.join(self.loader.output_dir, f"{FACT_TABLE}.csv")
+            kept = pd.read_csv(path) if os.path.exists(path) and os.path.getsize(path) else pd.DataFrame()
+            if not kept.empty:
+                kept = kept[((kept['date_key'] < start_key) | (kept['date_key'] >= end_key))
+                            & ~kept['event_id'].between(plan['first_event_id'], plan['next_event_id'] - 1)]
+            self.loader._write(FACT_TABLE, kept)
+            append = not kept.empty
+            for task in done:
+                facts = pd.read_parquet(self._facts_path(task['id']))
+                if not facts.empty:
+                    self.loader._write(FACT_TABLE, facts, append=append)
+                    append = True
+        
+        # The rejects of every partition replace the earlier rejects of the range, as rejects of this run
+        rejects = [pd.read_parquet(self._rejects_path(task['id'])) for task in done
+                   if os.path.exists(self._rejects_path(task['id']))]
+        rejects = [df for df in rejects if not df.empty]
+        rejects = pd.concat(rejects, ignore_index=True) if rejects else pd.DataFrame(columns=DataQualityRules.REJECT_COLUMNS)
+        self.loader.load_rejects(
+            DataQualityRules.REJECT_TABLE, rejects.assign(run_id=get_recorder().run_id),
+            sources=self._sources(),
+            period=(pd.Timestamp(plan['start']), pd.Timestamp(plan['end'])),
+            timestamps=FactTableTransformer.SOURCE_TIMESTAMPS
+        )
+        
+        if self.loader.rollups is not None:
+            parts = []
+            for task in done:
+                if task['result']['rows']:
+                    parts.append(self.loader.rollups.aggregate(pd.read_parquet(self._facts_path(task['id']))))
+            self.loader.rollups.replace_range(parts, start_key, end_key)
+    
+    def _warehouse_counts(self, plan: Dict[str, Any]) -> Tuple[int, int]:
+        """Loaded facts within the backfilled dates, and within the backfill's event IDs"""
+        start_key, end_key = _date_key(pd.Timestamp(plan['start'])), _date_key(pd.Timestamp(plan['end']))
+        first_event_id, next_event_id = plan['first_event_id'], plan['next_event_id']
+        if self.loader.use_db:
+            schema = self.loader.db_config['schema']
+            with self.loader.engine.connect() as conn:
+                return tuple(conn.execute(text(
+                    f'SELECT SUM(CASE WHEN date_key >= :start_key AND date_key < :end_key THEN 1 ELSE 0 END), '
+                    f'SUM(CASE WHEN event_id >= :first_event_id AND event_id < :next_event_id THEN 1 ELSE 0 END) '
+                    f'FROM "{schema}"."{FACT_TABLE}"'
+                ), {'start_key': start_key, 'end_key': end_key, 'first_event_id': first_event_id,
+                    'next_event_id': next_event_id}).one())
+        facts = pd.read_csv(os.path.join(self.loader.output_dir, f"{FACT_TABLE}.csv"), usecols=['date_key', 'event_id'])
+        return (int(facts['date_key'].between(start_key, end_key - 1).sum()),
+                int(facts['event_id'].between(first_event_id, next_event_id - 1).sum()))
+    
+    def verify(self) -> Dict[str, Any]:
+        """
+        Final consistency check: every partition finished within its event ID block, and the
+        warehouse holds exactly the backfilled facts for the range, with no rows left from before
+        """
+        plan = self._load_plan()
+        done, problems = self._check_partitions(plan)
+        rows = sum(task['result']['rows'] for task in done)
+        dated_rows = sum(task['result']['dated_rows'] for task in done)
+        in_range, in_blocks = (int(count or 0) for count in self._warehouse_counts(plan))
+        if in_blocks != rows:
+            problems.append(f"the warehouse holds {in_blocks} of the {rows} backfilled facts")
+        if in_range != dated_rows:
+            problems.append(f"the warehouse holds {in_range} facts dated in the range, expected {dated_rows}")
+        
+        summary = {'partitions': len(plan['partitions']), 'completed': len(done), 'rows': rows,
+                   'retried': sum(1 for task in done if task['attempts']), 'problems': problems}
+        if problems:
+            raise RuntimeError(f"Backfill consistency check failed: {'; '.join(problems)}")
+        logger.info(f"Backfill consistent: {rows} facts in {len(done)} partitions "
+                    f"({summary['retried']} needed retries)")
+        return summary
@@ -0,0 +1,256 @@
+import os
+import copy
+import time
+import shutil
+import signal
+import logging
+import threading
+import pandas as pd
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from extractors import TrafficDataExtractor
+from transformers import FactTableTransformer, LocationNormalizer, EpisodeDetector, RecordDeduplicator, DataQualityRules
+from transformers.dimension import DIMENSION_TRANSFORMERS, STATIC_DIMENSIONS, merge_dimension
+from loaders.warehouse_loader import WarehouseLoader
+from monitoring import get_recorder, flush_logs
+from analytics import TrafficSketches, SketchStore, RollingFeatures
+
+logger = logging.getLogger(__name__)
+
+FACT_TABLE = 'FactTrafficEvents'
+
+
+class IngestDaemon:
+    """
+    Resident ingestion service for micro-batches dropped into an inbox directory
+    Dimensions, their key indexes and the database connection pool stay warm between
+    batches. A dimension is rebuilt only when a batch changes its inputs, and surrogate
+    keys already handed out never move, so facts loaded earlier stay valid
+    """
+    
+    # Source tables each data-driven dimension is built from
+    DIMENSION_SOURCES = {
+        'DimLocation': LocationNormalizer.LOCATION_TABLES,
+        'DimVehicle': ['Vehicles'],
+        'DimEnvironmental': ['WeatherData']
+    }
+    
+    WEATHER_COLUMNS = ['Timestamp', 'Temperature_C', 'Condition', 'Humidity_Percent']
+    DROP_EXTENSIONS = ('.xlsx', '.xls')  # Directory drops hold CSV or Parquet files
+    
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        daemon_config = config['daemon']
+        self.inbox_dir = daemon_config['inbox_dir']
+        self.processed_dir = daemon_config['processed_dir'] or os.path.join(self.inbox_dir, 'processed')
+        self.failed_dir = daemon_config['failed_dir'] or os.path.join(self.inbox_dir, 'failed')
+        self.poll_interval = daemon_config['poll_interval']
+        self.settle_seconds = daemon_config['settle_seconds']
+        
+        # Warm state reused by every batch
+        self.loader = WarehouseLoader(config)
+        self.normalizer = LocationNormalizer(config)
+        self.fact_transformer = FactTableTransformer(config)
+        self.sketch_store = SketchStore(config)
+        self.episode_detector = EpisodeDetector(config)
+        self.sources: Dict[str, pd.DataFrame] = {}  # Retained dimension inputs
+        self.dimensions: Dict[str, pd.DataFrame] = {}
+        self.next_event_id = 1
+        self._stop = threading.Event()
+    
+    def _accumulate(self, table: str, df: pd.DataFrame) -> bool:
+        """Merge a table of a batch into the retained dimension inputs; True if they changed"""
+        if table == 'Vehicles':
+            new, subset, keep = df[['VehicleID', 'VehicleType']], ['VehicleID'], 'last'
+        elif table == 'WeatherData':
+            new, subset, keep = df[self.WEATHER_COLUMNS], None, 'first'
+        elif 'Location' in df.columns:
+            new, subset, keep = df[['Location']].astype({'Location': object}), None, 'first'
+        else:
+            return False
+        
+        previous = self.sources.get(table)
+        combined = new if previous is None else pd.concat([previous, new], ignore_index=True)
+        combined = combined.drop_duplicates(subset=subset, keep=keep, ignore_index=True)
+        if previous is not None and combined.equals(previous):
+            return False
+        self.sources[table] = combined
+        return True
+    
+    def _load_dimension(self, dim_name: str):
+        df = self.dimensions[dim_name]
+        # Remove date column from environmental dimension (It was there for mapping purposes)
+        if dim_name == 'DimEnvironmental':
+            df = df.drop('date', axis=1)
+        self.loader.load_table(dim_name, df)
+    
+    def _refresh_dimensions(self, changed_tables: List[str], force: bool = False) -> List[str]:
+        """Rebuild and reload only the dimensions whose inputs changed"""
+        refreshed = []
+        for dim_name, tables in self.DIMENSION_SOURCES.items():
+            if not force and not set(tables) & set(changed_tables):
+                continue
+            transformer = DIMENSION_TRANSFORMERS[dim_name](self.config)
+            with get_recorder().stage('transform', dim_name) as metrics:
+                rebuilt = transformer.transform(self.sources)
+                self.dimensions[dim_name] = merge_dimension(dim_name, self.dimensions.get(dim_name), rebuilt)
+                metrics.rows_out = len(self.dimensions[dim_name])
+            self._load_dimension(dim_name)
+            refreshed.append(dim_name)
+        return refreshed
+    
+    def _bootstrap_sources(self):
+        """Seed the dimension inputs from SOURCE_FILE, streaming fact sources by location only"""
+        source_file = self.config['source']['source_file']
+        if not self.config['daemon']['bootstrap'] or not os.path.exists(source_file):
+            return
+        
+        logger.info(f"Bootstrapping dimensions from {source_file}")
+        extractor = TrafficDataExtractor(self.config)
+        chunk_size = self.config['processing']['chunk_size']
+        for table in extractor.available_tables():
+            if table not in LocationNormalizer.LOCATION_TABLES:
+                self._accumulate(table, extractor.extract(table))
+                continue
+            for chunk in extractor.extract_chunks(table, chunk_size, columns=['Location']):
+                if 'Location' in chunk.columns:
+                    self._accumulate(table, self.normalizer.normalize_sources({table: chunk})[table])
+    
+    def start(self):
+        """Build the warm state: static dimensions, bootstrapped dimensions and the next event ID"""
+        recorder = get_recorder()
+        recorder.start_run()
+        status = 'failed'
+        try:
+            for dim_name in STATIC_DIMENSIONS:
+                self.dimensions[dim_name] = DIMENSION_TRANSFORMERS[dim_name](self.config).transform()
+                self._load_dimension(dim_name)
+            self._bootstrap_sources()
+            self._refresh_dimensions([], force=True)
+            self.next_event_id = (self.loader.max_value(FACT_TABLE, 'event_id') or 0) + 1
+            status = 'success'
+        finally:
+            recorder.write_report(self.config, status)
+        logger.info(f"Daemon ready, watching {self.inbox_dir} (next event ID {self.next_event_id})")
+    
+    def process_batch(self, path: str) -> int:
+        """Extract a dropped batch, refresh affected dimensions and append its facts"""
+        recorder = get_recorder()
+        recorder.start_run()
+        status = 'failed'
+        started = time.perf_counter()
+        try:
+            batch_config = copy.deepcopy(self.config)
+            batch_config['source']['source_file'] = path
+            batch_config['source']['source_format'] = 'auto'
+            extractor = TrafficDataExtractor(batch_config)
+            
+            tables = extractor.available_tables()
+            data = self.normalizer.normalize_sources({table: extractor.extract(table) for table in tables})
+            changed = [table for table, df in data.items() if self._accumulate(table, df)]
+            refreshed = self._refresh_dimensions(changed)
+            
+            # Records already loaded by earlier batches or the last full load are dropped before key resolution
+            dedup = RecordDeduplicator(self.config)
+            chunks = [
+                (source_name, dedup.filter(source_name, data[source_name]))
+                for source_name in FactTableTransformer.SOURCE_TIMESTAMPS if source_name in data
+            ]
+            # Episodes are detected and the error threshold applied within the batch
+            self.fact_transformer.quality = DataQualityRules(self.config)
+            self.fact_transformer.episode_durations = self.episode_detector.detect(chunks)
+            fact_chunks = self.fact_transformer.transform_stream(chunks, self.dimensions, self.next_event_id)
+            sketches = TrafficSketches(self.config) if self.sketch_store.enabled else None
+            if sketches is not None:
+                fact_chunks = sketches.update_stream(fact_chunks, self.dimensions.get('DimVehicle'))
+            features = RollingFeatures(self.config)
+            if features.enabled:
+                fact_chunks = features.update_stream(fact_chunks)
+            try:
+                rows = self.loader.load_table_chunks(
+                    FACT_TABLE, fact_chunks, self.config['processing']['load_queue_size'], append=True
+                )
+            except Exception:
+                dedup.discard()
+                raise
+            finally:
+                self.fact_transformer.episode_durations.cleanup()
+                self.fact_transformer.episode_durations = self.episode_detector.empty()
+            self.next_event_id += rows
+            dedup.commit()
+            self.loader.load_rejects(DataQualityRules.REJECT_TABLE, self.fact_transformer.quality.drain())
+            if sketches is not None and rows:
+                # Each batch is its own sketch partition, merged with earlier ones on read
+                self.sketch_store.save(sketches, f"{datetime.now():%Y%m%d_%H%M%S}_{os.path.basename(path)}")
+            if features.enabled and rows:
+                # Only the trailing window of the locations in the batch is recomputed
+                features.apply(self.loader, replace=False)
+            status = 'success'
+            
+            logger.info(f"Processed {os.path.basename(path)} in {time.perf_counter() - started:.2f} seconds: "
+                        f"{rows} facts from {len(tables)} tables, refreshed {refreshed or 'no dimensions'}")
+            return rows
+        except Exception:
+            # A partial append may have consumed IDs, so resynchronize with the warehouse
+            self.next_event_id = (self.loader.max_value(FACT_TABLE, 'event_id') or 0) + 1
+            raise
+        finally:
+            recorder.write_report(self.config, status)
+            # Report the repeated events of the batch now rather than when they next recur
+            flush_logs()
+    
+    def pending(self) -> List[str]:
+        """Drops in the inbox that have stopped changing, oldest first"""
+        if not os.path.isdir(self.inbox_dir):
+            return []
+        
+        now = time.time()
+        drops = []
+        for name in os.listdir(self.inbox_dir):
+            path = os.path.join(self.inbox_dir, name)
+            if name.startswith('.') or path in (self.processed_dir, self.failed_dir):
+                continue
+            if os.path.isdir(path):
+                modified = max([os.path.getmtime(path)] +
+                               [os.path.getmtime(os.path.join(path, child)) for child in os.listdir(path)])
+            elif name.lower().endswith(self.DROP_EXTENSIONS):
+                modified = os.path.getmtime(path)
+            else:
+                continue
+            if now - modified >= self.settle_seconds:
+                drops.append((modified, path))
+        return [path for _, path in sorted(drops)]
+    
+    def _archive(self, path: str, target_dir: str):
+        os.makedirs(target_dir, exist_ok=True)
+        target = os.path.join(target_dir, f"{datetime.now():%Y%m%d_%H%M%S}_{os.path.basename(path)}")
+        shutil.move(path, target)
+    
+    def stop(self, *args):
+        """Finish the current batch and exit the polling loop"""
+        logger.info("Stopping daemon")
+        self._stop.set()
+    
+    def run(self, once: bool = False):
+        """Poll the inbox until stopped, or drain it once"""
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+        
+        os.makedirs(self.inbox_dir, exist_ok=True)
+        self.start()
+        while not self._stop.is_set():
+            for path in self.pending():
+                if self._stop.is_set():
+                    break
+                try:
+                    self.process_batch(path)
+                    self._archive(path, self.processed_dir)
+                except Exception as e:
+                    logger.error(f"Failed to process {path}: {str(e)}", exc_info=True)
+                    self._archive(path, self.failed_dir)
+            if once:
+                break
+            self._stop.wait(self.poll_interval)
+        logger.info("Daemon stopped")
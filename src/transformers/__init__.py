@@ -1,10 +1,31 @@
+import pandas as pd
+
+# Copy-on-write: derived frames (assign, filters, renames) share the source columns until
+# one of them is written, so transformers never duplicate source tables defensively
+pd.set_option('mode.copy_on_write', True)
+
 from .base_transformer import BaseTransformer
 from .fact_transformer import FactTableTransformer
+from .location_normalizer import LocationNormalizer
+from .shared_lookup import SharedDimensionLookups
+from .cache import TransformCache
+from .episodes import EpisodeDetector, EpisodeDurations
+from .dedup import RecordDeduplicator, SeenKeyStore
+from .quality import DataQualityRules, DataQualityError
 from .dimension import *
 
 __all__ = [
     'BaseTransformer',
     'FactTableTransformer',
+    'LocationNormalizer',
+    'SharedDimensionLookups',
+    'TransformCache',
+    'EpisodeDetector',
+    'EpisodeDurations',
+    'RecordDeduplicator',
+    'SeenKeyStore',
+    'DataQualityRules',
+    'DataQualityError',
     'LocationDimensionTransformer',
     'DateDimensionTransformer',
     'TimeDimensionTransformer',
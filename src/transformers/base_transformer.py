@@ -1,16 +1,47 @@
+import hashlib
 import pandas as pd
 from typing import Dict, Any, Optional
 import logging
 
+from src.models.dtypes import DtypePlan
+
 logger = logging.getLogger(__name__)
 
 class BaseTransformer:
     """Base class for all transformers"""
     
+    # Bump when a change alters a transformer's output, so cached results are not reused
+    VERSION = 1
+    
     def __init__(self, config: Dict[str, Any]):
         self.config = config
+        self.dtypes = DtypePlan(config)
         logger.debug(f"Initialized {self.__class__.__name__}")
     
     def transform(self, data: Optional[Dict[str, pd.DataFrame]] = None) -> pd.DataFrame:
         """Transform source data into target format"""
-        raise NotImplementedError("Subclasses must implement transform method") 
\ No newline at end of file
+        raise NotImplementedError("Subclasses must implement transform method")
+    
+    @staticmethod
+    def _file_digest(path: Optional[str]) -> Optional[str]:
+        """SHA-256 of a file's contents, or None without a file"""
+        if not path:
+            return None
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def cache_key(self) -> Dict[str, Any]:
+        """Settings that affect the transform's output, part of its cache fingerprint"""
+        processing_config = self.config.get('processing', {})
+        location_config = self.config.get('location') or {}
+        return {
+            'location': location_config,
+            # The alias file can be edited in place, so its contents are part of the key as well as its path
+            'location_aliases': self._file_digest(location_config.get('aliases_file')),
+            'error_handling': processing_config.get('error_handling'),
+            'error_threshold': processing_config.get('error_threshold'),
+            'dtypes': self.dtypes.enabled
+        }
@@ -0,0 +1,126 @@
+import os
+import json
+import pickle
+import hashlib
+import logging
+import threading
+import pandas as pd
+from typing import Dict, Any, List, Optional, Tuple
+
+from .base_transformer import BaseTransformer
+
+logger = logging.getLogger(__name__)
+
+
+class TransformCache:
+    """
+    On-disk memoization of transformer outputs
+    A result is keyed by a fingerprint of the transformer class and VERSION, the part
+    of the configuration that affects it, and the content of its input frames, so a
+    rerun over unchanged data (or after a failure further down the pipeline) skips the
+    transform. The cache directory is kept under max_bytes by evicting least recently
+    used results
+    """
+    
+    SUFFIX = '.pkl'
+    
+    def __init__(self, config: Dict[str, Any]):
+        cache_config = config['cache']
+        self.enabled = cache_config['enabled']
+        self.cache_dir = cache_config['dir']
+        self.max_bytes = cache_config['max_bytes']
+        self._lock = threading.Lock()
+    
+    def _hash_frame(self, digest, df: Optional[pd.DataFrame]):
+        if df is None:
+            digest.update(b'none')
+            return
+        digest.update(json.dumps([[str(column), str(dtype)] for column, dtype in df.dtypes.items()]).encode())
+        digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    
+    def fingerprint(self, transformer: BaseTransformer, *inputs) -> str:
+        """Fingerprint of a transform call: transformer version, its configuration and input frames"""
+        transformer_class = type(transformer)
+        digest = hashlib.sha256()
+        digest.update(f"{transformer_class.__module__}.{transformer_class.__qualname__}".encode())
+        digest.update(str(transformer_class.VERSION).encode())
+        digest.update(json.dumps(transformer.cache_key(), sort_keys=True, default=str).encode())
+        
+        for value in inputs:
+            if isinstance(value, dict):
+                for name in sorted(value):
+                    digest.update(name.encode())
+                    self._hash_frame(digest, value[name])
+            else:
+                self._hash_frame(digest, value)
+        return digest.hexdigest()
+    
+    def _path(self, fingerprint: str) -> str:
+        return os.path.join(self.cache_dir, fingerprint + self.SUFFIX)
+    
+    def get(self, fingerprint: str) -> Optional[pd.DataFrame]:
+        """Cached result for a fingerprint, marking it as recently used"""
+        path = self._path(fingerprint)
+        try:
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+            os.utime(path)
+            return result
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cache entry {path}: {str(e)}")
+            return None
+    
+    def put(self, fingerprint: str, result: pd.DataFrame):
+        """Store a result, then evict least recently used entries beyond the size cap"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(fingerprint)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self.evict()
+    
+    def evict(self) -> List[str]:
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith(self.SUFFIX):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue  # Evicted concurrently by another process
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            
+            total = sum(size for _, size, _ in entries)
+            removed = []
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed.append(os.path.basename(path))
+        
+        if removed:
+            logger.info(f"Evicted {len(removed)} cached transform results to stay under {self.max_bytes} bytes")
+        return removed
+    
+    def transform(self, transformer: BaseTransformer, *inputs) -> Tuple[pd.DataFrame, bool]:
+        """Return transformer.transform(*inputs) from the cache when possible, and whether it was a hit"""
+        if not self.enabled:
+            return transformer.transform(*inputs), False
+        
+        fingerprint = self.fingerprint(transformer, *inputs)
+        result = self.get(fingerprint)
+        if result is not None:
+            logger.info(f"Reusing cached {type(transformer).__name__} result {fingerprint[:12]}")
+            return result, True
+        
+        result = transformer.transform(*inputs)
+        self.put(fingerprint, result)
+        return result, False
@@ -0,0 +1,369 @@
+import os
+import json
+import uuid
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Iterable, Iterator, Optional, Tuple
+from numpy.lib.format import open_memmap
+
+from monitoring import get_recorder
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = 'state.json'
+
+
+def _salt(name: str) -> np.uint64:
+    """64-bit salt keeping the hashes of different sources apart"""
+    return np.uint64(int(hashlib.md5(name.encode('utf-8')).hexdigest()[:16], 16))
+
+
+class SeenKeyStore:
+    """
+    Persisted set of 64-bit record hashes
+    Hashes are kept in sorted, disjoint .npy runs that are opened memory-mapped, so
+    memory does not grow with history. A Bloom filter over every run (also a memory-mapped
+    .npy file) answers most lookups of new records; its positives are confirmed by binary
+    search in the runs. Each hash sets bits of a single word of the filter, so a
+    lookup reads one word. Runs are merged in fixed-size blocks once there are more than
+    max_runs, and the filter is rebuilt at twice the capacity when it fills up.
+    
+    state.json lists the committed files. Files are never modified once written, and the
+    state is replaced atomically, so an interrupted commit leaves the previous set intact
+    """
+    
+    def __init__(self, config: Dict[str, Any]):
+        dedup_config = config.get('dedup', {})
+        self.dir = dedup_config.get('dir', 'dedup')
+        self.bits_per_key = max(1, dedup_config.get('bits_per_key', 10))
+        self.initial_capacity = max(1, dedup_config.get('capacity', 1000000))
+        self.block_size = max(1, dedup_config.get('spill_keys', 1000000))
+        self.max_runs = max(1, dedup_config.get('max_runs', 8))
+        self.state = self._load_state()
+        self._runs = [np.load(self.path(name), mmap_mode='r') for name in self.state['runs']]
+        self._bloom = np.load(self.path(self.state['bloom']), mmap_mode='r') if self.state['bloom'] else None
+    
+    def path(self, name: str) -> str:
+        return os.path.join(self.dir, name)
+    
+    def _load_state(self) -> Dict[str, Any]:
+        path = self.path(STATE_FILE)
+        if not os.path.exists(path):
+            return {'runs': [], 'bloom': None, 'capacity': 0, 'hashes': 0, 'count': 0}
+        with open(path) as f:
+            return json.load(f)
+    
+    @property
+    def count(self) -> int:
+        return self.state['count']
+    
+    @staticmethod
+    def contains_sorted(run: np.ndarray, hashes: np.ndarray) -> np.ndarray:
+        """Membership of hashes in a sorted run"""
+        if len(run) == 0 or len(hashes) == 0:
+            return np.zeros(len(hashes), dtype=bool)
+        positions = np.minimum(np.searchsorted(run, hashes), len(run) - 1)
+        return run[positions] == hashes
+    
+    @staticmethod
+    def _bloom_words(hashes: np.ndarray, words: int, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Word and bit mask of every hash in a blocked Bloom filter: all bits of a hash fall in one
+        64-bit word, chosen by the high half of the hash, at positions from slices of a remixed hash
+        """
+        word = (hashes >> np.uint64(32)) % np.uint64(words)
+        mixed = hashes * np.uint64(0x9E3779B97F4A7C15)
+        mask = np.zeros(len(hashes), dtype=np.uint64)
+        for i in range(count):
+            mask |= np.uint64(1) << ((mixed >> np.uint64(6 * i)) & np.uint64(63))
+        return word, mask
+    
+    def _bloom_test(self, hashes: np.ndarray) -> np.ndarray:
+        word, mask = self._bloom_words(hashes, len(self._bloom), self.state['hashes'])
+        return (self._bloom[word] & mask) == mask
+    
+    def _bloom_add(self, bloom: np.ndarray, hashes: np.ndarray, count: int):
+        word, mask = self._bloom_words(hashes, len(bloom), count)
+        # OR the masks of each word together first, then update every touched word once
+        order = np.argsort(word)
+        word, mask = word[order], mask[order]
+        starts = np.flatnonzero(np.concatenate([[True], word[1:] != word[:-1]]))
+        bloom[word[starts]] |= np.bitwise_or.reduceat(mask, starts)
+    
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        """Exact membership of hashes in the committed set"""
+        seen = np.zeros(len(hashes), dtype=bool)
+        if self._bloom is None or len(hashes) == 0:
+            return seen
+        candidates = np.flatnonzero(self._bloom_test(hashes))
+        for run in self._runs:
+            if len(candidates) == 0:
+                break
+            found = self.contains_sorted(run, hashes[candidates])
+            seen[candidates[found]] = True
+            candidates = candidates[~found]  # Runs are disjoint
+        return seen
+    
+    def write_run(self, hashes: np.ndarray, prefix: str) -> str:
+        """Write sorted hashes as a new run file and return its name"""
+        name = f"{prefix}-{uuid.uuid4().hex[:12]}.npy"
+        os.makedirs(self.dir, exist_ok=True)
+        np.save(self.path(name), hashes)
+        return name
+    
+    def promote(self, name: str) -> str:
+        """Rename a pending run of a build to a committed one"""
+        committed = f"run-{name.split('-', 1)[1]}"
+        os.replace(self.path(name), self.path(committed))
+        return committed
+    
+    def _merge_pair(self, first: np.ndarray, second: np.ndarray, name: str) -> np.ndarray:
+        """Merge two disjoint sorted runs, block_size hashes of each at a time"""
+        merged = open_memmap(self.path(name), mode='w+', dtype=np.uint64, shape=(len(first) + len(second),))
+        i = j = written = 0
+        while i < len(first) or j < len(second):
+            # Upper bound of the block: the last hash of the shorter full block ahead
+            bounds = [run[start + self.block_size - 1] for run, start in ((first, i), (second, j))
+                      if start + self.block_size < len(run)]
+            bound = min(bounds) if bounds else None
+            i_end = len(first) if bound is None else i + int(np.searchsorted(first[i:], bound, side='right'))
+            j_end = len(second) if bound is None else j + int(np.searchsorted(second[j:], bound, side='right'))
+            block = np.sort(np.concatenate([first[i:i_end], second[j:j_end]]))
+            merged[written:written + len(block)] = block
+            written += len(block)
+            i, j = i_end, j_end
+        merged.flush()
+        return np.load(self.path(name), mmap_mode='r')
+    
+    def compact(self, names: List[str]) -> List[str]:
+        """Merge the runs into one, smallest first, once there are more than max_runs"""
+        if len(names) <= self.max_runs:
+            return names
+        runs = sorted(((np.load(self.path(name), mmap_mode='r'), name) for name in names), key=lambda item: len(item[0]))
+        merged, merged_name = runs[0]
+        for run, name in runs[1:]:
+            previous = merged_name if merged_name not in names else None
+            merged_name = f"run-{uuid.uuid4().hex[:12]}.npy"
+            merged = self._merge_pair(merged, run, merged_name)
+            if previous:
+                os.remove(self.path(previous))
+        logger.info(f"Compacted {len(names)} seen-key runs into one of {len(merged)} hashes")
+        return [merged_name]
+    
+    def _build_bloom(self, capacity: int, runs: List[str], source: Optional[str] = None) -> Tuple[str, int]:
+        """Write a Bloom filter sized for capacity hashes, copied from source when given, with the runs added"""
+        hash_count = min(10, max(1, int(round(self.bits_per_key * np.log(2)))))
+        words = -(-capacity * self.bits_per_key // 64)
+        name = f"bloom-{uuid.uuid4().hex[:12]}.npy"
+        bloom = open_memmap(self.path(name), mode='w+', dtype=np.uint64, shape=(words,))
+        bloom[:] = np.load(self.path(source), mmap_mode='r') if source is not None else 0
+        for run_name in runs:
+            run = np.load(self.path(run_name), mmap_mode='r')
+            for start in range(0, len(run), self.block_size):
+                self._bloom_add(bloom, np.asarray(run[start:start + self.block_size]), hash_count)
+        bloom.flush()
+        del bloom
+        return name, hash_count
+    
+    def commit(self, added: List[str], added_count: int, replace: bool):
+        """Make the added runs part of the set (the whole set when replacing) and update the filter"""
+        os.makedirs(self.dir, exist_ok=True)
+        previous = self.state
+        names = list(added) if replace else previous['runs'] + list(added)
+        count = added_count if replace else previous['count'] + added_count
+        
+        if not names:
+            state = {'runs': [], 'bloom': None, 'capacity': 0, 'hashes': 0, 'count': 0}
+        elif replace or previous['bloom'] is None or count > previous['capacity']:
+            capacity = max(self.initial_capacity, previous['capacity'] if not replace else 0)
+            while capacity < count:
+                capacity *= 2
+            names = self.compact(names)
+            bloom, hash_count = self._build_bloom(capacity, names)
+            state = {'runs': names, 'bloom': bloom, 'capacity': capacity, 'hashes': hash_count, 'count': count}
+        else:
+            bloom, hash_count = self._build_bloom(previous['capacity'], added, previous['bloom'])
+            names = self.compact(names)
+            state = {'runs': names, 'bloom': bloom, 'capacity': previous['capacity'], 'hashes': hash_count,
+                     'count': count}
+        
+        temp_path = self.path(f"{STATE_FILE}.tmp")
+        with open(temp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(temp_path, self.path(STATE_FILE))
+        
+        # Files of the previous state (and runs merged away) are no longer referenced
+        live = set(state['runs']) | {state['bloom']}
+        for name in set(previous['runs']) | set(added) | {previous['bloom']}:
+            if name and name not in live and os.path.exists(self.path(name)):
+                os.remove(self.path(name))
+        self.state = state
+        self._runs = [np.load(self.path(name), mmap_mode='r') for name in state['runs']]
+        self._bloom = np.load(self.path(state['bloom']), mmap_mode='r') if state['bloom'] else None
+
+
+class RecordDeduplicator:
+    """
+    Drops source records that were already loaded before they reach key resolution
+    A record is identified by a 64-bit hash of its source's natural key, or of its whole
+    content when the source has no natural key column (or the key is null). Hashes seen
+    in this build are buffered and spilled to sorted pending runs, and duplicates within
+    the build are dropped as well.
+    
+    An appending build (daemon batches) is checked against the persisted set and adds its
+    hashes on commit; a replacing build (full loads) ignores history and replaces the set.
+    A rebuild of some sources re-delivers their records on purpose: it ignores history too,
+    and only adds the hashes not in the set yet. Nothing is persisted until commit(), so a
+    failed load can be retried
+    """
+    
+    # Natural key columns of each fact source
+    NATURAL_KEYS = {
+        'TrafficFlow': ['FlowID'],
+        'Accidents': ['AccidentID'],
+        'CongestionLevels': ['CongestionID'],
+        'SpeedViolations': ['ViolationID'],
+        'RoadClosures': ['ClosureID']
+    }
+    
+    def __init__(self, config: Dict[str, Any], replace: bool = False, rebuild: bool = False):
+        dedup_config = config.get('dedup', {})
+        self.enabled = dedup_config.get('enabled', True)
+        self.replace = replace
+        self.rebuild = rebuild and not replace
+        self.spill_keys = max(1, dedup_config.get('spill_keys', 1000000))
+        self.max_runs = max(1, dedup_config.get('max_runs', 8))
+        self.store = SeenKeyStore(config) if self.enabled else None
+        self._buffer = np.empty(0, dtype=np.uint64)
+        self._pending: List[Tuple[str, np.ndarray]] = []
+        self._pending_count = 0
+        self.dropped: Dict[str, int] = {}
+    
+    @staticmethod
+    def _hashable(df: pd.DataFrame) -> pd.DataFrame:
+        """Columns in a form that hashes alike whichever extractor read them"""
+        columns = {}
+        for column in sorted(df.columns, key=str):
+            values = df[column]
+            if pd.api.types.is_datetime64_any_dtype(values):
+                columns[column] = values.to_numpy('datetime64[ns]').view(np.int64)
+            elif pd.api.types.is_bool_dtype(values) or pd.api.types.is_numeric_dtype(values):
+                # Integer columns read as floats when a chunk has nulls
+                columns[column] = values.to_numpy(np.float64, na_value=np.nan)
+            else:
+                columns[column] = values.astype(object).where(values.notna(), '').astype(str).to_numpy()
+        return pd.DataFrame(columns, index=df.index)
+    
+    def hashes(self, source_name: str, df: pd.DataFrame) -> np.ndarray:
+        """Hash of every row of a source chunk"""
+        key_columns = self.NATURAL_KEYS.get(source_name, [])
+        keyed = np.zeros(len(df), dtype=bool)
+        hashes = np.empty(len(df), dtype=np.uint64)
+        if key_columns and all(column in df.columns for column in key_columns):
+            keyed = df[key_columns].notna().all(axis=1).to_numpy()
+            keys = self._hashable(df.loc[keyed, key_columns])
+            hashes[keyed] = pd.util.hash_pandas_object(keys, index=False).to_numpy() ^ _salt(source_name)
+        if not keyed.all():
+            content = self._hashable(df.loc[~keyed])
+            hashes[~keyed] = pd.util.hash_pandas_object(content, index=False).to_numpy() ^ \
+                _salt(f"{source_name}/content")
+        return hashes
+    
+    def _seen(self, hashes: np.ndarray) -> np.ndarray:
+        seen = SeenKeyStore.contains_sorted(self._buffer, hashes)
+        for _, run in self._pending:
+            seen |= SeenKeyStore.contains_sorted(run, hashes)
+        if not self.replace and not self.rebuild:
+            seen |= self.store.contains(hashes)
+        return seen
+    
+    def _add(self, hashes: np.ndarray):
+        """Buffer new hashes, spilling them to a pending run once the buffer is full"""
+        self._buffer = np.sort(np.concatenate([self._buffer, hashes]))
+        self._pending_count += len(hashes)
+        if len(self._buffer) >= self.spill_keys:
+            self._spill()
+    
+    def _spill(self):
+        if len(self._buffer) == 0:
+            return
+        name = self.store.write_run(self._buffer, 'pending')
+        self._pending.append((name, np.load(self.store.path(name), mmap_mode='r')))
+        self._buffer = np.empty(0, dtype=np.uint64)
+        if len(self._pending) > self.max_runs:
+            names = [name for name, _ in self._pending]
+            merged = self.store.compact(names)[0]
+            for name in names:
+                os.remove(self.store.path(name))
+            self._pending = [(merged, np.load(self.store.path(merged), mmap_mode='r'))]
+    
+    def filter(self, source_name: str, df: pd.DataFrame) -> pd.DataFrame:
+        """Rows of a source chunk not loaded before, and not repeated earlier in the chunk"""
+        if not self.enabled or df.empty:
+            return df
+        with get_recorder().stage('dedup', source_name, rows_in=len(df)) as metrics:
+            # Sorted distinct hashes make the binary searches below sequential
+            hashes, first_rows = np.unique(self.hashes(source_name, df), return_index=True)
+            new = ~self._seen(hashes)
+            keep = np.zeros(len(df), dtype=bool)
+            keep[first_rows[new]] = True
+            self._add(hashes[new])
+            kept = int(new.sum())
+            metrics.rows_out = kept
+        
+        if kept == len(df):
+            return df
+        self.dropped[source_name] = self.dropped.get(source_name, 0) + len(df) - kept
+        return df[keep]
+    
+    def filter_stream(self, chunks: Iterable[Tuple[str, pd.DataFrame]]) -> Iterator[Tuple[str, pd.DataFrame]]:
+        """Filter a stream of (source name, chunk) pairs, leaving out chunks that were entirely duplicates"""
+        for source_name, chunk in chunks:
+            filtered = self.filter(source_name, chunk)
+            if not filtered.empty or chunk.empty:
+                yield source_name, filtered
+    
+    def _drop_stored(self):
+        """Remove the hashes already in the set from the pending runs"""
+        pending = []
+        self._pending_count = 0
+        for name, run in self._pending:
+            run = np.asarray(run)
+            new = run[~self.store.contains(run)]
+            os.remove(self.store.path(name))
+            if len(new):
+                name = self.store.write_run(new, 'pending')
+                pending.append((name, new))
+                self._pending_count += len(new)
+        self._pending = pending
+    
+    def commit(self):
+        """Persist the hashes of this build once its facts are loaded"""
+        if not self.enabled:
+            return
+        self._spill()
+        if self.rebuild:
+            self._drop_stored()
+        added = [self.store.promote(name) for name, _ in self._pending]
+        self._pending = []
+        self.store.commit(added, self._pending_count, self.replace)
+        
+        for source_name, count in self.dropped.items():
+            logger.info(f"Dropped {count} duplicate {source_name} records")
+        logger.info(f"{'Replaced' if self.replace else 'Updated'} seen record keys: "
+                    f"{self._pending_count} added, {self.store.count} in total")
+        self._pending_count = 0
+    
+    def discard(self):
+        """Forget the hashes of a build that failed to load"""
+        if not self.enabled:
+            return
+        for name, _ in self._pending:
+            path = self.store.path(name)
+            if os.path.exists(path):
+                os.remove(path)
+        self._pending = []
+        self._buffer = np.empty(0, dtype=np.uint64)
+        self._pending_count = 0
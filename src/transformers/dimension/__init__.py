@@ -4,8 +4,26 @@ from .time_transformer import TimeDimensionTransformer
 from .vehicle_transformer import VehicleDimensionTransformer
 from .event_type_transformer import EventTypeDimensionTransformer
 from .environmental_transformer import EnvironmentalDimensionTransformer
+from .merge import merge_dimension, NATURAL_KEYS as DIMENSION_NATURAL_KEYS
+
+# Dimension transformers keyed by table name, in foreign-key load order
+DIMENSION_TRANSFORMERS = {
+    'DimLocation': LocationDimensionTransformer,
+    'DimDate': DateDimensionTransformer,
+    'DimTime': TimeDimensionTransformer,
+    'DimVehicle': VehicleDimensionTransformer,
+    'DimEventType': EventTypeDimensionTransformer,
+    'DimEnvironmental': EnvironmentalDimensionTransformer
+}
+
+# Dimensions generated without reading source data
+STATIC_DIMENSIONS = ['DimDate', 'DimTime', 'DimEventType']
 
 __all__ = [
+    'DIMENSION_TRANSFORMERS',
+    'STATIC_DIMENSIONS',
+    'DIMENSION_NATURAL_KEYS',
+    'merge_dimension',
     'LocationDimensionTransformer',
     'DateDimensionTransformer',
     'TimeDimensionTransformer',
@@ -9,6 +9,10 @@ logger = logging.getLogger(__name__)
 class DateDimensionTransformer(BaseTransformer):
     """Transformer for Date dimension"""
     
+    def cache_key(self) -> Dict[str, Any]:
+        """The covered range moves with the current year"""
+        return dict(super().cache_key(), year=datetime.now().year)
+    
     def transform(self, data: Optional[Dict[str, pd.DataFrame]] = None) -> pd.DataFrame:
         """
         Create Date dimension covering 5 years (3 past, current, 1 future)
@@ -61,4 +65,4 @@ class DateDimensionTransformer(BaseTransformer):
         date_df = pd.DataFrame(dates)
         
         logger.info(f"Created Date dimension with {len(date_df)} records")
-        return date_df 
\ No newline at end of file
+        return self.dtypes.apply('DimDate', date_df) 
\ No newline at end of file
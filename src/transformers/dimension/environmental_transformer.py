@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from typing import Dict, Any
 import logging
@@ -13,51 +14,38 @@ class EnvironmentalDimensionTransformer(BaseTransformer):
         Create Environmental dimension from WeatherData only
         Road condition data has been removed from this dimension
         """
-        env_records = []
-        
         # Primary key of unknown should be 0
-        env_records.append({
-            'date': None,
-            'temperature_c': None,
-            'humidity': None,
-            'weather_condition': "Unknown"
-        })
+        dates, temperatures, humidities, conditions = [None], [None], [None], ["Unknown"]
         
         # Process Weather Data
         if 'WeatherData' in data:
-            weather_df = data['WeatherData'].copy()
+            weather_df = data['WeatherData']
             
-            # Group by date to reduce cardinality
-            weather_df['date'] = pd.to_datetime(weather_df['Timestamp']).dt.date
+            # Group by date to reduce cardinality, without adding a column to the source table
+            weather_dates = pd.to_datetime(weather_df['Timestamp']).dt.date.rename('date')
             
             # Group and get typical conditions for each day
-            daily_weather = weather_df.groupby('date').agg({
+            daily_weather = weather_df[['Temperature_C', 'Condition', 'Humidity_Percent']].groupby(weather_dates).agg({
                 'Temperature_C': 'mean',
-                'Condition': lambda x: x.value_counts().index[0],  # most common condition
+                'Condition': lambda x: x.astype(object).value_counts().index[0],  # most common condition
                 'Humidity_Percent': 'mean'
-            }).reset_index()
+            })
             
-            for _, row in daily_weather.iterrows():
-                # Create record with weather data
-                env_records.append({
-                    'date': row['date'],
-                    'temperature_c': row['Temperature_C'],
-                    'weather_condition': row['Condition'],
-                    'humidity': row['Humidity_Percent']
-                })
+            dates += list(daily_weather.index)
+            temperatures += daily_weather['Temperature_C'].tolist()
+            humidities += daily_weather['Humidity_Percent'].tolist()
+            conditions += daily_weather['Condition'].tolist()
         
-        # Create dataframe from all records
-        env_df = pd.DataFrame(env_records)
-        
-        # Ensure the unknown record is not overwritten
-        if not env_df.empty:
-            env_df.reset_index(inplace=True)
-            env_df.rename(columns={'index': 'environmental_key'}, inplace=True)
-            env_df['environmental_key'] += 1  # Start keys at 1, but keep the first record as 0
-            env_df.loc[0, 'environmental_key'] = 0  # Ensure the unknown record retains its key
-        else:
-            # Create empty dataframe with correct columns if no data
-            env_df = pd.DataFrame(columns=['environmental_key', 'date', 'temperature_c', 'weather_condition'])
+        # Keys start at 1 for the daily records (the first one is 2), the unknown record keeps 0
+        keys = np.arange(1, len(dates) + 1)
+        keys[0] = 0
+        env_df = pd.DataFrame({
+            'environmental_key': keys,
+            'date': dates,
+            'temperature_c': temperatures,
+            'humidity': humidities,
+            'weather_condition': conditions
+        })
         
         logger.info(f"Created Environmental dimension with {len(env_df)} records")
-        return env_df 
\ No newline at end of file
+        return self.dtypes.apply('DimEnvironmental', env_df) 
\ No newline at end of file
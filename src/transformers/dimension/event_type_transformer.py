@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from typing import Dict, Any, Optional
 import logging
@@ -79,10 +80,7 @@ class EventTypeDimensionTransformer(BaseTransformer):
         # Create dataframe
         event_type_df = pd.DataFrame(event_types)
         
-        # Add surrogate key
-        event_type_df.reset_index(inplace=True)
-        event_type_df.rename(columns={'index': 'event_type_key'}, inplace=True)
-        event_type_df['event_type_key'] = event_type_df.index  # Set key for UNKNOWN to 0
-        event_type_df.loc[0, 'event_type_key'] = 0  # Ensure the unknown record retains its key
+        # Add surrogate key, 0 for the first record
+        event_type_df.insert(0, 'event_type_key', np.arange(len(event_type_df)))
         logger.info(f"Created EventType dimension with {len(event_type_df)} records")
-        return event_type_df 
\ No newline at end of file
+        return self.dtypes.apply('DimEventType', event_type_df) 
\ No newline at end of file
@@ -2,6 +2,7 @@ import pandas as pd
 from typing import Dict, Any
 import logging
 from ..base_transformer import BaseTransformer
+from ..location_normalizer import LocationNormalizer
 
 logger = logging.getLogger(__name__)
 
@@ -12,30 +13,30 @@ class LocationDimensionTransformer(BaseTransformer):
         """
         Create Location dimension from all source tables with location data
         Note: EDA showed zero overlap between locations across source tables
+        Spelling and whitespace variants are merged by the LocationNormalizer
         """
-        # Tables with Location attribute
-        location_tables = ['TrafficFlow', 'Accidents', 'CongestionLevels', 
-                          'SpeedViolations', 'RoadClosures']
+        normalizer = LocationNormalizer(self.config)
         
-        # Collect all locations with their source
-        locations = []
-        
-        # First collect all locations from source tables
-        for table_name in location_tables:
+        # Collect the distinct canonical locations of each source table
+        location_frames = []
+        for table_name in normalizer.LOCATION_TABLES:
             if table_name in data:
                 df = data[table_name]
                 if 'Location' in df.columns:
-                    # Extract unique locations from this table
-                    unique_locs = df['Location'].unique()
-                    for loc in unique_locs:
-                        if pd.notna(loc) and loc != 'Unknown':  # Skip nulls and 'Unknown'
-                            locations.append({
-                                'location_name': loc,
-                                'location_source': table_name
-                            })
+                    locations = normalizer.normalize(df['Location'])
+                    
+                    # Distinct codes in order of first appearance (-1 marks nulls)
+                    codes = pd.unique(locations.cat.codes.to_numpy())
+                    names = locations.cat.categories.take(codes[codes >= 0])
+                    names = names[names != normalizer.UNKNOWN_LOCATION]  # Skip 'Unknown'
+                    
+                    location_frames.append(pd.DataFrame({
+                        'location_name': names,
+                        'location_source': table_name
+                    }))
         
         # Create dataframe
-        location_df = pd.DataFrame(locations)
+        location_df = pd.concat(location_frames, ignore_index=True) if location_frames else pd.DataFrame()
         
         # Add surrogate key - start from 1 for all regular locations
         if not location_df.empty:
@@ -56,4 +57,4 @@ class LocationDimensionTransformer(BaseTransformer):
         location_df = pd.concat([unknown_record, location_df], ignore_index=True)
         
         logger.info(f"Created Location dimension with {len(location_df)} records")
-        return location_df 
\ No newline at end of file
+        return self.dtypes.apply('DimLocation', location_df) 
\ No newline at end of file
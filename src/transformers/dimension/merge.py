@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Surrogate key and natural key of each data-driven dimension
+NATURAL_KEYS = {
+    'DimLocation': ('location_key', ['location_name', 'location_source']),
+    'DimVehicle': ('vehicle_key', ['vehicle_id']),
+    'DimEnvironmental': ('environmental_key', ['date'])
+}
+
+
+def merge_dimension(dim_name: str, current: Optional[pd.DataFrame], rebuilt: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reconcile a rebuilt dimension with the one already loaded
+    Known natural keys keep their surrogate keys (attributes are refreshed) and new
+    members are numbered after the current maximum. A dimension read back from the
+    warehouse may hold its natural keys as text (the unknown member shares the column),
+    so they are compared as the rebuilt members are typed (the unknown member left out)
+    """
+    if current is None or current.empty:
+        return rebuilt
+    
+    key_column, natural_key = NATURAL_KEYS[dim_name]
+    current_rows = current[current[key_column] != 0]
+    rebuilt_rows = rebuilt[rebuilt[key_column] != 0]
+    for column in natural_key:
+        dtype = rebuilt_rows[column].infer_objects().dtype
+        if current_rows[column].dtype != dtype:
+            try:
+                current_rows = current_rows.assign(**{column: current_rows[column].astype(dtype)})
+            except (ValueError, TypeError):
+                pass
+    current_index = pd.MultiIndex.from_frame(current_rows[natural_key])
+    rebuilt_index = pd.MultiIndex.from_frame(rebuilt_rows[natural_key])
+    
+    positions = current_index.get_indexer(rebuilt_index)
+    known = positions >= 0
+    keys = np.where(known, current_rows[key_column].to_numpy()[positions], 0)
+    next_key = int(current[key_column].max()) + 1
+    keys[~known] = np.arange(next_key, next_key + (~known).sum())
+    
+    # Members missing from the rebuilt dimension keep their rows so old facts still resolve
+    retained = current_rows[~current_index.isin(rebuilt_index)]
+    merged = pd.concat([
+        rebuilt[rebuilt[key_column] == 0],
+        retained,
+        rebuilt_rows.assign(**{key_column: keys})
+    ], ignore_index=True)
+    
+    new_members = int((~known).sum())
+    if new_members:
+        logger.info(f"Added {new_members} new members to {dim_name}")
+    return merged.sort_values(key_column, ignore_index=True)[rebuilt.columns]
@@ -53,4 +53,4 @@ class TimeDimensionTransformer(BaseTransformer):
         time_df = pd.DataFrame(times)
         
         logger.info(f"Created Time dimension with {len(time_df)} records")
-        return time_df 
\ No newline at end of file
+        return self.dtypes.apply('DimTime', time_df) 
\ No newline at end of file
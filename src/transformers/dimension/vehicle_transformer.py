@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from typing import Dict, Any
 import logging
@@ -14,8 +15,7 @@ class VehicleDimensionTransformer(BaseTransformer):
             logger.error("Vehicles table not found in source data")
             return pd.DataFrame(columns=['vehicle_key', 'vehicle_id', 'vehicle_type', 'vehicle_category'])
         
-        # Extract vehicle data
-        vehicles_df = data['Vehicles'].copy()
+        vehicles = data['Vehicles']
         
         # Create vehicle category based on vehicle type
         vehicle_categories = {
@@ -29,24 +29,15 @@ class VehicleDimensionTransformer(BaseTransformer):
             'Emergency': 'Service'
         }
         
-        # Apply categorization (with default for unknown types)
-        vehicles_df['vehicle_category'] = vehicles_df['VehicleType'].apply(
-            lambda x: vehicle_categories.get(x, 'Other')
-        )
-        
-        # Rename columns to match dimension schema
-        vehicles_df.rename(columns={
-            'VehicleID': 'vehicle_id',
-            'VehicleType': 'vehicle_type'
-        }, inplace=True)
-        
-        # Add surrogate key
-        vehicles_df.reset_index(inplace=True)
-        vehicles_df.rename(columns={'index': 'vehicle_key'}, inplace=True)
-        vehicles_df['vehicle_key'] += 1  # Start keys at 1
-        
-        # Select only needed columns
-        result_df = vehicles_df[['vehicle_key', 'vehicle_id', 'vehicle_type', 'vehicle_category']]
+        # Build the dimension columns from the source columns, without copying the source table
+        # Surrogate keys follow the source rows, starting at 1
+        result_df = pd.DataFrame({
+            'vehicle_key': np.asarray(vehicles.index) + 1,
+            'vehicle_id': vehicles['VehicleID'].to_numpy(),
+            'vehicle_type': vehicles['VehicleType'].to_numpy(),
+            # Unknown types get a default category
+            'vehicle_category': vehicles['VehicleType'].astype(object).map(vehicle_categories).fillna('Other').to_numpy()
+        })
         
         # Add unknown vehicle with key 0
         unknown_vehicle = {
@@ -57,4 +48,4 @@ class VehicleDimensionTransformer(BaseTransformer):
         }
         result_df = pd.concat([pd.DataFrame([unknown_vehicle]), result_df], ignore_index=True)
         logger.info(f"Created Vehicle dimension with {len(result_df)} records")
-        return result_df 
\ No newline at end of file
+        return self.dtypes.apply('DimVehicle', result_df) 
\ No newline at end of file
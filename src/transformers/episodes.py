@@ -0,0 +1,253 @@
+import os
+import shutil
+import tempfile
+import logging
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Iterable, Optional, Tuple
+
+from .location_normalizer import LocationNormalizer
+from .shared_lookup import encode_values
+from monitoring import get_recorder
+
+logger = logging.getLogger(__name__)
+
+NS_PER_MINUTE = 60 * 10**9
+
+# Spill file records: readings partitioned by location, then durations partitioned by row ID
+READING_DTYPE = np.dtype([('location', np.int64), ('start', np.int64), ('end', np.int64), ('id', np.int64)])
+DURATION_DTYPE = np.dtype([('id', np.int64), ('minutes', np.int64)])
+
+# Duration stored for readings that continue an episode (their fact rows get NULL)
+CONTINUATION = -1
+
+
+class EpisodeDurations:
+    """
+    Durations of detected episodes, looked up by source row ID
+    Only file paths are held, so the handle is cheap to pickle into fact worker processes;
+    each ID partition is a pair of sorted .npy files opened memory-mapped on lookup
+    """
+    
+    def __init__(self, reading_minutes: Dict[str, int], id_columns: Dict[str, str],
+                 directory: Optional[str] = None, partitions: Optional[Dict[str, List[int]]] = None,
+                 partition_count: int = 1):
+        self.reading_minutes = reading_minutes
+        self.id_columns = id_columns
+        self.directory = directory
+        self.partitions = partitions or {}
+        self.partition_count = partition_count
+    
+    def _path(self, source_name: str, partition: int, field: str) -> str:
+        return os.path.join(self.directory, f"{source_name}-{partition:03d}-{field}.npy")
+    
+    def lookup(self, source_name: str, df: pd.DataFrame) -> pd.Series:
+        """
+        Episode duration in minutes for every row of a source chunk
+        The first reading of an episode carries its duration and later readings are null;
+        rows outside any detected episode count as a single reading
+        """
+        minutes = np.full(len(df), float(self.reading_minutes[source_name]))
+        id_column = self.id_columns[source_name]
+        partitions = self.partitions.get(source_name)
+        if not partitions or id_column not in df.columns:
+            return pd.Series(minutes, index=df.index)
+        
+        ids = pd.to_numeric(df[id_column], errors='coerce')
+        rows = np.flatnonzero(ids.notna().to_numpy())
+        row_ids = ids.to_numpy()[rows].astype(np.int64)
+        row_partitions = np.mod(row_ids, self.partition_count)
+        
+        for partition in np.intersect1d(np.unique(row_partitions), partitions):
+            in_partition = np.flatnonzero(row_partitions == partition)
+            sorted_ids = np.load(self._path(source_name, partition, 'id'), mmap_mode='r')
+            sorted_minutes = np.load(self._path(source_name, partition, 'minutes'), mmap_mode='r')
+            
+            wanted = row_ids[in_partition]
+            positions = np.minimum(np.searchsorted(sorted_ids, wanted), len(sorted_ids) - 1)
+            hit = sorted_ids[positions] == wanted
+            found = sorted_minutes[positions[hit]].astype(float)
+            found[found == CONTINUATION] = np.nan
+            minutes[rows[in_partition[hit]]] = found
+        
+        return pd.Series(minutes, index=df.index)
+    
+    def cleanup(self):
+        """Remove the duration files"""
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class EpisodeDetector:
+    """
+    Detects contiguous congestion and closure episodes per location
+    Readings are sorted by location and start time and run-length encoded: a reading
+    opens a new episode when its location changes or it starts more than the gap after
+    every earlier reading of the location has ended. The episode's duration runs from its
+    first start to its last end and is written on its first reading.
+    
+    Sources are spilled to location partitions in a first chunked pass, so only one
+    partition is sorted in memory at a time, then the durations are re-partitioned by
+    row ID for lookup while the fact rows are built
+    """
+    
+    # Row ID, start and optional end column of each source with episodes
+    SOURCES = {
+        'CongestionLevels': ('CongestionID', 'RecordedAt', 'ClearedAt'),
+        'RoadClosures': ('ClosureID', 'ClosedAt', 'ReopenedAt')
+    }
+    
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        episode_config = config.get('episodes', {})
+        self.reading_minutes = {
+            'CongestionLevels': episode_config.get('congestion_reading_minutes', 15),
+            'RoadClosures': episode_config.get('closure_default_minutes', 120)
+        }
+        self.gap_minutes = episode_config.get('gap_minutes', 15)
+        self.partition_count = max(1, episode_config.get('partitions', 16))
+        self.work_dir = episode_config.get('dir') or None
+        self.location_normalizer = LocationNormalizer(config)
+    
+    def columns(self, source_name: str) -> List[str]:
+        """Source columns read by the detection pass"""
+        id_column, start_column, end_column = self.SOURCES[source_name]
+        return [id_column, 'Location', start_column, end_column]
+    
+    def empty(self) -> EpisodeDurations:
+        """Durations when nothing was detected: every reading is its own episode"""
+        return EpisodeDurations(self.reading_minutes, self._id_columns())
+    
+    def _id_columns(self) -> Dict[str, str]:
+        return {source_name: columns[0] for source_name, columns in self.SOURCES.items()}
+    
+    def _readings(self, source_name: str, df: pd.DataFrame) -> np.ndarray:
+        """Location hash, start, end and row ID of the readings of one chunk"""
+        id_column, start_column, end_column = self.SOURCES[source_name]
+        if id_column not in df.columns or start_column not in df.columns:
+            return np.empty(0, dtype=READING_DTYPE)
+        
+        ids = pd.to_numeric(df[id_column], errors='coerce')
+        starts = pd.to_datetime(df[start_column], errors='coerce')
+        valid = (ids.notna() & starts.notna()).to_numpy()
+        
+        if 'Location' in df.columns:
+            locations = self.location_normalizer.normalize(df['Location'])
+        else:
+            locations = pd.Series(pd.Categorical([LocationNormalizer.UNKNOWN_LOCATION] * len(df)), index=df.index)
+        # Hash each distinct canonical name once; null locations share the unknown location
+        categories = list(locations.cat.categories) + [LocationNormalizer.UNKNOWN_LOCATION]
+        location_hashes = encode_values(categories, 'text')[locations.cat.codes.to_numpy()]
+        
+        start_ns = starts.to_numpy('datetime64[ns]').view(np.int64)
+        end_ns = start_ns + self.reading_minutes[source_name] * NS_PER_MINUTE
+        if end_column in df.columns:
+            ends = pd.to_datetime(df[end_column], errors='coerce')
+            explicit = ends.to_numpy('datetime64[ns]').view(np.int64)
+            usable = ends.notna().to_numpy() & (explicit >= start_ns)
+            end_ns = np.where(usable, explicit, end_ns)
+        
+        readings = np.empty(int(valid.sum()), dtype=READING_DTYPE)
+        readings['location'] = location_hashes[valid]
+        readings['start'] = start_ns[valid]
+        readings['end'] = end_ns[valid]
+        readings['id'] = ids.to_numpy()[valid].astype(np.int64)
+        return readings
+    
+    @staticmethod
+    def _append(path: str, records: np.ndarray):
+        with open(path, 'ab') as f:
+            records.tofile(f)
+    
+    def _spill(self, records: np.ndarray, keys: np.ndarray, path_of) -> set:
+        """Append records to the partition files chosen by their keys, returning the partitions written"""
+        partitions = np.mod(keys, self.partition_count)
+        order = np.argsort(partitions, kind='stable')
+        bounds = np.searchsorted(partitions[order], np.arange(self.partition_count + 1))
+        written = set()
+        for partition in range(self.partition_count):
+            if bounds[partition] < bounds[partition + 1]:
+                self._append(path_of(partition), records[order[bounds[partition]:bounds[partition + 1]]])
+                written.add(partition)
+        return written
+    
+    def _episodes(self, readings: np.ndarray) -> Tuple[np.ndarray, int]:
+        """Duration (or CONTINUATION) of every reading of one location partition, in reading order"""
+        order = np.lexsort((readings['start'], readings['location']))
+        locations, starts, ends = (readings[field][order] for field in ('location', 'start', 'end'))
+        
+        new_location = np.ones(len(order), dtype=bool)
+        new_location[1:] = locations[1:] != locations[:-1]
+        
+        # Latest end among the earlier readings of the same location
+        running_end = pd.Series(ends).groupby(np.cumsum(new_location)).cummax().to_numpy()
+        opens = new_location.copy()
+        opens[1:] |= starts[1:] > running_end[:-1] + self.gap_minutes * NS_PER_MINUTE
+        
+        first = np.flatnonzero(opens)
+        episode_minutes = (np.maximum.reduceat(ends, first) - starts[first] + NS_PER_MINUTE // 2) // NS_PER_MINUTE
+        
+        minutes = np.full(len(order), CONTINUATION, dtype=np.int64)
+        minutes[order[first]] = episode_minutes
+        return minutes, len(first)
+    
+    def detect(self, chunks: Iterable[Tuple[str, pd.DataFrame]]) -> EpisodeDurations:
+        """Detect the episodes of a stream of (source name, chunk) pairs"""
+        directory = tempfile.mkdtemp(prefix='episodes_', dir=self.work_dir)
+        
+        def reading_path(source_name, partition):
+            return os.path.join(directory, f"{source_name}-readings-{partition:03d}.bin")
+        
+        def duration_path(source_name, partition):
+            return os.path.join(directory, f"{source_name}-durations-{partition:03d}.bin")
+        
+        try:
+            # Pass 1: spill readings to location partitions, one chunk at a time
+            spilled: Dict[str, set] = {}
+            rows: Dict[str, int] = {}
+            for source_name, chunk in chunks:
+                if source_name not in self.SOURCES:
+                    continue
+                readings = self._readings(source_name, chunk)
+                rows[source_name] = rows.get(source_name, 0) + len(readings)
+                spilled.setdefault(source_name, set()).update(self._spill(
+                    readings, readings['location'], lambda p, s=source_name: reading_path(s, p)
+                ))
+            
+            # Pass 2: run-length encode each location partition and spill durations by row ID
+            partitions: Dict[str, List[int]] = {}
+            for source_name, written in spilled.items():
+                with get_recorder().stage('episodes', source_name, rows_in=rows[source_name]) as metrics:
+                    episodes = 0
+                    by_id = set()
+                    for partition in sorted(written):
+                        path = reading_path(source_name, partition)
+                        readings = np.fromfile(path, dtype=READING_DTYPE)
+                        os.remove(path)
+                        minutes, count = self._episodes(readings)
+                        episodes += count
+                        
+                        durations = np.empty(len(readings), dtype=DURATION_DTYPE)
+                        durations['id'] = readings['id']
+                        durations['minutes'] = minutes
+                        by_id |= self._spill(
+                            durations, durations['id'], lambda p, s=source_name: duration_path(s, p)
+                        )
+                    
+                    # Pass 3: sort each ID partition for binary search
+                    for partition in by_id:
+                        path = duration_path(source_name, partition)
+                        durations = np.fromfile(path, dtype=DURATION_DTYPE)
+                        durations = durations[np.argsort(durations['id'], kind='stable')]
+                        os.remove(path)
+                        np.save(os.path.join(directory, f"{source_name}-{partition:03d}-id.npy"), durations['id'])
+                        np.save(os.path.join(directory, f"{source_name}-{partition:03d}-minutes.npy"),
+                                durations['minutes'])
+                    partitions[source_name] = sorted(by_id)
+                    metrics.rows_out = episodes
+                logger.info(f"Detected {episodes} episodes in {rows[source_name]} {source_name} readings")
+        except Exception:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        
+        return EpisodeDurations(self.reading_minutes, self._id_columns(), directory, partitions, self.partition_count)
@@ -1,88 +1,266 @@
 import pandas as pd
-from typing import Dict, List, Tuple, Callable, TypeVar
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple, Callable, Iterable, Iterator, TypeVar
 import logging
+import structlog
 
 from .base_transformer import BaseTransformer
+from .location_normalizer import LocationNormalizer
+from .shared_lookup import SharedDimensionLookups, LOCATION_SEPARATOR
+from .episodes import EpisodeDetector, EpisodeDurations
+from .quality import DataQualityRules
+from monitoring import get_recorder
 from src.models.records import (
-    FactTrafficEventBase, TrafficFlowEvent, AccidentEvent, 
+    FactTrafficEventBase, TrafficFlowEvent, AccidentEvent,
     CongestionEvent, SpeedViolationEvent, RoadClosureEvent
 )
 
 logger = logging.getLogger(__name__)
+# Per-row events, grouped by event for the rate limit of repeated log events
+event_logger = structlog.get_logger(__name__)
 
 # Define a generic type for the event models
 T = TypeVar('T', bound=FactTrafficEventBase)
 
+# Fact transformer of a worker process, attached to the shared dimension lookups
+_worker_transformer = None
+
+
+def _init_fact_worker(config: Dict[str, Any], descriptor: Dict[str, Dict[str, Any]], location_names: List[str],
+                      episode_durations: EpisodeDurations):
+    """Attach a worker process to the shared lookups exported by the parent"""
+    global _worker_transformer
+    _worker_transformer = FactTableTransformer(config)
+    _worker_transformer.shared_lookups = SharedDimensionLookups.attach(descriptor)
+    _worker_transformer.episode_durations = episode_durations
+    _worker_transformer.location_normalizer.register(location_names)
+
+
+def _transform_chunk_in_worker(source_name: str, df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, list]:
+    """Build the fact rows and rejects of one chunk; event IDs are assigned by the parent in chunk order"""
+    fact_df, _, rejects = _worker_transformer.transform_chunk(source_name, df, {}, 0)
+    return fact_df, rejects, get_recorder().drain()
+
+
 class FactTableTransformer(BaseTransformer):
     """Transformer for Fact_TrafficEvents"""
     
+    VERSION = 3
+    
     # Constants
     DEFAULT_KEY = 0
-    DEFAULT_DURATION = 120  # minutes
     DEFAULT_LOCATION = "Unknown"
     
-    def _get_dimension_key(self, df: pd.DataFrame, column_name: str, value, key_column: str) -> int:
-        """Generic method to get dimension key from any dimension table"""
-        if pd.isna(value):
-            return self.DEFAULT_KEY
-            
-        matching_rows = df[df[column_name] == value]
+    # Source tables feeding the fact table and the column holding each event's timestamp
+    SOURCE_TIMESTAMPS = {
+        'TrafficFlow': 'Timestamp',
+        'Accidents': 'ReportedAt',
+        'CongestionLevels': 'RecordedAt',
+        'SpeedViolations': 'Timestamp',
+        'RoadClosures': 'ClosedAt'
+    }
+    
+    # Event type id of each source's facts; a trailing '_' marks a prefix
+    SOURCE_EVENT_TYPES = {
+        'TrafficFlow': 'FLOW',
+        'Accidents': 'ACC_',
+        'CongestionLevels': 'CONGESTION_',
+        'SpeedViolations': 'SPEED_VIOLATION',
+        'RoadClosures': 'ROAD_CLOSURE'
+    }
+    
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.location_normalizer = LocationNormalizer(config)
+        # Lookup indexes per (value column, key column), valid while the dimension frame is unchanged
+        self._key_indexes: Dict[Tuple[str, str], Tuple[pd.DataFrame, pd.Index, np.ndarray]] = {}
+        # Set in fact worker processes, which resolve keys against shared memory instead of frames
+        self.shared_lookups: Optional[SharedDimensionLookups] = None
+        self.workers = config.get('processing', {}).get('fact_workers', 1)
+        # Durations of congestion and closure episodes; set before streaming chunks of those sources
+        self.episode_durations = EpisodeDetector(config).empty()
+        # Rejected rows and counts of the sources transformed by this transformer
+        self.quality = DataQualityRules(config)
+    
+    def cache_key(self) -> Dict[str, Any]:
+        """Episode settings change the derived durations"""
+        episode_config = {key: value for key, value in self.config.get('episodes', {}).items() if key != 'dir'}
+        return dict(super().cache_key(), episodes=episode_config)
+    
+    def _key_index(self, dim_df: pd.DataFrame, value_column: str, key_column: str,
+                   datetimes: bool = False) -> Tuple[pd.Index, np.ndarray]:
+        """
+        Index of a dimension's natural values and the matching keys
+        Built once per dimension frame, so streamed chunks and micro-batches reuse it
+        """
+        cached = self._key_indexes.get((value_column, key_column))
+        if cached is not None and cached[0] is dim_df:
+            return cached[1], cached[2]
         
-        if not matching_rows.empty:
-            return matching_rows.iloc[0][key_column]
-        return self.DEFAULT_KEY
-    
-    def _get_date_key(self, date_df: pd.DataFrame, date_val) -> int:
-        """Get date key from date dimension"""
-        if pd.isna(date_val):
-            return self.DEFAULT_KEY
-            
-        date_obj = pd.to_datetime(date_val).date()
-        return self._get_dimension_key(date_df, 'date', date_obj, 'date_key')
-    
-    def _get_time_key(self, time_df: pd.DataFrame, time_val) -> int:
-        """Get time key from time dimension"""
-        if pd.isna(time_val):
-            return self.DEFAULT_KEY
-            
-        time_obj = pd.to_datetime(time_val).time()
-        time_key = time_obj.hour * 100 + time_obj.minute
+        dim_values = pd.to_datetime(dim_df[value_column]) if datetimes else dim_df[value_column]
+        lookup = pd.DataFrame({'value': dim_values.to_numpy(), 'key': dim_df[key_column].to_numpy()})
+        lookup = lookup[lookup['value'].notna()].drop_duplicates('value')  # First match wins
         
-        matching_time = time_df[time_df['time_key'] == time_key]
+        index, keys = pd.Index(lookup['value']), lookup['key'].to_numpy()
+        self._key_indexes[(value_column, key_column)] = (dim_df, index, keys)
+        return index, keys
+    
+    def _lookup_keys(self, dim_df: pd.DataFrame, value_column: str, key_column: str, values,
+                     datetimes: bool = False) -> np.ndarray:
+        """
+        Generic vectorized lookup of dimension keys
+        Values missing from the dimension (or null) resolve to the default key
+        """
+        index, keys = self._key_index(dim_df, value_column, key_column, datetimes)
+        positions = index.get_indexer(values)
+        return np.where(positions >= 0, keys[positions], self.DEFAULT_KEY).astype(np.int64)
+    
+    def _resolve_date_keys(self, date_df: pd.DataFrame, timestamps: pd.Series) -> np.ndarray:
+        """Get date keys from date dimension"""
+        return self._lookup_keys(date_df, 'date', 'date_key', timestamps.dt.normalize(), datetimes=True)
+    
+    def _resolve_time_keys(self, time_df: pd.DataFrame, timestamps: pd.Series) -> np.ndarray:
+        """Get time keys from time dimension"""
+        time_keys = timestamps.dt.hour * 100 + timestamps.dt.minute
+        return self._lookup_keys(time_df, 'time_key', 'time_key', time_keys)
+    
+    def _source_locations(self, df: pd.DataFrame) -> pd.Series:
+        """Location values of a source, falling back to LocationID or the default location"""
+        if 'Location' in df.columns:
+            return df['Location']
+        if 'LocationID' in df.columns:
+            return df['LocationID']
+        return pd.Series(self.DEFAULT_LOCATION, index=df.index)
+    
+    def _resolve_location_keys(self, location_df: pd.DataFrame, locations: pd.Series, source: str) -> np.ndarray:
+        """
+        Resolve location keys for a whole column at once
+        Locations are canonicalized to a Categorical and each category is looked up
+        once, so resolving a row is an integer-code index into the lookup array
+        """
+        locations = self.location_normalizer.normalize(locations)
+        categories = locations.cat.categories
         
-        if not matching_time.empty:
-            return matching_time.iloc[0]['time_key']
-        return self.DEFAULT_KEY
-    
-    def _get_location_key(self, location_df: pd.DataFrame, location_name: str, source: str) -> int:
-        """Get location key from location dimension"""
-        if pd.isna(location_name):
-            return self.DEFAULT_KEY
-            
-        matching_loc = location_df[
-            (location_df['location_name'] == location_name) & 
-            (location_df['location_source'] == source)
-        ]
+        # One slot per category plus a trailing default slot for null codes (-1)
+        lookup = np.full(len(categories) + 1, self.DEFAULT_KEY, dtype=np.int64)
+        
+        source_locations = location_df[location_df['location_source'] == source]
+        positions = categories.get_indexer(source_locations['location_name'])
+        found = positions >= 0
+        lookup[positions[found]] = source_locations['location_key'].to_numpy()[found]
+        
+        return lookup[locations.cat.codes.to_numpy()]
+    
+    def _resolve_vehicle_keys(self, vehicle_df: pd.DataFrame, df: pd.DataFrame) -> np.ndarray:
+        """Get vehicle keys from vehicle dimension (only speed violations carry a vehicle)"""
+        if vehicle_df is None or 'VehicleID' not in df.columns:
+            return np.full(len(df), self.DEFAULT_KEY, dtype=np.int64)
+        return self._lookup_keys(vehicle_df, 'vehicle_id', 'vehicle_key', df['VehicleID'])
+    
+    def _event_type_ids(self, source_name: str, df: pd.DataFrame) -> pd.Series:
+        """Natural event type id of every row of a source"""
+        if source_name == 'Accidents':
+            if 'Severity' not in df.columns:
+                return pd.Series('ACC_MODERATE', index=df.index)
+            return 'ACC_' + df['Severity'].astype(str).str.upper().where(df['Severity'].notna())
+        if source_name == 'CongestionLevels':
+            return 'CONGESTION_' + df['Level'].astype(str).str.upper().where(df['Level'].notna())
+        
+        event_type_id = {
+            'TrafficFlow': 'FLOW',
+            'SpeedViolations': 'SPEED_VIOLATION',
+            'RoadClosures': 'ROAD_CLOSURE'
+        }[source_name]
+        return pd.Series(event_type_id, index=df.index)
+    
+    def _resolve_event_type_keys(self, event_type_df: pd.DataFrame, source_name: str, df: pd.DataFrame) -> np.ndarray:
+        """Get event type keys from event type dimension"""
+        return self._lookup_keys(
+            event_type_df, 'event_type_id', 'event_type_key', self._event_type_ids(source_name, df)
+        )
+    
+    @classmethod
+    def source_slice(cls, dimensions: Dict[str, pd.DataFrame], sources: List[str]) -> Dict[str, Any]:
+        """
+        Keys identifying the fact rows built from a subset of the sources
+        A row belongs to a source through its event type key. Rows with the default key (an
+        unresolved event type, which FLOW shares) belong to the location_source of their location,
+        and default rows at a location of no source to the source whose event type has the default key
+        """
+        event_type_df, location_df = dimensions['DimEventType'], dimensions['DimLocation']
+        event_type_ids = event_type_df['event_type_id'].astype(str)
+        event_type_keys = set()
+        owns_default = False
+        for source_name, event_type_id in cls.SOURCE_EVENT_TYPES.items():
+            if source_name not in sources:
+                continue
+            matches = event_type_ids.str.startswith(event_type_id) if event_type_id.endswith('_') else \
+                event_type_ids == event_type_id
+            keys = {int(key) for key in event_type_df.loc[matches, 'event_type_key']}
+            owns_default |= cls.DEFAULT_KEY in keys
+            event_type_keys |= keys - {cls.DEFAULT_KEY}
         
-        if not matching_loc.empty:
-            return matching_loc.iloc[0]['location_key']
-        return self.DEFAULT_KEY
-    
-    def _get_vehicle_key(self, vehicle_df: pd.DataFrame, vehicle_id: int) -> int:
-        """Get vehicle key from vehicle dimension"""
-        return self._get_dimension_key(vehicle_df, 'vehicle_id', vehicle_id, 'vehicle_key')
-    
-    def _get_event_type_key(self, event_type_df: pd.DataFrame, event_type: str) -> int:
-        """Get event type key from event type dimension"""
-        return self._get_dimension_key(event_type_df, 'event_type_id', event_type, 'event_type_key')
-    
-    def _get_environmental_key(self, env_df: pd.DataFrame, date_val) -> int:
-        """Get environmental key from environmental dimension"""
-        if pd.isna(date_val):
-            return self.DEFAULT_KEY
-            
-        date_obj = pd.to_datetime(date_val).date()
-        return self._get_dimension_key(env_df, 'date', date_obj, 'environmental_key')
+        location_sources = location_df['location_source']
+        located = location_sources.isin(sources)
+        if owns_default:
+            located |= ~location_sources.isin(list(cls.SOURCE_TIMESTAMPS))
+        return {
+            'sources': list(sources),
+            'event_type_keys': sorted(event_type_keys),
+            'default_key': cls.DEFAULT_KEY,
+            'location_keys': sorted(int(key) for key in location_df.loc[located, 'location_key'])
+        }
+    
+    def _resolve_environmental_keys(self, env_df: pd.DataFrame, timestamps: pd.Series) -> np.ndarray:
+        """Get environmental keys from environmental dimension"""
+        if env_df is None:
+            return np.full(len(timestamps), self.DEFAULT_KEY, dtype=np.int64)
+        return self._lookup_keys(
+            env_df, 'date', 'environmental_key', timestamps.dt.normalize(), datetimes=True
+        )
+    
+    def _resolve_shared_keys(self, source_name: str, df: pd.DataFrame, timestamps: pd.Series) -> pd.DataFrame:
+        """Resolve every dimension key of a source chunk by binary search in the shared lookups"""
+        lookups = self.shared_lookups
+        dates = timestamps.dt.normalize()
+        locations = self.location_normalizer.normalize(self._source_locations(df))
+        locations = locations.cat.rename_categories(
+            lambda name: f"{source_name}{LOCATION_SEPARATOR}{name}"
+        )
+        vehicle_keys = lookups.lookup('vehicle', df['VehicleID']) if 'VehicleID' in df.columns else \
+            np.full(len(df), self.DEFAULT_KEY, dtype=np.int64)
+        
+        return df.assign(
+            date_key=lookups.lookup('date', dates),
+            time_key=lookups.lookup('time', timestamps.dt.hour * 100 + timestamps.dt.minute),
+            location_key=lookups.lookup('location', locations),
+            vehicle_key=vehicle_keys,
+            event_type_key=lookups.lookup('event_type', self._event_type_ids(source_name, df)),
+            environmental_key=lookups.lookup('environmental', dates)
+        )
+    
+    def _resolve_keys(self, source_name: str, df: pd.DataFrame, dimensions: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+        """Resolve every dimension key of a source chunk against the in-memory dimensions"""
+        # A malformed timestamp becomes null, so the not-null rule of its source rejects the row
+        column = self.SOURCE_TIMESTAMPS[source_name]
+        timestamps = pd.to_datetime(df[column], errors='coerce')
+        if not pd.api.types.is_datetime64_any_dtype(df[column]):
+            df = df.assign(**{column: timestamps})
+        if self.shared_lookups is not None:
+            return self._resolve_shared_keys(source_name, df, timestamps)
+        
+        return df.assign(
+            date_key=self._resolve_date_keys(dimensions['DimDate'], timestamps),
+            time_key=self._resolve_time_keys(dimensions['DimTime'], timestamps),
+            location_key=self._resolve_location_keys(
+                dimensions['DimLocation'], self._source_locations(df), source_name
+            ),
+            vehicle_key=self._resolve_vehicle_keys(dimensions.get('DimVehicle'), df),
+            event_type_key=self._resolve_event_type_keys(dimensions['DimEventType'], source_name, df),
+            environmental_key=self._resolve_environmental_keys(dimensions.get('DimEnvironmental'), timestamps)
+        )
     
     # Create a mapping dictionary for severity levels
     _CONGESTION_LEVEL_MAP = {
@@ -107,212 +285,253 @@ class FactTableTransformer(BaseTransformer):
         """Map accident severity string to numeric score"""
         return self._ACCIDENT_SEVERITY_MAP.get(severity)
     
-    def _process_data_source(self, 
+    def _process_data_source(self,
                            source_name: str,
-                           data: Dict[str, pd.DataFrame],
+                           df: pd.DataFrame,
                            dimensions: Dict[str, pd.DataFrame],
                            record_id: int,
-                           record_factory: Callable[[pd.Series, int, Dict[str, pd.DataFrame]], T]) -> Tuple[List[T], int]:
-        """Process a data source and return a list of records and the updated record ID"""
+                           record_factory: Callable[[pd.Series, int], T]) -> Tuple[List[T], int, pd.DataFrame]:
+        """Process a chunk of a data source and return its records, the updated record ID and its rejects"""
         records = []
-        skipped = 0
-        if source_name in data:
-            df = data[source_name].copy()
-            
-            # Pre-process speed violations to handle data quality issues
-            if source_name == 'SpeedViolations':
-                # Count records before filtering
-                original_count = len(df)
-                # Filter out invalid speed violations (recorded speed < speed limit)
-                df = df[df['SpeedRecorded'] > df['SpeedLimit']]
-                filtered_count = original_count - len(df)
-                if filtered_count > 0:
-                    logger.warning(f"Filtered out {filtered_count} invalid speed violations where recorded speed <= speed limit")
-                    skipped = filtered_count
-            
-            for _, row in df.iterrows():
-                try:
-                    record = record_factory(row, record_id, dimensions)
-                    records.append(record)
-                    record_id += 1
-                except Exception as e:
-                    logger.error(f"Error processing {source_name} record: {str(e)}")
-                    skipped += 1
-                    continue
-                    
-        if skipped > 0:
-            logger.info(f"Skipped {skipped} records from {source_name} due to data quality issues or errors")
-            
-        return records, record_id
-       
-    def _create_traffic_flow_record(self, row: pd.Series, record_id: int, 
-                                  dimensions: Dict[str, pd.DataFrame]) -> TrafficFlowEvent:
-        """Create a TrafficFlowEvent from row data"""
-        date_df = dimensions.get('DimDate')
-        time_df = dimensions.get('DimTime')
-        location_df = dimensions.get('DimLocation')
-        event_type_df = dimensions.get('DimEventType')
-        env_df = dimensions.get('DimEnvironmental')
+        source_columns = list(df.columns)
+        
+        # Resolve dimension keys for the whole chunk, then leave out the rows failing a data quality rule
+        df = self._resolve_keys(source_name, df, dimensions)
+        passes, rejects = self.quality.evaluate(source_name, df, source_columns)
+        if not passes.all():
+            df = df[passes]
+        if source_name in EpisodeDetector.SOURCES:
+            df = df.assign(duration_minutes=self.episode_durations.lookup(source_name, df))
         
+        invalid = np.zeros(len(df), dtype=bool)
+        for position, (_, row) in enumerate(df.iterrows()):
+            try:
+                record = record_factory(row, record_id)
+                records.append(record)
+                record_id += 1
+            except Exception as e:
+                event_logger.error(f"Invalid {source_name} record", source=source_name, error=str(e))
+                invalid[position] = True
+                continue
+        
+        if invalid.any():
+            # Rows the record model rejects are kept with the rule rejects
+            model_rejects = self.quality.rejects(source_name, df, {DataQualityRules.MODEL_RULE: invalid}, source_columns)
+            rejects = pd.concat([frame for frame in (rejects, model_rejects) if not frame.empty], ignore_index=True)
+        return records, record_id, rejects
+    
+    @staticmethod
+    def _duration(minutes) -> Optional[int]:
+        """Episode duration of a reading; null when the reading continues an earlier one"""
+        return None if pd.isna(minutes) else int(minutes)
+    
+    def _create_traffic_flow_record(self, row: pd.Series, record_id: int) -> TrafficFlowEvent:
+        """Create a TrafficFlowEvent from row data"""
         return TrafficFlowEvent(
             event_id=record_id,
-            date_key=self._get_date_key(date_df, row['Timestamp']),
-            time_key=self._get_time_key(time_df, row['Timestamp']),
-            location_key=self._get_location_key(location_df, row['Location'], 'TrafficFlow'),
+            date_key=row['date_key'],
+            time_key=row['time_key'],
+            location_key=row['location_key'],
             vehicle_key=self.DEFAULT_KEY,
-            event_type_key=self._get_event_type_key(event_type_df, 'FLOW'),
-            environmental_key=self._get_environmental_key(env_df, row['Timestamp']),
+            event_type_key=row['event_type_key'],
+            environmental_key=row['environmental_key'],
             vehicle_count=row['VehicleCount']
         )
     
-    def _create_accident_record(self, row: pd.Series, record_id: int, 
-                              dimensions: Dict[str, pd.DataFrame]) -> AccidentEvent:
+    def _create_accident_record(self, row: pd.Series, record_id: int) -> AccidentEvent:
         """Create an AccidentEvent from row data"""
-        date_df = dimensions.get('DimDate')
-        time_df = dimensions.get('DimTime')
-        location_df = dimensions.get('DimLocation')
-        event_type_df = dimensions.get('DimEventType')
-        env_df = dimensions.get('DimEnvironmental')
-        
         return AccidentEvent(
             event_id=record_id,
-            date_key=self._get_date_key(date_df, row['ReportedAt']),
-            time_key=self._get_time_key(time_df, row['ReportedAt']),
-            location_key=self._get_location_key(location_df, row['Location'], 'Accidents'),
+            date_key=row['date_key'],
+            time_key=row['time_key'],
+            location_key=row['location_key'],
             vehicle_key=self.DEFAULT_KEY,
-            event_type_key=self._get_event_type_key(
-                event_type_df, f'ACC_{row["Severity"].upper()}' if 'Severity' in row else 'ACC_MODERATE'
-            ),
-            environmental_key=self._get_environmental_key(env_df, row['ReportedAt']),
+            event_type_key=row['event_type_key'],
+            environmental_key=row['environmental_key'],
             vehicles_involved=row['VehiclesInvolved'],
             incident_severity_score=self._map_accident_severity(row['Severity'])
         )
     
-    def _create_congestion_record(self, row: pd.Series, record_id: int, 
-                                dimensions: Dict[str, pd.DataFrame]) -> CongestionEvent:
+    def _create_congestion_record(self, row: pd.Series, record_id: int) -> CongestionEvent:
         """Create a CongestionEvent from row data"""
-        date_df = dimensions.get('DimDate')
-        time_df = dimensions.get('DimTime')
-        location_df = dimensions.get('DimLocation')
-        event_type_df = dimensions.get('DimEventType')
-        env_df = dimensions.get('DimEnvironmental')
-        
         return CongestionEvent(
             event_id=record_id,
-            date_key=self._get_date_key(date_df, row['RecordedAt']),
-            time_key=self._get_time_key(time_df, row['RecordedAt']),
-            location_key=self._get_location_key(location_df, row['Location'], 'CongestionLevels'),
+            date_key=row['date_key'],
+            time_key=row['time_key'],
+            location_key=row['location_key'],
             vehicle_key=self.DEFAULT_KEY,
-            event_type_key=self._get_event_type_key(
-                event_type_df, f'CONGESTION_{row["Level"].upper()}'
-            ),
-            environmental_key=self._get_environmental_key(env_df, row['RecordedAt']),
+            event_type_key=row['event_type_key'],
+            environmental_key=row['environmental_key'],
+            duration_minutes=self._duration(row['duration_minutes']),
             congestion_level_score=self._map_congestion_level(row['Level'])
         )
     
-    def _create_speed_violation_record(self, row: pd.Series, record_id: int, 
-                                     dimensions: Dict[str, pd.DataFrame]) -> SpeedViolationEvent:
+    def _create_speed_violation_record(self, row: pd.Series, record_id: int) -> SpeedViolationEvent:
         """Create a SpeedViolationEvent from row data"""
-        date_df = dimensions.get('DimDate')
-        time_df = dimensions.get('DimTime')
-        location_df = dimensions.get('DimLocation')
-        vehicle_df = dimensions.get('DimVehicle')
-        event_type_df = dimensions.get('DimEventType')
-        env_df = dimensions.get('DimEnvironmental')
-        
-        # Check if 'Location' exists, otherwise use 'LocationID' or other alternative
-        location = row.get('Location')
-        if location is None and 'LocationID' in row:
-            location = row['LocationID']
-        # Or use a default location if missing
-        if location is None:
-            location = self.DEFAULT_LOCATION
-                
-        # Calculate speed excess - we now know SpeedRecorded > SpeedLimit because of our filter
+        # Calculate speed excess - the SV_ABOVE_LIMIT rule guarantees SpeedRecorded > SpeedLimit
         excess = row['SpeedRecorded'] - row['SpeedLimit']
         
         return SpeedViolationEvent(
             event_id=record_id,
-            date_key=self._get_date_key(date_df, row['Timestamp']),
-            time_key=self._get_time_key(time_df, row['Timestamp']),
-            location_key=self._get_location_key(location_df, location, 'SpeedViolations'),
-            vehicle_key=self._get_vehicle_key(vehicle_df, row['VehicleID']),
-            event_type_key=self._get_event_type_key(event_type_df, 'SPEED_VIOLATION'),
-            environmental_key=self._get_environmental_key(env_df, row['Timestamp']),
+            date_key=row['date_key'],
+            time_key=row['time_key'],
+            location_key=row['location_key'],
+            vehicle_key=row['vehicle_key'],
+            event_type_key=row['event_type_key'],
+            environmental_key=row['environmental_key'],
             avg_speed=row['SpeedRecorded'],
             speed_excess=excess
         )
     
-    def _create_road_closure_record(self, row: pd.Series, record_id: int, 
-                                  dimensions: Dict[str, pd.DataFrame]) -> RoadClosureEvent:
+    def _create_road_closure_record(self, row: pd.Series, record_id: int) -> RoadClosureEvent:
         """Create a RoadClosureEvent from row data"""
-        date_df = dimensions.get('DimDate')
-        time_df = dimensions.get('DimTime')
-        location_df = dimensions.get('DimLocation')
-        event_type_df = dimensions.get('DimEventType')
-        env_df = dimensions.get('DimEnvironmental')
-        
         return RoadClosureEvent(
             event_id=record_id,
-            date_key=self._get_date_key(date_df, row['ClosedAt']),
-            time_key=self._get_time_key(time_df, row['ClosedAt']),
-            location_key=self._get_location_key(location_df, row['Location'], 'RoadClosures'),
+            date_key=row['date_key'],
+            time_key=row['time_key'],
+            location_key=row['location_key'],
             vehicle_key=self.DEFAULT_KEY,
-            event_type_key=self._get_event_type_key(event_type_df, 'ROAD_CLOSURE'),
-            environmental_key=self._get_environmental_key(env_df, row['ClosedAt']),
-            duration_minutes=self.DEFAULT_DURATION
+            event_type_key=row['event_type_key'],
+            environmental_key=row['environmental_key'],
+            duration_minutes=self._duration(row['duration_minutes'])
         )
     
-    def transform(self, data: Dict[str, pd.DataFrame], 
-                 dimensions: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    def _record_factories(self) -> Dict[str, Callable[[pd.Series, int], FactTrafficEventBase]]:
+        """Record factory for each fact source, in processing order"""
+        return {
+            'TrafficFlow': self._create_traffic_flow_record,
+            'Accidents': self._create_accident_record,
+            'CongestionLevels': self._create_congestion_record,
+            'SpeedViolations': self._create_speed_violation_record,
+            'RoadClosures': self._create_road_closure_record
+        }
+    
+    def _validate_dimensions(self, dimensions: Dict[str, pd.DataFrame]) -> bool:
+        """Check that every dimension needed for key resolution is present"""
+        required_dimensions = ['DimDate', 'DimTime', 'DimLocation', 'DimEventType']
+        for dim in required_dimensions:
+            if dim not in dimensions or dimensions[dim] is None:
+                logger.error(f"Missing required dimension table: {dim}")
+                return False
+        return True
+    
+    def transform_chunk(self, source_name: str, df: pd.DataFrame,
+                        dimensions: Dict[str, pd.DataFrame], record_id: int) -> Tuple[pd.DataFrame, int, pd.DataFrame]:
         """
-        Transform source data into fact table records
+        Transform one chunk of a source table into fact rows
+        Returns the fact rows, the next record ID and the rejected source rows
+        """
+        factory = self._record_factories()[source_name]
+        with get_recorder().stage('fact', source_name, rows_in=len(df)) as metrics:
+            records, record_id, rejects = self._process_data_source(source_name, df, dimensions, record_id, factory)
+            fact_df = pd.DataFrame([record.model_dump() for record in records])
+            metrics.rows_out = len(fact_df)
+        return self.dtypes.apply('FactTrafficEvents', fact_df), record_id, rejects
+    
+    def _transform_stream_parallel(self, chunks: Iterable[Tuple[str, pd.DataFrame]],
+                                   dimensions: Dict[str, pd.DataFrame],
+                                   record_id: int) -> Iterator[Tuple[str, int, pd.DataFrame, pd.DataFrame]]:
         """
-        # Initialize empty list to store all fact records
-        fact_records: List[FactTrafficEventBase] = []
-        record_id = 1  # Starting ID for fact records
+        Fan chunks out to worker processes that share one copy of the dimension lookups
+        Results are consumed in submission order, with at most two chunks in flight per worker
+        Yields the source name, source rows, fact rows and rejects of each chunk
+        """
+        location_names = list(dimensions['DimLocation']['location_name'])
+        with SharedDimensionLookups.export(dimensions) as lookups:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_fact_worker,
+                                     initargs=(self.config, lookups.descriptor, location_names,
+                                               self.episode_durations)) as pool:
+                in_flight = deque()
+                
+                def collect():
+                    nonlocal record_id
+                    source_name, rows, future = in_flight.popleft()
+                    fact_df, rejects, worker_metrics = future.result()
+                    get_recorder().merge(worker_metrics)
+                    if not fact_df.empty:
+                        fact_df['event_id'] = np.arange(record_id, record_id + len(fact_df))
+                        record_id += len(fact_df)
+                    return source_name, rows, fact_df, rejects
+                
+                for source_name, chunk in chunks:
+                    in_flight.append((source_name, len(chunk), pool.submit(_transform_chunk_in_worker, source_name, chunk)))
+                    if len(in_flight) >= 2 * self.workers:
+                        yield collect()
+                while in_flight:
+                    yield collect()
+    
+    def transform_stream(self, chunks: Iterable[Tuple[str, pd.DataFrame]],
+                         dimensions: Dict[str, pd.DataFrame], first_event_id: int = 1) -> Iterator[pd.DataFrame]:
+        """
+        Transform a stream of (source name, chunk) pairs into a stream of fact chunks
+        Only one source chunk and its fact rows are held at a time
+        first_event_id lets appended batches continue the event IDs already loaded
+        """
+        if not self._validate_dimensions(dimensions):
+            return
+        
+        # Chunks are canonicalized independently, so agree on the dimension's spellings up front
+        self.location_normalizer.register(dimensions['DimLocation']['location_name'])
+        
+        def results():
+            record_id = first_event_id  # Starting ID for fact records
+            if self.workers > 1:
+                yield from self._transform_stream_parallel(chunks, dimensions, record_id)
+                return
+            for source_name, chunk in chunks:
+                fact_df, record_id, rejects = self.transform_chunk(source_name, chunk, dimensions, record_id)
+                yield source_name, len(chunk), fact_df, rejects
         
-        # Data quality counters
-        total_source_records = 0
-        for source_name in data:
-            if source_name in data and data[source_name] is not None:
-                total_source_records += len(data[source_name])
+        # The error threshold applies once a source's chunks are done, before the next source's
+        current = None
+        streamed = 0
+        for source_name, rows, fact_df, rejects in results():
+            if source_name != current and current is not None:
+                self.quality.check(current)
+            current = source_name
+            self.quality.record(source_name, rows, rejects)
+            if not fact_df.empty:
+                streamed += len(fact_df)
+                yield fact_df
+        if current is not None:
+            self.quality.check(current)
         
+        self.quality.log_summary()
+        logger.info(f"Streamed {streamed} Fact_TrafficEvents records")
+    
+    def transform(self, data: Dict[str, pd.DataFrame],
+                 dimensions: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+        """
+        Transform source data into fact table records
+        """
         # Validate required dimensions
-        required_dimensions = ['DimDate', 'DimTime', 'DimLocation', 'DimEventType']
-        for dim in required_dimensions:
-            if dim not in dimensions or dimensions[dim] is None:
-                logger.error(f"Missing required dimension table: {dim}")
-                return pd.DataFrame()
+        if not self._validate_dimensions(dimensions):
+            return pd.DataFrame()
         
-        # Process each data source
-        data_sources = [
-            ('TrafficFlow', self._create_traffic_flow_record),
-            ('Accidents', self._create_accident_record),
-            ('CongestionLevels', self._create_congestion_record),
-            ('SpeedViolations', self._create_speed_violation_record),
-            ('RoadClosures', self._create_road_closure_record)
+        # Process each data source in slices of chunk_size rows; slices are views of the source, and
+        # only one slice's records are held at a time
+        chunk_size = max(1, self.config.get('processing', {}).get('chunk_size', 50000))
+        chunks = [
+            (source_name, data[source_name].iloc[start:start + chunk_size])
+            for source_name in self._record_factories() if source_name in data
+            for start in range(0, len(data[source_name]), chunk_size)
         ]
         
-        # Process each data source
-        for source_name, factory_func in data_sources:
-            records, record_id = self._process_data_source(
-                source_name, data, dimensions, record_id, factory_func
-            )
-            fact_records.extend(records)
+        # Episodes can span any rows of a source, so detect them before building fact rows
+        self.episode_durations = EpisodeDetector(self.config).detect(chunks)
+        try:
+            fact_chunks = list(self.transform_stream(chunks, dimensions))
+        finally:
+            self.episode_durations.cleanup()
+            self.episode_durations = EpisodeDetector(self.config).empty()
         
-        # Create dataframe from records - convert Pydantic models to dictionaries
-        if not fact_records:
+        # Create dataframe from records
+        if not fact_chunks:
             logger.warning("No fact records created")
             return pd.DataFrame()
-            
-        fact_df = pd.DataFrame([record.model_dump() for record in fact_records])
         
-        # Log data quality summary
-        records_processed = len(fact_df)
-        if records_processed < total_source_records:
-            logger.info(f"Data quality summary: Processed {records_processed} of {total_source_records} source records")
-            logger.info(f"Filtered out {total_source_records - records_processed} records due to data quality issues")
+        fact_df = pd.concat(fact_chunks, ignore_index=True)
+        del fact_chunks
         
         logger.info(f"Created Fact_TrafficEvents with {len(fact_df)} records")
-        return fact_df 
\ No newline at end of file
+        return fact_df
\ No newline at end of file
@@ -0,0 +1,122 @@
+import pandas as pd
+import numpy as np
+from typing import Dict, Any, Iterable
+import logging
+import yaml
+
+logger = logging.getLogger(__name__)
+
+
+class LocationNormalizer:
+    """Canonicalizes location names and stores them as pandas Categoricals"""
+    
+    # Tables with a Location attribute
+    LOCATION_TABLES = ['TrafficFlow', 'Accidents', 'CongestionLevels',
+                       'SpeedViolations', 'RoadClosures']
+    UNKNOWN_LOCATION = 'Unknown'
+    
+    def __init__(self, config: Dict[str, Any]):
+        location_config = config.get('location', {})
+        self.case_fold = location_config.get('case_fold', True)
+        
+        # Memoized canonical names: raw value -> canonical name
+        self._canonical_cache: Dict[str, str] = {}
+        # First spelling seen for each match key becomes the canonical name
+        self._representatives: Dict[str, str] = {
+            self._match_key(self.UNKNOWN_LOCATION): self.UNKNOWN_LOCATION
+        }
+        self._aliases = self._load_aliases(location_config)
+    
+    def _match_key(self, name: str) -> str:
+        """Key used to decide whether two spellings name the same location"""
+        key = ' '.join(name.split())
+        return key.casefold() if self.case_fold else key
+    
+    def _load_aliases(self, location_config: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Build the alias table (match key -> canonical name)
+        Aliases map a canonical name to a list of alternative spellings and
+        may be given inline or in a YAML file
+        """
+        alias_groups = dict(location_config.get('aliases') or {})
+        aliases_file = location_config.get('aliases_file')
+        if aliases_file:
+            with open(aliases_file) as f:
+                alias_groups.update(yaml.safe_load(f) or {})
+            logger.info(f"Loaded {len(alias_groups)} location alias groups from {aliases_file}")
+        
+        aliases = {}
+        for canonical, variants in alias_groups.items():
+            canonical = ' '.join(str(canonical).split())
+            aliases[self._match_key(canonical)] = canonical
+            for variant in variants or []:
+                aliases[self._match_key(str(variant))] = canonical
+        return aliases
+    
+    def register(self, names: Iterable[str]):
+        """Seed canonical names, e.g. from an existing location dimension"""
+        for name in names:
+            if isinstance(name, str):
+                key = self._match_key(name)
+                if key not in self._aliases:
+                    self._representatives.setdefault(key, name)
+    
+    def canonical_name(self, name):
+        """Return the canonical spelling of a single location name"""
+        if not isinstance(name, str):
+            return name
+        
+        cached = self._canonical_cache.get(name)
+        if cached is not None:
+            return cached
+        
+        key = self._match_key(name)
+        canonical = self._aliases.get(key)
+        if canonical is None:
+            canonical = self._representatives.setdefault(key, ' '.join(name.split()))
+        self._canonical_cache[name] = canonical
+        return canonical
+    
+    def normalize(self, locations: pd.Series) -> pd.Series:
+        """
+        Canonicalize a column of location names
+        Only the distinct values are canonicalized; rows are remapped through
+        their categorical codes, so the cost per row is a single array lookup
+        """
+        if isinstance(locations.dtype, pd.CategoricalDtype):
+            categorical = locations
+        else:
+            categorical = locations.astype('category')
+        
+        categories = categorical.cat.categories
+        canonical = pd.Index([self.canonical_name(name) for name in categories])
+        if canonical.equals(categories):
+            return categorical
+        
+        # Merge categories that share a canonical name
+        canonical_categories = canonical.unique()
+        remap = np.append(canonical_categories.get_indexer(canonical), -1)
+        codes = remap[categorical.cat.codes.to_numpy()]
+        return pd.Series(
+            pd.Categorical.from_codes(codes, categories=canonical_categories),
+            index=locations.index,
+            name=locations.name
+        )
+    
+    def normalize_sources(self, data: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+        """Canonicalize the Location column of every source table that has one"""
+        normalized = dict(data)
+        for table_name in self.LOCATION_TABLES:
+            df = data.get(table_name)
+            if df is None or 'Location' not in df.columns:
+                continue
+            
+            locations = self.normalize(df['Location'])
+            normalized[table_name] = df.assign(Location=locations)
+            
+            raw_count = df['Location'].nunique()
+            canonical_count = len(locations.cat.categories)
+            if canonical_count < raw_count:
+                logger.info(f"Merged {raw_count - canonical_count} location name variants in {table_name}")
+        
+        return normalized
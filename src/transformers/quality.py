@@ -0,0 +1,174 @@
+import logging
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional, Tuple
+
+from .dedup import RecordDeduplicator
+from monitoring import get_recorder
+
+logger = logging.getLogger(__name__)
+
+
+class DataQualityError(RuntimeError):
+    """A source's share of rejected records exceeded the error threshold"""
+
+
+class DataQualityRules:
+    """
+    Declarative data-quality rules of the fact sources
+    Every rule is evaluated as a boolean mask over whole columns, so checking a chunk is
+    linear in its rows and rules. Rows failing any rule are left out of the facts and
+    become reject rows carrying the IDs of the rules they failed; rows failing the record
+    model are rejected as RECORD_INVALID. With error_handling 'abort' a source whose share
+    of rejected rows exceeds error_threshold percent stops the run, with 'continue' it is
+    logged as an error
+    """
+    
+    REJECT_TABLE = 'RejectedRecords'
+    REJECT_COLUMNS = ['run_id', 'source_table', 'source_id', 'rule_ids', 'record']
+    MODEL_RULE = 'RECORD_INVALID'
+    ERROR_HANDLING = ['continue', 'abort']
+    
+    # Rule ID -> (source, check, column(s), argument)
+    # not_null: the column has a value; range: a number in [low, high] (None = unbounded);
+    # allowed: one of the values; greater: the first column above the second; reference:
+    # a value whose dimension key resolved (checked once keys are resolved)
+    RULES = {
+        'TF_TIMESTAMP': ('TrafficFlow', 'not_null', 'Timestamp', None),
+        'TF_DATE_REF': ('TrafficFlow', 'reference', ('Timestamp', 'date_key'), None),
+        'TF_VEHICLE_COUNT': ('TrafficFlow', 'range', 'VehicleCount', (0, None)),
+        'ACC_TIMESTAMP': ('Accidents', 'not_null', 'ReportedAt', None),
+        'ACC_DATE_REF': ('Accidents', 'reference', ('ReportedAt', 'date_key'), None),
+        'ACC_SEVERITY': ('Accidents', 'allowed', 'Severity', ['Minor', 'Moderate', 'Severe', 'Fatal']),
+        'ACC_VEHICLES': ('Accidents', 'range', 'VehiclesInvolved', (1, None)),
+        'CONG_TIMESTAMP': ('CongestionLevels', 'not_null', 'RecordedAt', None),
+        'CONG_DATE_REF': ('CongestionLevels', 'reference', ('RecordedAt', 'date_key'), None),
+        'CONG_LEVEL': ('CongestionLevels', 'allowed', 'Level', ['Low', 'Moderate', 'High', 'Severe']),
+        'SV_TIMESTAMP': ('SpeedViolations', 'not_null', 'Timestamp', None),
+        'SV_DATE_REF': ('SpeedViolations', 'reference', ('Timestamp', 'date_key'), None),
+        'SV_SPEED': ('SpeedViolations', 'range', 'SpeedRecorded', (0, 400)),
+        'SV_LIMIT': ('SpeedViolations', 'range', 'SpeedLimit', (1, 200)),
+        'SV_ABOVE_LIMIT': ('SpeedViolations', 'greater', ('SpeedRecorded', 'SpeedLimit'), None),
+        'SV_VEHICLE_REF': ('SpeedViolations', 'reference', ('VehicleID', 'vehicle_key'), None),
+        'RC_TIMESTAMP': ('RoadClosures', 'not_null', 'ClosedAt', None),
+        'RC_DATE_REF': ('RoadClosures', 'reference', ('ClosedAt', 'date_key'), None)
+    }
+    DEFAULT_KEY = 0
+    
+    def __init__(self, config: Dict[str, Any]):
+        processing_config = config.get('processing', {})
+        self.error_handling = processing_config.get('error_handling', 'continue')
+        if self.error_handling not in self.ERROR_HANDLING:
+            raise ValueError(f"Unknown error handling '{self.error_handling}', expected one of {self.ERROR_HANDLING}")
+        self.error_threshold = float(processing_config.get('error_threshold', 100))  # percent of a source's rows
+        self.checked: Dict[str, int] = {}
+        self.rejected: Dict[str, int] = {}
+        self.failures: Dict[str, Dict[str, int]] = {}  # Rejected rows of each source by rule ID
+        self._rejects: List[pd.DataFrame] = []
+        self._reported = set()
+    
+    @classmethod
+    def _columns(cls, columns) -> Tuple[str, ...]:
+        return (columns,) if isinstance(columns, str) else tuple(columns)
+    
+    def _passes(self, df: pd.DataFrame, check: str, columns: Tuple[str, ...], argument) -> np.ndarray:
+        """Rows of a chunk passing one rule"""
+        values = df[columns[0]]
+        if check == 'not_null':
+            return values.notna().to_numpy()
+        if check == 'allowed':
+            return values.isin(argument).to_numpy()
+        if check == 'range':
+            numbers = pd.to_numeric(values, errors='coerce').to_numpy(np.float64, na_value=np.nan)
+            low, high = argument
+            with np.errstate(invalid='ignore'):
+                passes = ~np.isnan(numbers)
+                if low is not None:
+                    passes &= numbers >= low
+                if high is not None:
+                    passes &= numbers <= high
+            return passes
+        if check == 'greater':
+            return (values > df[columns[1]]).to_numpy(dtype=bool, na_value=False)
+        if check == 'reference':
+            return values.isna().to_numpy() | (df[columns[1]].to_numpy() != self.DEFAULT_KEY)
+        raise ValueError(f"Unknown data quality check '{check}'")
+    
+    def evaluate(self, source_name: str, df: pd.DataFrame,
+                 source_columns: Optional[List[str]] = None) -> Tuple[np.ndarray, pd.DataFrame]:
+        """
+        Mask of the rows of a chunk passing every rule of its source, and the reject rows of the others
+        Rules on columns the chunk doesn't have are skipped; source_columns are kept in the rejects
+        """
+        passes = np.ones(len(df), dtype=bool)
+        failures = {}
+        for rule_id, (source, check, columns, argument) in self.RULES.items():
+            columns = self._columns(columns)
+            if source != source_name or not all(column in df.columns for column in columns):
+                continue
+            failed = ~self._passes(df, check, columns, argument)
+            if failed.any():
+                failures[rule_id] = failed
+                passes &= ~failed
+        return passes, self.rejects(source_name, df, failures, source_columns)
+    
+    def rejects(self, source_name: str, df: pd.DataFrame, failures: Dict[str, np.ndarray],
+                source_columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Reject rows of the rows of a chunk failing some rules (rule ID -> failing rows mask)"""
+        if not failures:
+            return pd.DataFrame(columns=self.REJECT_COLUMNS[1:])
+        failed = np.logical_or.reduce(list(failures.values()))
+        rows = df.iloc[np.flatnonzero(failed)][source_columns or list(df.columns)]
+        
+        rule_ids = np.full(len(rows), '', dtype=object)
+        for rule_id, mask in failures.items():
+            rule_ids += np.where(mask[failed], f"{rule_id};", '')
+        key_columns = RecordDeduplicator.NATURAL_KEYS.get(source_name, [])
+        source_ids = rows[key_columns[0]].astype('string').to_numpy(dtype=object, na_value=None) \
+            if key_columns and key_columns[0] in rows.columns else np.full(len(rows), None, dtype=object)
+        return pd.DataFrame({
+            'source_table': source_name,
+            'source_id': source_ids,
+            'rule_ids': pd.Series(rule_ids).str.rstrip(';').to_numpy(),
+            'record': rows.to_json(orient='records', lines=True, date_format='iso').splitlines()
+        })
+    
+    def record(self, source_name: str, rows: int, rejects: pd.DataFrame):
+        """Account for a checked chunk of a source and keep its rejects"""
+        self.checked[source_name] = self.checked.get(source_name, 0) + rows
+        if rejects.empty:
+            return
+        self.rejected[source_name] = self.rejected.get(source_name, 0) + len(rejects)
+        failures = self.failures.setdefault(source_name, {})
+        for rule_id, count in rejects['rule_ids'].str.split(';').explode().value_counts().items():
+            failures[rule_id] = failures.get(rule_id, 0) + int(count)
+        self._rejects.append(rejects)
+    
+    def check(self, source_name: str):
+        """Apply the error threshold to the rows of a source checked so far"""
+        checked = self.checked.get(source_name, 0)
+        if not checked or source_name in self._reported:
+            return
+        share = 100 * self.rejected.get(source_name, 0) / checked
+        if share <= self.error_threshold:
+            return
+        message = (f"Rejected {share:.1f}% of {checked} {source_name} records, above the "
+                   f"{self.error_threshold:g}% error threshold")
+        if self.error_handling == 'abort':
+            raise DataQualityError(message)
+        self._reported.add(source_name)
+        logger.error(message)
+    
+    def drain(self) -> pd.DataFrame:
+        """Remove and return the rejects kept so far, tagged with the run that rejected them"""
+        rejects = [df for df in self._rejects if not df.empty]
+        self._rejects = []
+        if not rejects:
+            return pd.DataFrame(columns=self.REJECT_COLUMNS)
+        df = pd.concat(rejects, ignore_index=True)
+        return df.assign(run_id=get_recorder().run_id)[self.REJECT_COLUMNS]
+    
+    def log_summary(self):
+        for source_name, count in self.rejected.items():
+            rules = ', '.join(f"{rule_id}: {rule_count}" for rule_id, rule_count in sorted(self.failures[source_name].items()))
+            logger.info(f"Rejected {count} of {self.checked.get(source_name, 0)} {source_name} records ({rules})")
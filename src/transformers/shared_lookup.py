@@ -0,0 +1,155 @@
+import logging
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Fixed hash key so every process encodes a string to the same 64-bit code
+HASH_KEY = 'traffic_dwh_keys'
+LOCATION_SEPARATOR = '\x1f'
+
+
+def encode_values(values, kind: str) -> np.ndarray:
+    """
+    Encode natural key values as int64 codes that can be binary searched
+    Datetimes become nanoseconds, integers are kept and strings are hashed. Integer keys
+    are compared as numbers, so an ID read as a float (1.0, in a column with nulls) matches 1
+    """
+    if kind == 'datetime':
+        return pd.to_datetime(pd.Series(values)).to_numpy('datetime64[ns]').view(np.int64)
+    if kind == 'int':
+        return pd.to_numeric(pd.Series(values), errors='coerce').fillna(-1).to_numpy(np.int64)
+    if kind == 'text':
+        text = pd.Series(values).astype(object).to_numpy()
+        return pd.util.hash_array(text, hash_key=HASH_KEY, categorize=False).view(np.int64)
+    raise ValueError(f"Unknown lookup key kind '{kind}'")
+
+
+def location_values(source: str, names) -> pd.Series:
+    """Composite natural key of a location: its source table and canonical name"""
+    return source + LOCATION_SEPARATOR + pd.Series(names).astype(object)
+
+
+class SharedDimensionLookups:
+    """
+    Dimension key tables exported once to multiprocessing.shared_memory
+    Each lookup is a 2 x n int64 block: natural key codes sorted ascending, then the
+    surrogate keys. Worker processes attach by name from a small descriptor and resolve
+    whole columns with np.searchsorted, without pickling or copying the tables
+    """
+    
+    # Lookup name -> (dimension, natural key column(s), surrogate key column, key kind)
+    LOOKUPS = {
+        'date': ('DimDate', 'date', 'date_key', 'datetime'),
+        'time': ('DimTime', 'time_key', 'time_key', 'int'),
+        'location': ('DimLocation', ['location_source', 'location_name'], 'location_key', 'text'),
+        'vehicle': ('DimVehicle', 'vehicle_id', 'vehicle_key', 'int'),
+        'event_type': ('DimEventType', 'event_type_id', 'event_type_key', 'text'),
+        'environmental': ('DimEnvironmental', 'date', 'environmental_key', 'datetime')
+    }
+    DEFAULT_KEY = 0
+    
+    def __init__(self, descriptor: Dict[str, Dict[str, Any]], owner: bool = False):
+        self.descriptor = descriptor
+        self.owner = owner
+        self._blocks: Dict[str, shared_memory.SharedMemory] = {}
+        self._tables: Dict[str, np.ndarray] = {}
+        for name, entry in descriptor.items():
+            block = shared_memory.SharedMemory(name=entry['shm'])
+            table = np.ndarray((2, entry['size']), dtype=np.int64, buffer=block.buf)
+            table.flags.writeable = False
+            self._blocks[name] = block
+            self._tables[name] = table
+    
+    @classmethod
+    def _sorted_keys(cls, dim_df: pd.DataFrame, columns, key_column: str, kind: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Natural key codes of a dimension in ascending order with their surrogate keys"""
+        if isinstance(columns, list):
+            valid = dim_df[columns].notna().all(axis=1).to_numpy()
+            values = location_values(dim_df[columns[0]].astype(str).to_numpy(), dim_df[columns[1]].to_numpy())
+        else:
+            valid = dim_df[columns].notna().to_numpy()
+            values = dim_df[columns]
+        codes = encode_values(pd.Series(values).to_numpy()[valid], kind)
+        keys = dim_df[key_column].to_numpy(np.int64)[valid]
+        
+        # np.unique returns each code's first occurrence, so the first match wins as in-process
+        codes, first = np.unique(codes, return_index=True)
+        return codes, keys[first]
+    
+    @classmethod
+    def export(cls, dimensions: Dict[str, pd.DataFrame]) -> 'SharedDimensionLookups':
+        """Copy the key tables of the available dimensions into new shared memory blocks"""
+        descriptor = {}
+        created = []
+        try:
+            for name, (dim_name, columns, key_column, kind) in cls.LOOKUPS.items():
+                dim_df = dimensions.get(dim_name)
+                if dim_df is None:
+                    continue
+                
+                codes, keys = cls._sorted_keys(dim_df, columns, key_column, kind)
+                block = shared_memory.SharedMemory(create=True, size=max(codes.nbytes * 2, 16))
+                created.append(block)
+                table = np.ndarray((2, len(codes)), dtype=np.int64, buffer=block.buf)
+                table[0] = codes
+                table[1] = keys
+                del table
+                descriptor[name] = {'shm': block.name, 'size': len(codes)}
+        except Exception:
+            for block in created:
+                block.close()
+                block.unlink()
+            raise
+        
+        lookups = cls(descriptor, owner=True)
+        for block in created:
+            block.close()  # The instance holds its own handle to every block
+        logger.info(f"Exported {len(descriptor)} dimension lookups to shared memory "
+                    f"({sum(entry['size'] for entry in descriptor.values())} keys)")
+        return lookups
+    
+    @classmethod
+    def attach(cls, descriptor: Dict[str, Dict[str, Any]]) -> 'SharedDimensionLookups':
+        """Attach read-only to lookups exported by another process"""
+        return cls(descriptor)
+    
+    def has(self, name: str) -> bool:
+        return name in self._tables
+    
+    def lookup(self, name: str, values, kind: Optional[str] = None) -> np.ndarray:
+        """
+        Resolve natural key values to surrogate keys by vectorized binary search
+        Categorical values are resolved once per category; misses and nulls get the default key
+        """
+        if isinstance(values, pd.Series) and isinstance(values.dtype, pd.CategoricalDtype):
+            category_keys = np.append(self.lookup(name, values.cat.categories.to_series()), self.DEFAULT_KEY)
+            return category_keys[values.cat.codes.to_numpy()]  # Code -1 (null) takes the trailing default
+        
+        values = pd.Series(values)
+        if name not in self._tables or self.descriptor[name]['size'] == 0 or len(values) == 0:
+            return np.full(len(values), self.DEFAULT_KEY, dtype=np.int64)
+        
+        codes_sorted, keys = self._tables[name]
+        codes = encode_values(values.to_numpy(), kind or self.LOOKUPS[name][3])
+        positions = np.searchsorted(codes_sorted, codes)
+        positions = np.minimum(positions, len(codes_sorted) - 1)
+        found = (codes_sorted[positions] == codes) & values.notna().to_numpy()
+        return np.where(found, keys[positions], self.DEFAULT_KEY).astype(np.int64)
+    
+    def close(self):
+        """Detach from the blocks, and free them if this process exported them"""
+        self._tables = {}  # Views must be released before the blocks can close
+        for block in self._blocks.values():
+            block.close()
+            if self.owner:
+                block.unlink()
+        self._blocks = {}
+    
+    def __enter__(self) -> 'SharedDimensionLookups':
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,9 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Pipeline modules import each other as top-level packages of src/ and through src.
+for path in (ROOT, os.path.join(ROOT, 'src')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
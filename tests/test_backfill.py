@@ -0,0 +1,105 @@
+import os
+import copy
+
+import pandas as pd
+import pytest
+
+from conftest import ROOT
+from config.config import CONFIG
+from service import BackfillRunner
+from transformers.dimension import DIMENSION_TRANSFORMERS, STATIC_DIMENSIONS
+from monitoring import get_recorder
+
+SAMPLE_WORKBOOK = os.path.join(ROOT, 'data', 'traffic_flow_data.xlsx')
+START, END = pd.Timestamp('2024-11-01'), pd.Timestamp('2025-04-01')
+
+
+@pytest.fixture
+def backfill_config(tmp_path, monkeypatch):
+    monkeypatch.setenv('OUTPUT_DIR', str(tmp_path / 'warehouse'))
+    monkeypatch.setenv('USE_DATABASE', 'False')
+    config = copy.deepcopy(CONFIG)
+    config['source'].update(source_file=SAMPLE_WORKBOOK, source_format='excel')
+    config['backfill'].update(dir=str(tmp_path / 'backfill'), workers=0, max_attempts=2)
+    get_recorder().start_run()
+    return config
+
+
+def planned_runner(config) -> BackfillRunner:
+    source_data = pd.read_excel(SAMPLE_WORKBOOK, sheet_name=None)
+    dimensions = {
+        name: transformer(config).transform() if name in STATIC_DIMENSIONS else transformer(config).transform(source_data)
+        for name, transformer in DIMENSION_TRANSFORMERS.items()
+    }
+    runner = BackfillRunner(config)
+    runner.plan(START, END, dimensions)
+    return runner
+
+
+def fail_partition(monkeypatch, partition_id: str, times: int):
+    """Make the first `times` attempts of a partition raise"""
+    run_partition = BackfillRunner.run_partition
+    failures = []
+    
+    def flaky(self, task):
+        if task['id'] == partition_id and len(failures) < times:
+            failures.append(task['attempts'])
+            raise RuntimeError('source unavailable')
+        return run_partition(self, task)
+    monkeypatch.setattr(BackfillRunner, 'run_partition', flaky)
+    return failures
+
+
+def test_failed_partition_is_retried_and_the_backfill_checks_out(backfill_config, monkeypatch):
+    runner = planned_runner(backfill_config)
+    partitions = runner._load_plan()['partitions']
+    assert runner.queue.counts() == {'pending': len(partitions), 'running': 0, 'done': 0, 'failed': 0}
+    
+    failures = fail_partition(monkeypatch, partitions[1], times=1)
+    assert runner.work() == len(partitions)
+    assert failures == [0]
+    assert runner.queue.counts() == {'pending': 0, 'running': 0, 'done': len(partitions), 'failed': 0}
+    retried = [task for task in runner.queue.tasks('done') if task['attempts']]
+    assert [(task['id'], task['error']) for task in retried] == [(partitions[1], 'RuntimeError: source unavailable')]
+    
+    runner.finalize()
+    summary = runner.verify()
+    assert (summary['completed'], summary['retried'], summary['problems']) == (len(partitions), 1, [])
+    facts = pd.read_csv(os.path.join(os.environ['OUTPUT_DIR'], 'FactTrafficEvents.csv'))
+    assert len(facts) == summary['rows'] > 0 and facts['event_id'].is_unique
+
+
+def test_partition_failing_every_attempt_fails_the_backfill(backfill_config, monkeypatch):
+    runner = planned_runner(backfill_config)
+    partitions = runner._load_plan()['partitions']
+    
+    fail_partition(monkeypatch, partitions[0], times=2)
+    assert runner.work() == len(partitions) - 1
+    failed = runner.queue.tasks('failed')
+    assert [(task['id'], task['attempts']) for task in failed] == [(partitions[0], 2)]
+    with pytest.raises(RuntimeError, match=f"partition {partitions[0]} failed after 2 attempts"):
+        runner.finalize()
+
+
+def test_consistency_check_finds_facts_left_in_the_range(backfill_config):
+    runner = planned_runner(backfill_config)
+    runner.work()
+    runner.finalize()
+    
+    path = os.path.join(os.environ['OUTPUT_DIR'], 'FactTrafficEvents.csv')
+    facts = pd.read_csv(path)
+    stray = facts.iloc[[0]].assign(event_id=facts['event_id'].max() + 1000)
+    pd.concat([facts, stray]).to_csv(path, index=False)
+    with pytest.raises(RuntimeError, match='facts dated in the range'):
+        runner.verify()
+
+
+def test_stale_task_is_requeued(backfill_config):
+    runner = planned_runner(backfill_config)
+    queue = runner.queue
+    task = queue.claim()
+    assert queue.counts()['running'] == 1
+    
+    queue.stale_seconds = 0
+    assert queue.requeue_stale() == [task['id']]
+    assert queue.claim()['id'] == task['id']
@@ -0,0 +1,46 @@
+import pandas as pd
+
+from transformers import RecordDeduplicator
+
+
+def dedup_config(tmp_path):
+    # Small spills and runs so windows span several runs, which get merged
+    return {'dedup': {'dir': str(tmp_path / 'dedup'), 'capacity': 16, 'spill_keys': 4, 'max_runs': 2}}
+
+
+def flows(first: int, count: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        'FlowID': range(first, first + count),
+        'Location': 'Main St',
+        'VehicleCount': 10,
+        'Timestamp': pd.date_range('2025-01-01', periods=count, freq='min') + pd.Timedelta(minutes=first)
+    })
+
+
+def deliver(config, window: pd.DataFrame, **kwargs) -> pd.DataFrame:
+    dedup = RecordDeduplicator(config, **kwargs)
+    kept = dedup.filter('TrafficFlow', window)
+    dedup.commit()
+    return kept
+
+
+def test_redelivered_window_is_dropped(tmp_path):
+    config = dedup_config(tmp_path)
+    for first in range(1, 41, 10):
+        assert len(deliver(config, flows(first, 10))) == 10
+    
+    # A window overlapping every earlier one, with a repeat inside it as well
+    window = pd.concat([flows(1, 45), flows(44, 1)], ignore_index=True)
+    assert deliver(config, window)['FlowID'].tolist() == list(range(41, 46))
+    assert deliver(config, window).empty
+    assert RecordDeduplicator(config).store.count == 45
+
+
+def test_full_rebuild_resets_the_store(tmp_path):
+    config = dedup_config(tmp_path)
+    deliver(config, flows(1, 20))
+    
+    # A full load ignores what was loaded before, and its records become the whole set
+    assert len(deliver(config, flows(11, 20), replace=True)) == 20
+    assert RecordDeduplicator(config).store.count == 20
+    assert deliver(config, flows(1, 30))['FlowID'].tolist() == list(range(1, 11))
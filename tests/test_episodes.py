@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from transformers import EpisodeDetector, FactTableTransformer
+
+
+def congestion(rows) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=['CongestionID', 'Location', 'RecordedAt', 'ClearedAt']).assign(
+        RecordedAt=lambda df: pd.to_datetime(df['RecordedAt']),
+        ClearedAt=lambda df: pd.to_datetime(df['ClearedAt'])
+    )
+
+
+def test_episode_durations_of_overlapping_gapped_and_cross_location_readings(tmp_path):
+    config = {'episodes': {'congestion_reading_minutes': 15, 'gap_minutes': 15, 'partitions': 4,
+                           'dir': str(tmp_path)}}
+    readings = congestion([
+        (1, 'Main St', '2025-01-06 10:00', '2025-01-06 10:30'),
+        (2, 'Main St', '2025-01-06 10:20', '2025-01-06 10:50'),  # overlaps 1
+        (3, 'Oak Ave', '2025-01-06 10:10', None),                  # same time, other location
+        (4, 'Main St', '2025-01-06 11:30', None),                  # 40 minutes after 2 ended
+        (5, 'Main St', '2025-01-06 11:55', '2025-01-06 12:05'),  # 10 minutes after 4 ended
+        (6, 'main st', '2025-01-06 10:05', None)                   # within 1, spelled differently
+    ])
+    # Readings of one episode arrive in different chunks, out of order
+    chunks = [('CongestionLevels', readings.iloc[[3, 1, 5]]), ('CongestionLevels', readings.iloc[[0, 2, 4]])]
+    durations = EpisodeDetector(config).detect(chunks)
+    try:
+        minutes = durations.lookup('CongestionLevels', readings).tolist()
+        unknown = durations.lookup('CongestionLevels', congestion([(7, 'Main St', '2025-01-07 09:00', None)]))
+    finally:
+        durations.cleanup()
+    
+    # 10:00-10:50, 10:10 + 15 minutes, 11:30-12:05; later readings of an episode are NULL
+    assert minutes[:1] + minutes[2:4] == [50, 15, 35]
+    assert np.isnan([minutes[1], minutes[4], minutes[5]]).all()
+    assert FactTableTransformer._duration(minutes[1]) is None
+    assert unknown.tolist() == [15]
@@ -0,0 +1,41 @@
+import os
+import copy
+
+import pandas as pd
+import pytest
+
+from conftest import ROOT
+from config.config import CONFIG
+from transformers import FactTableTransformer
+from transformers.dimension import DIMENSION_TRANSFORMERS, STATIC_DIMENSIONS
+
+SAMPLE_WORKBOOK = os.path.join(ROOT, 'data', 'traffic_flow_data.xlsx')
+
+
+@pytest.fixture(scope='module')
+def source_data():
+    """Sample workbook with a null VehicleID, so SpeedViolations chunks hold their IDs as floats"""
+    data = pd.read_excel(SAMPLE_WORKBOOK, sheet_name=None)
+    data['SpeedViolations'].loc[3, 'VehicleID'] = None
+    return data
+
+
+def transform(source_data, workers: int):
+    config = copy.deepcopy(CONFIG)
+    config['processing'].update(fact_workers=workers, chunk_size=30)
+    dimensions = {
+        name: transformer(config).transform() if name in STATIC_DIMENSIONS else transformer(config).transform(source_data)
+        for name, transformer in DIMENSION_TRANSFORMERS.items()
+    }
+    transformer = FactTableTransformer(config)
+    return transformer.transform(source_data, dimensions), transformer.quality.drain()
+
+
+def test_worker_processes_build_the_same_facts_as_one_process(source_data):
+    facts, rejects = transform(source_data, workers=1)
+    parallel_facts, parallel_rejects = transform(source_data, workers=2)
+    
+    assert (facts['vehicle_key'] != 0).any()
+    pd.testing.assert_frame_equal(parallel_facts, facts)
+    pd.testing.assert_frame_equal(parallel_rejects.drop(columns='rejected_at', errors='ignore'),
+                                  rejects.drop(columns='rejected_at', errors='ignore'))
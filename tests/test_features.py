@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from analytics import RollingFeatures
+from loaders.warehouse_loader import WarehouseLoader
+
+
+def facts(seed: int = 3) -> pd.DataFrame:
+    """Two days of facts at three locations, several per minute at times, with missing measures"""
+    rng = np.random.default_rng(seed)
+    stamps = pd.Timestamp('2025-01-06') + pd.to_timedelta(np.sort(rng.integers(0, 2 * 1440, 600)), unit='m')
+    df = pd.DataFrame({
+        'location_key': rng.integers(1, 4, len(stamps)),
+        'date_key': stamps.year * 10000 + stamps.month * 100 + stamps.day,
+        'time_key': stamps.hour * 100 + stamps.minute,
+        'vehicle_count': rng.integers(0, 300, len(stamps)).astype(float),
+        'congestion_level_score': rng.choice([1.0, 2.0, 3.0, np.nan], len(stamps)),
+        'avg_speed': rng.normal(50, 10, len(stamps))
+    })
+    df.loc[rng.random(len(df)) < 0.3, 'avg_speed'] = np.nan
+    return df
+
+
+def build(tmp_path, name: str, batches) -> pd.DataFrame:
+    config = {'features': {'dir': str(tmp_path / name / 'features'), 'windows': ['15min', '1h', '24h']}}
+    loader = WarehouseLoader({'database': {}, 'rollups': {'enabled': False}}, use_db=False,
+                             output_dir=str(tmp_path / name))
+    for index, batch in enumerate(batches):
+        features = RollingFeatures(config)
+        features.update(batch)
+        features.apply(loader, replace=index == 0)
+    return pd.read_csv(tmp_path / name / f'{RollingFeatures.TABLE}.csv')
+
+
+def test_incremental_builds_match_a_full_rebuild(tmp_path):
+    df = facts()
+    # Batches in time order; the facts of one minute are split between two batches
+    bounds = [0, 200, 201, 450, len(df)]
+    df.loc[200, ['location_key', 'date_key', 'time_key']] = df.loc[199, ['location_key', 'date_key', 'time_key']]
+    batches = [df.iloc[start:end] for start, end in zip(bounds, bounds[1:])]
+    
+    full = build(tmp_path, 'full', [df])
+    incremental = build(tmp_path, 'incremental', batches)
+    pd.testing.assert_frame_equal(incremental, full, check_exact=False, rtol=1e-5)
@@ -0,0 +1,143 @@
+import os
+import sys
+import json
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+import pytest
+
+from conftest import ROOT
+from extractors import TrafficDataExtractor
+from monitoring import get_recorder
+
+SAMPLE_WORKBOOK = os.path.join(ROOT, 'data', 'traffic_flow_data.xlsx')
+FACT_SOURCES = ['TrafficFlow', 'Accidents', 'CongestionLevels', 'SpeedViolations', 'RoadClosures']
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    """Paginated feed of a table: offset cursors, and no next cursor on the last page"""
+    
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        records = self.server.tables.get(url.path.strip('/'), [])
+        cursor = int(query.get('cursor', ['0'])[0])
+        limit = int(query['limit'][0])
+        next_cursor = cursor + limit if cursor + limit < len(records) else None
+        body = json.dumps({'records': records[cursor:cursor + limit], 'next_cursor': next_cursor}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def feed_server():
+    """Stub feed server serving the sample workbook, whose tables can be appended to"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FeedHandler)
+    server.tables = {
+        table: json.loads(df.to_json(orient='records', date_format='iso'))
+        for table, df in pd.read_excel(SAMPLE_WORKBOOK, sheet_name=None).items()
+    }
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def http_config(server, tmp_path):
+    return {
+        'source': {'source_file': server.url, 'source_format': 'http', 'required_tables': ['TrafficFlow']},
+        'http': {'page_size': 40, 'cursor_file': str(tmp_path / 'http_cursors.json')},
+        'source_profile': {'enabled': False},
+        'dtypes': {'enabled': False}
+    }
+
+
+def read_rows(config, stage=False) -> int:
+    extractor = TrafficDataExtractor(config, stage_tables=['TrafficFlow'] if stage else None)
+    return sum(len(chunk) for chunk in extractor.extract_chunks('TrafficFlow', 25))
+
+
+def add_flows(server, count: int):
+    last = server.tables['TrafficFlow'][-1]
+    server.tables['TrafficFlow'] += [dict(last, FlowID=last['FlowID'] + n) for n in range(1, count + 1)]
+
+
+def test_only_the_fact_pass_reads_from_the_stored_cursors(feed_server, tmp_path):
+    config = http_config(feed_server, tmp_path)
+    get_recorder().start_run()
+    # The dimension and episode passes, then the fact pass staging the cursors it reached
+    assert [read_rows(config), read_rows(config), read_rows(config, stage=True)] == [150, 150, 150]
+    assert not os.path.exists(config['http']['cursor_file'])
+    
+    assert TrafficDataExtractor(config).commit_positions() == 1
+    get_recorder().start_run()
+    assert [read_rows(config), read_rows(config, stage=True)] == [150, 0]
+
+
+def test_resumed_feed_skips_the_records_already_read_from_its_last_page(feed_server, tmp_path):
+    config = http_config(feed_server, tmp_path)
+    get_recorder().start_run()
+    read_rows(config, stage=True)
+    TrafficDataExtractor(config).commit_positions()
+    
+    last = feed_server.tables['TrafficFlow'][-1]
+    add_flows(feed_server, 3)
+    get_recorder().start_run()
+    extractor = TrafficDataExtractor(config, stage_tables=['TrafficFlow'])
+    chunks = list(extractor.extract_chunks('TrafficFlow', 25))
+    assert pd.concat(chunks)['FlowID'].tolist() == [last['FlowID'] + n for n in range(1, 4)]
+
+
+def test_positions_of_a_run_whose_load_failed_are_not_stored(feed_server, tmp_path):
+    config = http_config(feed_server, tmp_path)
+    get_recorder().start_run()
+    read_rows(config, stage=True)
+    
+    get_recorder().start_run()
+    assert read_rows(config, stage=True) == 150
+    TrafficDataExtractor(config).commit_positions()
+    assert os.listdir(tmp_path) == ['http_cursors.json']
+
+
+def run_pipeline(server, output_dir, streaming: bool) -> int:
+    """Facts loaded by a pipeline run over the stub feeds, in a fresh process"""
+    env = dict(os.environ, SOURCE_FILE=server.url, OUTPUT_DIR=str(output_dir), USE_DATABASE='False',
+               STREAMING=str(streaming), LOG_FILE='', PYTHONPATH=ROOT)
+    subprocess.run([sys.executable, os.path.join(ROOT, 'src', 'main.py')], env=env, cwd=ROOT, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return len(pd.read_csv(output_dir / 'FactTrafficEvents.csv'))
+
+
+def test_streaming_and_batch_runs_load_the_same_facts(feed_server, tmp_path):
+    batch = run_pipeline(feed_server, tmp_path / 'batch', streaming=False)
+    streaming = run_pipeline(feed_server, tmp_path / 'streaming', streaming=True)
+    assert batch == streaming == 486
+    
+    cursors = json.loads((tmp_path / 'streaming' / 'http_cursors.json').read_text())
+    assert sorted(feed_id.split()[0] for feed_id in cursors) == sorted(FACT_SOURCES)
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_second_run_appends_the_new_facts_and_keeps_the_dimension_keys(feed_server, tmp_path, streaming):
+    output_dir = tmp_path / 'warehouse'
+    assert run_pipeline(feed_server, output_dir, streaming) == 486
+    locations = pd.read_csv(output_dir / 'DimLocation.csv')
+    
+    add_flows(feed_server, 3)
+    assert run_pipeline(feed_server, output_dir, streaming) == 489
+    facts = pd.read_csv(output_dir / 'FactTrafficEvents.csv')
+    assert facts['event_id'].tolist() == list(range(1, 490))
+    merged = pd.read_csv(output_dir / 'DimLocation.csv')
+    assert len(merged) == len(locations)
+    pd.testing.assert_frame_equal(merged[['location_key', 'location_name']], locations[['location_key', 'location_name']])
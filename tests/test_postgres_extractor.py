@@ -0,0 +1,58 @@
+import os
+import sys
+import subprocess
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+from conftest import ROOT
+
+SAMPLE_WORKBOOK = os.path.join(ROOT, 'data', 'traffic_flow_data.xlsx')
+
+
+@pytest.fixture
+def source_db(tmp_path):
+    """SQLite copy of the sample workbook, standing in for the operational database"""
+    url = f"sqlite:///{tmp_path / 'source.db'}"
+    engine = create_engine(url)
+    for table, df in pd.read_excel(SAMPLE_WORKBOOK, sheet_name=None).items():
+        df.to_sql(table, engine, index=False)
+    yield url, engine
+    engine.dispose()
+
+
+def add_flows(engine, count: int):
+    flows = pd.read_sql_table('TrafficFlow', engine)
+    last = flows.iloc[-1]
+    new = pd.DataFrame([last] * count).assign(
+        FlowID=[last['FlowID'] + n for n in range(1, count + 1)],
+        Timestamp=[flows['Timestamp'].max() + pd.Timedelta(minutes=n) for n in range(1, count + 1)]
+    )
+    new.to_sql('TrafficFlow', engine, index=False, if_exists='append')
+
+
+def run_pipeline(url, output_dir, streaming: bool) -> int:
+    """Facts loaded by a pipeline run reading TrafficFlow above its timestamp watermark, in a fresh process"""
+    env = dict(os.environ, SOURCE_FILE=url, SOURCE_FORMAT='postgres', SOURCE_DB_SCHEMA='',
+               SOURCE_DB_WATERMARKS='TrafficFlow=Timestamp', OUTPUT_DIR=str(output_dir), USE_DATABASE='False',
+               STREAMING=str(streaming), LOG_FILE='', PYTHONPATH=ROOT)
+    subprocess.run([sys.executable, os.path.join(ROOT, 'src', 'main.py')], env=env, cwd=ROOT, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return len(pd.read_csv(output_dir / 'FactTrafficEvents.csv'))
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_second_run_appends_the_rows_above_the_watermark(source_db, tmp_path, streaming):
+    url, engine = source_db
+    output_dir = tmp_path / 'warehouse'
+    assert run_pipeline(url, output_dir, streaming) == 486
+    locations = pd.read_csv(output_dir / 'DimLocation.csv')
+    assert os.path.exists(output_dir / 'source_watermarks.json')
+    
+    add_flows(engine, 3)
+    assert run_pipeline(url, output_dir, streaming) == 489
+    facts = pd.read_csv(output_dir / 'FactTrafficEvents.csv')
+    assert facts['event_id'].tolist() == list(range(1, 490))
+    merged = pd.read_csv(output_dir / 'DimLocation.csv')
+    pd.testing.assert_frame_equal(merged[['location_key', 'location_name']], locations[['location_key', 'location_name']])
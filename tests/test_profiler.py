@@ -0,0 +1,35 @@
+import json
+
+import pandas as pd
+
+from extractors import SourceProfiler
+from monitoring import get_recorder
+
+
+def accidents() -> pd.DataFrame:
+    return pd.DataFrame({
+        'AccidentID': range(1, 201),
+        'Location': ['Main St', 'Oak Ave', 'Elm St', 'Pine Rd'] * 50,
+        'VehiclesInvolved': [1, 2, 3, 2, 4] * 40,
+        'ReportedAt': pd.date_range('2025-01-01', periods=200, freq='h')
+    })
+
+
+def profile_run(config, df: pd.DataFrame) -> list:
+    """Drift of a table read in two chunks, as a run's extraction does, from the previous run's profile"""
+    get_recorder().start_run()
+    profiler = SourceProfiler(config)
+    list(profiler.profile_chunks('Accidents', [df.iloc[:120], df.iloc[120:]]))
+    with open(profiler._path('Accidents')) as f:
+        return json.load(f)['drift']
+
+
+def test_drift_is_flagged_when_a_column_type_changes(tmp_path):
+    config = {'source_profile': {'dir': str(tmp_path), 'max_overhead': 1.0}}
+    profile_run(config, accidents())
+    assert profile_run(config, accidents()) == []
+    
+    # The next export writes the vehicle counts as text
+    assert profile_run(config, accidents().astype({'VehiclesInvolved': str})) == [
+        'Accidents.VehiclesInvolved type changed from int64 to object'
+    ]
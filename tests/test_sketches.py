@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from analytics import TrafficSketches, SketchStore
+
+
+def sketch_config(tmp_path):
+    return {'sketches': {'enabled': True, 'dir': str(tmp_path / 'sketches'), 'hll_precision': 10,
+                         'relative_accuracy': 0.01, 'top_k': 5, 'max_partitions': 2}}
+
+
+def facts(rng, vehicles: pd.DataFrame, rows: int) -> pd.DataFrame:
+    speeding = rng.random(rows) < 0.4
+    return pd.DataFrame({
+        'location_key': rng.integers(1, 6, rows),
+        'time_key': rng.integers(0, 24, rows) * 100 + rng.integers(0, 60, rows),
+        'vehicle_key': np.where(speeding, rng.choice(vehicles['vehicle_key'], rows), 0),
+        'avg_speed': np.where(rng.random(rows) < 0.8, rng.gamma(9, 6, rows), np.nan),
+        'speed_excess': np.where(speeding, rng.gamma(2, 5, rows), np.nan)
+    })
+
+
+def test_sketches_of_separate_runs_merge_into_the_sketch_of_all_facts(tmp_path):
+    config = sketch_config(tmp_path)
+    rng = np.random.default_rng(11)
+    vehicles = pd.DataFrame({'vehicle_key': np.arange(1, 301), 'vehicle_id': np.arange(1001, 1301)})
+    runs = [facts(rng, vehicles, rows) for rows in (400, 250, 350)]
+    
+    store = SketchStore(config)
+    for index, run in enumerate(runs):
+        sketches = TrafficSketches(config)
+        sketches.update(run, vehicles)
+        store.save(sketches, f"run{index}", replace=index == 0)
+    # Beyond max_partitions the runs were compacted, which is a merge as well
+    assert len(store.partitions()) == 1
+    
+    whole = TrafficSketches(config)
+    whole.update(pd.concat(runs, ignore_index=True), vehicles)
+    merged = store.load()
+    pd.testing.assert_frame_equal(merged.registers, whole.registers)
+    pd.testing.assert_frame_equal(merged.buckets, whole.buckets)
+    pd.testing.assert_frame_equal(merged.quantiles('avg_speed', by=['location_key']),
+                                  whole.quantiles('avg_speed', by=['location_key']))
+    assert merged.top_violation_locations().equals(whole.top_violation_locations())
+    
+    distinct = pd.concat(runs).query('vehicle_key > 0')['vehicle_key'].nunique()
+    assert abs(merged.distinct_vehicles()['distinct_vehicles'].iloc[0] - distinct) <= 0.1 * distinct
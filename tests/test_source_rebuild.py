@@ -0,0 +1,36 @@
+import os
+import sys
+import subprocess
+
+import pandas as pd
+
+from conftest import ROOT
+
+SAMPLE_WORKBOOK = os.path.join(ROOT, 'data', 'traffic_flow_data.xlsx')
+
+
+def run_pipeline(output_dir, *args) -> pd.DataFrame:
+    """Facts loaded after a pipeline run over the sample workbook, in a fresh process"""
+    env = dict(os.environ, SOURCE_FILE=SAMPLE_WORKBOOK, OUTPUT_DIR=str(output_dir), USE_DATABASE='False',
+               LOG_FILE='', PYTHONPATH=ROOT)
+    subprocess.run([sys.executable, os.path.join(ROOT, 'src', 'main.py'), *args], env=env, cwd=ROOT, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return pd.read_csv(output_dir / 'FactTrafficEvents.csv')
+
+
+def test_rebuilding_one_source_leaves_the_other_facts_untouched(tmp_path):
+    output_dir = tmp_path / 'warehouse'
+    before = run_pipeline(output_dir)
+    event_types = pd.read_csv(output_dir / 'DimEventType.csv')
+    accident_keys = event_types.loc[event_types['event_type_id'].str.startswith('ACC_'), 'event_type_key']
+    accidents = before['event_type_key'].isin(accident_keys)
+    assert accidents.any() and (~accidents).any()
+    
+    after = run_pipeline(output_dir, '--sources', 'Accidents')
+    rebuilt = after['event_type_key'].isin(accident_keys)
+    pd.testing.assert_frame_equal(after[~rebuilt].reset_index(drop=True), before[~accidents].reset_index(drop=True))
+    
+    # The rebuilt rows are numbered after every event ID loaded before
+    assert rebuilt.sum() == accidents.sum()
+    assert after.loc[rebuilt, 'event_id'].min() > before['event_id'].max()
+    assert after['event_id'].is_unique
@@ -0,0 +1,33 @@
+import os
+import sys
+import json
+import subprocess
+
+from conftest import ROOT
+from benchmarks import SyntheticDataGenerator, check_transform_memory, TRANSFORM_MEMORY_MULTIPLE, \
+    MEMORY_ALLOWANCE_BYTES
+
+# Large enough that the multiple of the sources, not the fixed allowance, dominates the limit
+WORKLOAD_ROWS = 100000
+
+
+def test_transform_rss_growth_stays_within_the_multiple_of_the_sources(tmp_path):
+    source_dir = tmp_path / 'sources'
+    generator = SyntheticDataGenerator(WORKLOAD_ROWS, seed=7, days=90)
+    generator.write(str(source_dir), 'parquet')
+    
+    # Peak RSS only grows within a process, so the benchmark runs in a fresh one; it exits
+    # non-zero on a memory regression, which the results are checked for below
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, os.path.join(ROOT, 'src')]))
+    subprocess.run([sys.executable, os.path.join(ROOT, 'src', 'benchmark.py'), 'run', '--source', str(source_dir),
+                    '--repeat', '1', '--results-dir', str(tmp_path), '--label', 'memory'],
+                   env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    results = json.loads((tmp_path / 'benchmark_memory.json').read_text())
+    
+    memory = results['transform_memory']
+    assert TRANSFORM_MEMORY_MULTIPLE * memory['input_bytes'] > 2 * MEMORY_ALLOWANCE_BYTES
+    assert check_transform_memory(results, TRANSFORM_MEMORY_MULTIPLE) is None, memory
+    
+    # Each table's extraction is counted once, not again with the stages the extractor records
+    for table, rows in generator.table_rows().items():
+        assert results['results'][f'bench_extract:{table}']['rows_out'] == rows
@@ -0,0 +1,12 @@
+import pandas as pd
+
+from loaders.warehouse_loader import WarehouseLoader
+
+
+def test_appending_chunks_to_a_missing_csv_table_writes_its_header(tmp_path):
+    loader = WarehouseLoader({'database': {}, 'rollups': {'enabled': False}}, use_db=False, output_dir=str(tmp_path))
+    chunks = [pd.DataFrame({'event_id': [1, 2], 'date_key': [20250101, 20250102]}),
+              pd.DataFrame({'event_id': [3], 'date_key': [20250103]})]
+    assert loader.load_table_chunks('FactTrafficEvents', chunks[:1], 2, append=True) == 2
+    assert loader.load_table_chunks('FactTrafficEvents', chunks[1:], 2, append=True) == 1
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / 'FactTrafficEvents.csv'), pd.concat(chunks, ignore_index=True))